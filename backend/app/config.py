@@ -25,6 +25,70 @@ class Settings(BaseSettings):
     embedding_model: str = "gemini-embedding-001"
     embedding_dimensions: int = 768
     
+    # Admission control (bounded concurrency + priority lanes)
+    admission_max_concurrency: int = 8
+    admission_max_queue: int = 64
+    admission_queue_timeout_s: float = 5.0
+    admission_retry_after_s: int = 2
+    
+    # Response compression (br when the brotli package is installed, else gzip)
+    compression_min_bytes: int = 1024  # smaller bodies are sent uncompressed
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    
+    # Local vector search over namespace snapshots (empty = Pinecone only)
+    local_index_dir: str = ""
+    local_index_kind: str = "auto"  # auto, exact, matryoshka, int8, ivfpq, hnsw
+    
+    # Matryoshka two-stage retrieval (used by "auto" for large namespaces)
+    two_stage_min_vectors: int = 50_000
+    matryoshka_dims: int = 256  # 128 or 256
+    matryoshka_dtype: str = "int8"  # int8 (fast) or float16
+    matryoshka_candidates: int = 100
+    
+    # Metadata fields indexed eagerly for local filters (others on first use)
+    metadata_index_fields: str = "category,source,modality,quality,techniques,image_category,subcategory"
+    
+    # IVF-PQ compressed index
+    ivf_nlist: int = 0  # 0 = ~4*sqrt(N) lists
+    ivf_nprobe: int = 16
+    pq_m: int = 96  # sub-quantizers (bytes per vector); must divide the dimension
+    ivfpq_refine: int = 100  # rescore this many candidates with full vectors (0 = off)
+    
+    # HNSW graph index (supports incremental inserts and deletes)
+    hnsw_m: int = 16  # links per node (2*M on the base layer)
+    hnsw_ef_construction: int = 100
+    hnsw_ef_search: int = 64
+    hnsw_build_max_vectors: int = 0  # build on load up to this size; larger namespaces need build_local_index.py
+    
+    # Precomputed answer pack (scripts/build_answer_pack.py; empty = off)
+    answer_pack_path: str = ""
+    answer_pack_min_similarity: float = 0.92  # query-to-centroid cosine needed to answer from the pack
+    
+    # Sampled NDJSON log of /api/rag/query traffic (empty = off)
+    query_log_path: str = ""
+    query_log_sample_rate: float = 1.0
+    query_log_max_mb: int = 64  # rotate at this size
+    query_log_backups: int = 5
+    
+    # Embedding + result caches: memory (per process), shared (mmap, all workers), off
+    cache_backend: str = "memory"
+    cache_dir: str = ""  # shared backend files; empty = /dev/shm/prompttriage (or the temp dir)
+    embedding_cache_slots: int = 16384
+    result_cache_slots: int = 0  # off: ingest only invalidates its own process (use with cache_backend=shared)
+    result_cache_slot_bytes: int = 2048  # ids + scores per entry; larger result lists aren't cached
+    result_cache_ttl_s: float = 300.0
+    
+    # Progressive retrieval (/api/rag/query/stream)
+    refine_model: str = "gemini-2.0-flash"  # rerank + judge stages
+    refine_candidates: int = 20  # naive pool the rerank stage reorders
+    
+    # /api/rag/stats snapshot lifetime before a background refresh
+    stats_ttl_s: float = 30.0
+    
+    # Video negative-prompt library (preloaded at startup): retry delay after a failed load
+    negative_library_retry_s: float = 60.0
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
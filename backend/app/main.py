@@ -3,16 +3,28 @@ PromptTriage Backend - FastAPI Application
 Provides RAG-powered prompt generation and processing.
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.compression import CompressionMiddleware
 from app.config import settings
 from app.routers import health, rag
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the video negative-prompt library in the background; startup
+    # doesn't wait on Pinecone and a failed load is retried later
+    rag.rag_service.schedule_negative_library_load()
+    yield
+
+
 app = FastAPI(
     title="PromptTriage API",
     description="RAG-powered prompt generation backend",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware for frontend communication
@@ -28,6 +40,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large retrieval payloads (br/gzip, negotiated per request)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_min_bytes,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+)
+
 # Include routers
 app.include_router(health.router, tags=["Health"])
 app.include_router(rag.router, prefix="/api/rag", tags=["RAG"])
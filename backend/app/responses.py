@@ -0,0 +1,105 @@
+"""
+Fast JSON responses for large retrieval payloads.
+
+Routes that return many multi-KB matches build the payload as plain dicts
+once and return a FastJSONResponse directly. FastAPI then skips
+response_model validation and serialization (the model still documents
+the schema in OpenAPI), and orjson encodes the body when it is installed.
+
+Clients that send `Accept: application/msgpack` get the same payload as
+MessagePack instead (when msgpack is installed); see `negotiate`.
+"""
+
+import json
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; stdlib json is the fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional; JSON is served instead
+    msgpack = None
+
+# Keep proxies from buffering or caching event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode a JSON payload to bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with `dumps`; content must already be JSON-ready."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One server-sent event with a JSON data line."""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def _msgpack_default(obj: Any) -> Any:
+    # numpy scalars/arrays from local-store metadata
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__} to MessagePack")
+
+
+class MsgPackResponse(Response):
+    """MessagePack response; content must already be JSON-ready."""
+
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True, default=_msgpack_default)
+
+
+def media_ranges(header: str) -> dict[str, float]:
+    """Media range -> q from an Accept header (q defaults to 1; bad q counts as 0)."""
+    ranges = {}
+    for part in header.lower().split(","):
+        media_type, *params = (p.strip() for p in part.split(";"))
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges[media_type] = max(q, ranges.get(media_type, 0.0))
+    return ranges
+
+
+def wants_msgpack(request: Request) -> bool:
+    """True if the client names a MessagePack type with q > 0, at least as high as JSON's."""
+    if msgpack is None:
+        return False
+    ranges = media_ranges(request.headers.get("accept", ""))
+    q_msgpack = max((ranges.get(t, 0.0) for t in MSGPACK_MEDIA_TYPES), default=0.0)
+    q_json = ranges.get("application/json", 0.0)
+    return q_msgpack > 0 and q_msgpack >= q_json
+
+
+def negotiate(request: Request, content: Any) -> Response:
+    """MsgPackResponse if the client asked for it, FastJSONResponse otherwise."""
+    if wants_msgpack(request):
+        return MsgPackResponse(content, headers={"Vary": "Accept"})
+    return FastJSONResponse(content, headers={"Vary": "Accept"})
@@ -3,16 +3,33 @@ RAG (Retrieval Augmented Generation) endpoints.
 Uses Pinecone vector store for prompt retrieval.
 """
 
-from fastapi import APIRouter, HTTPException
+import time
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
+from app.responses import SSE_HEADERS, negotiate, sse_event
+from app.services.admission import admission, AdmissionRejected
+from app.services.answer_pack import query_hash
+from app.services.metrics import request_stages
+from app.services.query_log import query_log
 from app.services.rag import RAGService
 
 router = APIRouter()
 rag_service = RAGService()
 
 
+def _shed(e: AdmissionRejected) -> HTTPException:
+    """Fast 503 for requests the admission controller rejected."""
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 class QueryRequest(BaseModel):
     """Request model for RAG queries."""
     query: str
@@ -22,6 +39,7 @@ class QueryRequest(BaseModel):
     modality: str = "text"  # text, image, video
     namespace: Optional[str] = None  # Direct namespace override
     target_vendor: Optional[str] = None  # anthropic, openai, google — maps to vendor namespace
+    filter: Optional[dict] = None  # Pinecone-style metadata filter, e.g. {"techniques": {"$in": [...]}}
 
 # Vendor to Pinecone namespace mapping
 VENDOR_NAMESPACE_MAP = {
@@ -31,6 +49,21 @@ VENDOR_NAMESPACE_MAP = {
 }
 
 
+def _resolve_vendor_namespace(request: QueryRequest) -> Optional[str]:
+    """target_vendor takes priority, then the explicit namespace."""
+    if request.target_vendor and request.target_vendor in VENDOR_NAMESPACE_MAP:
+        return VENDOR_NAMESPACE_MAP[request.target_vendor]
+    return request.namespace
+
+
+REFINE_STAGES = ("rerank", "judge")
+
+
+class StreamQueryRequest(QueryRequest):
+    """Request model for progressive (SSE) queries."""
+    stages: List[str] = list(REFINE_STAGES)  # refinement stages after the naive results
+
+
 class QueryResult(BaseModel):
     """Single query result."""
     id: str
@@ -46,6 +79,29 @@ class QueryResponse(BaseModel):
     total_results: int
 
 
+class VideoQueryRequest(BaseModel):
+    """Request model for combined video prompt + negative prompt retrieval."""
+    query: str
+    top_k: int = 5
+    negative_top_k: int = 3
+    category: Optional[str] = None
+    include_metadata: bool = True
+    filter: Optional[dict] = None
+
+
+class VideoQueryResult(QueryResult):
+    """Video prompt paired with a negative-prompt library entry."""
+    negative: Optional[dict] = None  # library entry + "match": "category" | "semantic"
+
+
+class VideoQueryResponse(BaseModel):
+    """Response model for combined video retrieval."""
+    results: List[VideoQueryResult]
+    negatives: List[QueryResult]
+    query: str
+    total_results: int
+
+
 class IngestRequest(BaseModel):
     """Request model for ingesting new prompts."""
     content: str
@@ -71,59 +127,171 @@ class BatchIngestResponse(BaseModel):
 
 
 @router.post("/query", response_model=QueryResponse)
-async def query_prompts(request: QueryRequest):
+async def query_prompts(request: QueryRequest, http_request: Request):
     """
     Query Pinecone for similar prompts.
     
     Supports vendor-specific namespace routing and modality-based defaults.
+    Runs in the interactive admission lane. The service already returns
+    QueryResult-shaped dicts, so the body is built once and encoded
+    directly instead of going through the response model again
+    (MessagePack with `Accept: application/msgpack`, JSON otherwise).
     """
     try:
         # Resolve namespace: target_vendor takes priority, then explicit namespace, then modality default
-        resolved_namespace = request.namespace
-        if request.target_vendor and request.target_vendor in VENDOR_NAMESPACE_MAP:
-            resolved_namespace = VENDOR_NAMESPACE_MAP[request.target_vendor]
+        resolved_namespace = _resolve_vendor_namespace(request)
+
+        async with admission.slot("interactive"):
+            with request_stages() as stages:
+                results = await rag_service.query(
+                    query=request.query,
+                    top_k=request.top_k,
+                    category=request.category,
+                    modality=request.modality,
+                    namespace=resolved_namespace,
+                    filter=request.filter,
+                )
+        
+        if query_log.enabled:
+            query_log.log({
+                "ts": round(time.time(), 3),
+                "query_hash": query_hash(request.query),
+                "query": request.query,
+                "namespace": rag_service.resolve_namespace(resolved_namespace, request.modality),
+                "top_k": request.top_k,
+                "category": request.category,
+                "filter": request.filter,
+                "stages_ms": stages,
+                "result_ids": [r["id"] for r in results],
+            })
+        
+        if not request.include_metadata:
+            results = [{**r, "metadata": {}} for r in results]
+        return negotiate(http_request, {
+            "results": results,
+            "query": request.query,
+            "total_results": len(results),
+        })
+    except AdmissionRejected as e:
+        raise _shed(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+
 
-        results = await rag_service.query(
+@router.post("/query/stream")
+async def stream_query_prompts(request: StreamQueryRequest):
+    """
+    Progressive retrieval over server-sent events.
+    
+    Emits a `results` event per stage as it finishes: `naive` (embedding
+    search, available in embed + search time), then `rerank` and `judge`
+    (LLM-refined orderings, seconds later). Each event carries the stage,
+    its results and elapsed_ms since the request started; the stream ends
+    with `done`, or `error` if a later stage fails (earlier results stand).
+    
+    Admission covers the naive stage only, so 503s arrive before the
+    stream opens and slow LLM stages don't hold interactive slots.
+    """
+    try:
+        unknown = set(request.stages) - set(REFINE_STAGES)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}; choose from {list(REFINE_STAGES)}")
+        
+        stream = rag_service.query_progressive(
             query=request.query,
             top_k=request.top_k,
             category=request.category,
             modality=request.modality,
-            namespace=resolved_namespace,
-        )
-        
-        return QueryResponse(
-            results=[
-                QueryResult(
-                    id=r["id"],
-                    content=r["content"],
-                    similarity=r["similarity"],
-                    metadata=r.get("metadata", {}) if request.include_metadata else {},
-                )
-                for r in results
-            ],
-            query=request.query,
-            total_results=len(results),
+            namespace=_resolve_vendor_namespace(request),
+            filter=request.filter,
+            vendor=request.target_vendor or "",
+            stages=tuple(request.stages),
         )
+        async with admission.slot("interactive"):
+            first = await anext(stream)
+    except AdmissionRejected as e:
+        raise _shed(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback; traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+    
+    async def events():
+        stages = []
+        event = first
+        try:
+            while event is not None:
+                if not request.include_metadata:
+                    event["results"] = [{**r, "metadata": {}} for r in event["results"]]
+                stages.append(event["stage"])
+                yield sse_event("results", {**event, "query": request.query})
+                event = await anext(stream, None)
+            yield sse_event("done", {"stages": stages})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Stage failed: {str(e)}", "stages": stages})
+        finally:
+            await stream.aclose()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/query/video", response_model=VideoQueryResponse)
+async def query_video_prompts(request: VideoQueryRequest, http_request: Request):
+    """
+    Video prompts and negative prompts in one request.
+    
+    One embedding searches `video-prompts` and `video-negative-prompts`
+    concurrently; each video prompt comes back paired with a negative-prompt
+    entry. Runs in the interactive admission lane.
+    """
+    try:
+        async with admission.slot("interactive"):
+            combined = await rag_service.query_video(
+                query=request.query,
+                top_k=request.top_k,
+                negative_top_k=request.negative_top_k,
+                category=request.category,
+                filter=request.filter,
+            )
+        
+        results = combined["results"]
+        if not request.include_metadata:
+            results = [{**r, "metadata": {}} for r in results]
+        return negotiate(http_request, {
+            "results": results,
+            "negatives": combined["negatives"],
+            "query": request.query,
+            "total_results": len(results),
+        })
+    except AdmissionRejected as e:
+        raise _shed(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Video query failed: {str(e)}")
 
 
 @router.post("/ingest", response_model=IngestResponse)
 async def ingest_prompt(request: IngestRequest):
-    """Ingest a new prompt to Pinecone."""
+    """Ingest a new prompt to Pinecone (batch admission lane)."""
     try:
-        doc_id = await rag_service.ingest_to_pinecone(
-            content=request.content,
-            metadata=request.metadata,
-        )
+        async with admission.slot("batch"):
+            doc_id = await rag_service.ingest_to_pinecone(
+                content=request.content,
+                metadata=request.metadata,
+            )
         
         return IngestResponse(
             id=doc_id,
             message="Prompt ingested successfully",
         )
+    except AdmissionRejected as e:
+        raise _shed(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -131,10 +299,11 @@ async def ingest_prompt(request: IngestRequest):
 
 
 @router.post("/ingest/batch", response_model=BatchIngestResponse)
-async def batch_ingest_prompts(request: BatchIngestRequest):
+async def batch_ingest_prompts(request: BatchIngestRequest, http_request: Request):
     """
     Batch ingest prompts to Pinecone.
     More efficient than individual ingestion for large datasets.
+    Runs in the batch admission lane, behind interactive queries.
     """
     try:
         documents = [
@@ -142,13 +311,16 @@ async def batch_ingest_prompts(request: BatchIngestRequest):
             for doc in request.documents
         ]
         
-        doc_ids = await rag_service.ingest_batch_to_pinecone(documents)
+        async with admission.slot("batch"):
+            doc_ids = await rag_service.ingest_batch_to_pinecone(documents)
         
-        return BatchIngestResponse(
-            ids=doc_ids,
-            count=len(doc_ids),
-            message=f"Successfully ingested {len(doc_ids)} prompts to Pinecone",
-        )
+        return negotiate(http_request, {
+            "ids": doc_ids,
+            "count": len(doc_ids),
+            "message": f"Successfully ingested {len(doc_ids)} prompts to Pinecone",
+        })
+    except AdmissionRejected as e:
+        raise _shed(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -156,10 +328,22 @@ async def batch_ingest_prompts(request: BatchIngestRequest):
 
 
 @router.get("/stats")
-async def get_stats():
-    """Get RAG system statistics."""
+async def get_stats(fresh: bool = False):
+    """
+    Get RAG system statistics.
+    
+    Served from a cached snapshot; pass `?fresh=true` to force a refresh.
+    """
     try:
-        stats = await rag_service.get_stats()
+        stats = await rag_service.get_stats(fresh=fresh)
+        stats["admission"] = admission.snapshot()
+        stats["query_log"] = query_log.stats()
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stats retrieval failed: {str(e)}")
+
+
+@router.get("/admission")
+async def get_admission():
+    """Admission queue depth, admitted and shed counts per lane."""
+    return admission.snapshot()
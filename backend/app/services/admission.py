@@ -0,0 +1,168 @@
+"""
+Admission control for the RAG endpoints.
+
+When upstream Gemini/Pinecone quota runs out, requests used to pile up in
+uvicorn until they timed out. The controller bounds how many requests are
+in flight, queues a limited number behind them, and sheds the rest fast so
+clients can retry with a Retry-After hint.
+
+Lanes:
+- interactive: /api/rag/query — highest priority, may use the whole queue
+- batch:       /api/rag/ingest, /api/rag/ingest/batch — served only when no
+               interactive request is waiting, limited to a share of the queue
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from app.config import settings
+
+
+# lane -> (priority, share of the queue the lane may occupy)
+LANES = {
+    "interactive": (0, 1.0),
+    "batch": (1, 0.5),
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"Service saturated ({lane} lane: {reason}), retry later")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded-concurrency gate with priority lanes.
+
+    At most `max_concurrency` requests run at once. Up to `max_queue` more
+    wait for a slot, ordered by lane priority then arrival; a waiter that is
+    not admitted within `queue_timeout_s` is shed. Released slots are handed
+    directly to the best waiter so a lower lane can never jump the queue.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout_s: Optional[float] = None,
+        retry_after_s: Optional[int] = None,
+    ):
+        self.max_concurrency = max_concurrency or settings.admission_max_concurrency
+        self.max_queue = max_queue if max_queue is not None else settings.admission_max_queue
+        self.queue_timeout_s = queue_timeout_s or settings.admission_queue_timeout_s
+        self.retry_after_s = retry_after_s or settings.admission_retry_after_s
+
+        self._active = 0
+        self._waiters: list = []  # heap of (priority, seq, lane, future)
+        self._seq = itertools.count()
+        self._queued = Counter()
+        self._admitted = Counter()
+        self._shed = Counter()
+
+    def _lane(self, lane: str) -> tuple:
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane: {lane}")
+        return LANES[lane]
+
+    def _retry_after(self) -> int:
+        """Scale the hint with how far behind the queue is."""
+        backlog = len(self._waiters) / max(self.max_concurrency, 1)
+        return max(self.retry_after_s, math.ceil(self.retry_after_s * backlog))
+
+    def _reject(self, lane: str, reason: str) -> AdmissionRejected:
+        self._shed[(lane, reason)] += 1
+        return AdmissionRejected(lane, reason, self._retry_after())
+
+    async def acquire(self, lane: str = "interactive") -> None:
+        """Wait for a slot in `lane`, or raise AdmissionRejected."""
+        priority, queue_share = self._lane(lane)
+
+        # Fast path: free slot and nobody ahead of us
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self._admitted[lane] += 1
+            return
+
+        if len(self._waiters) >= int(self.max_queue * queue_share):
+            raise self._reject(lane, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), lane, future))
+        self._queued[lane] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over as the timer fired — keep it
+                self._admitted[lane] += 1
+                return
+            future.cancel()
+            raise self._reject(lane, "timeout")
+        except asyncio.CancelledError:
+            # Client went away: give back a slot we may have just been handed
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._queued[lane] -= 1
+            self._prune()
+        self._admitted[lane] += 1
+
+    def release(self) -> None:
+        """Return a slot, handing it to the highest-priority live waiter."""
+        while self._waiters:
+            _, _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)  # slot transfers, _active unchanged
+                return
+        self._active -= 1
+
+    def _prune(self) -> None:
+        """Drop cancelled waiters so queue depth stays accurate."""
+        if any(f.done() for *_, f in self._waiters):
+            self._waiters = [w for w in self._waiters if not w[3].done()]
+            heapq.heapify(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, lane: str = "interactive"):
+        """`async with admission.slot("batch"): ...`"""
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """Queue depth, admission and shed counters for export."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout_s,
+            "active": self._active,
+            "queue_depth": sum(self._queued.values()),
+            "lanes": {
+                lane: {
+                    "queued": self._queued[lane],
+                    "admitted": self._admitted[lane],
+                    "shed_queue_full": self._shed[(lane, "queue_full")],
+                    "shed_timeout": self._shed[(lane, "timeout")],
+                }
+                for lane in LANES
+            },
+            "shed_total": sum(self._shed.values()),
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,235 @@
+"""
+Precomputed answer packs for high-traffic query clusters.
+
+An offline job (scripts/build_answer_pack.py) clusters the query log with
+k-means and stores the top-k results of every (cluster centroid, namespace)
+pair that enough logged queries fall into. RAGService loads the pack at
+startup and answers unfiltered queries whose embedding is within
+`answer_pack_min_similarity` of a centroid straight from it, without a
+Pinecone call. Returned similarities are the documents' scores against the
+centroid, not against the query.
+
+Packed results go stale when a namespace changes. Ingest invalidates the
+namespace in its own process, and every stats refresh invalidates
+namespaces whose live vector count differs from the one recorded at build
+time (pack.json "corpus_versions"); invalidated namespaces go to the index
+until the pack is rebuilt.
+
+Pack directory:
+    pack.json         build metadata (top_k, corpus versions, counts)
+    centroids.npy     float32 (k, D) unit-normalised centroids
+    results.parquet   centroid, namespace, rank, id, content, similarity, metadata (JSON)
+    queries.npz       embedding cache (query hash -> embedding) for rebuilds
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.services.local_index.corpus import l2_normalize
+from app.services.local_index.kmeans import kmeans
+
+PACK_META = "pack.json"
+CENTROIDS_FILE = "centroids.npy"
+RESULTS_FILE = "results.parquet"
+QUERY_CACHE_FILE = "queries.npz"
+
+
+def query_hash(text: str) -> str:
+    """Stable short hash of a normalised query string."""
+    return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def load_query_cache(path) -> dict[str, np.ndarray]:
+    """query hash -> embedding saved next to a previous pack (empty if none)."""
+    path = Path(path) / QUERY_CACHE_FILE
+    if not path.exists():
+        return {}
+    data = np.load(path)
+    return dict(zip(data["hashes"].tolist(), data["embeddings"]))
+
+
+def save_query_cache(path, cache: dict[str, np.ndarray]) -> None:
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    hashes = list(cache)
+    embeddings = np.asarray([cache[h] for h in hashes], dtype=np.float32)
+    np.savez(path / QUERY_CACHE_FILE, hashes=np.asarray(hashes), embeddings=embeddings)
+
+
+class AnswerPack:
+    """Centroids plus precomputed results per (centroid, namespace)."""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        results: dict[tuple[int, str], list[dict]],
+        meta: dict,
+        min_similarity: float = 0.92,
+    ):
+        self.centroids = centroids
+        self.results = results
+        self.meta = meta
+        self.min_similarity = min_similarity
+        self.stale: set[str] = set()  # namespaces changed since the build
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    @property
+    def top_k(self) -> int:
+        return self.meta.get("top_k", 0)
+
+    def nearest(self, embedding) -> tuple[int, float]:
+        """(centroid, cosine similarity) closest to an embedding."""
+        sims = self.centroids @ l2_normalize(embedding)
+        best = int(np.argmax(sims))
+        return best, float(sims[best])
+
+    def lookup(
+        self,
+        embedding,
+        namespace: str,
+        top_k: int,
+        filter: Optional[dict] = None,
+    ) -> Optional[list[dict]]:
+        """Packed results for a query, or None when it must go to the index.
+
+        Filtered queries, deeper top_k than was packed, stale namespaces and
+        queries far from every centroid always miss.
+        """
+        if filter or top_k > self.top_k or namespace in self.stale or not len(self.centroids):
+            return None
+        centroid, sim = self.nearest(embedding)
+        if sim < self.min_similarity:
+            return None
+        records = self.results.get((centroid, namespace))
+        if records is None:
+            return None
+        return [dict(r) for r in records[:top_k]]
+
+    def invalidate(self, namespace: str) -> None:
+        """Stop answering `namespace` from the pack (its corpus changed)."""
+        self.stale.add(namespace)
+
+    def check_versions(self, counts: dict[str, int]) -> None:
+        """Invalidate namespaces whose live vector count differs from the build's."""
+        for ns, built in self.meta.get("corpus_versions", {}).items():
+            if ns in counts and counts[ns] != built:
+                self.invalidate(ns)
+
+    def stats(self) -> dict:
+        return {
+            "centroids": len(self.centroids),
+            "entries": len(self),
+            "top_k": self.top_k,
+            "built_at": self.meta.get("built_at"),
+            "corpus_versions": self.meta.get("corpus_versions", {}),
+            "stale_namespaces": sorted(self.stale),
+            "min_similarity": self.min_similarity,
+        }
+
+    def save(self, path) -> Path:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / CENTROIDS_FILE, self.centroids.astype(np.float32))
+        rows = [
+            (centroid, ns, rank, r)
+            for (centroid, ns), records in sorted(self.results.items())
+            for rank, r in enumerate(records)
+        ]
+        pq.write_table(pa.table({
+            "centroid": [c for c, _, _, _ in rows],
+            "namespace": [ns for _, ns, _, _ in rows],
+            "rank": [rank for _, _, rank, _ in rows],
+            "id": [r["id"] for *_, r in rows],
+            "content": [r["content"] for *_, r in rows],
+            "similarity": [float(r["similarity"]) for *_, r in rows],
+            "metadata": [json.dumps(r.get("metadata", {}), ensure_ascii=False) for *_, r in rows],
+        }), path / RESULTS_FILE, compression="zstd")
+        (path / PACK_META).write_text(json.dumps(self.meta, indent=2))
+        return path
+
+    @classmethod
+    def load(cls, path, min_similarity: float = 0.92) -> "AnswerPack":
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        meta = json.loads((path / PACK_META).read_text())
+        table = pq.read_table(path / RESULTS_FILE).to_pydict()
+        results: dict[tuple[int, str], list[dict]] = {}
+        order = sorted(range(len(table["id"])), key=lambda i: (table["centroid"][i], table["namespace"][i], table["rank"][i]))
+        for i in order:
+            results.setdefault((table["centroid"][i], table["namespace"][i]), []).append({
+                "id": table["id"][i],
+                "content": table["content"][i],
+                "similarity": table["similarity"][i],
+                "metadata": json.loads(table["metadata"][i]) if table["metadata"][i] else {},
+            })
+        return cls(np.load(path / CENTROIDS_FILE), results, meta, min_similarity=min_similarity)
+
+
+def build_pack(
+    embeddings: np.ndarray,
+    namespaces: list[str],
+    search: Callable[[str, np.ndarray, int], list[dict]],
+    corpus_versions: dict[str, object],
+    clusters: int = 64,
+    top_k: int = 10,
+    min_queries: int = 2,
+    previous: Optional[AnswerPack] = None,
+    reuse_similarity: float = 0.999,
+    iters: int = 20,
+) -> tuple[AnswerPack, dict]:
+    """Cluster logged query embeddings and precompute results per (centroid, namespace).
+
+    `namespaces[i]` is the namespace query i was served from, and only pairs
+    with at least `min_queries` logged queries are packed. With `previous`,
+    k-means is warm-started from its centroids, and a pair is copied instead
+    of searched again when its centroid barely moved
+    (cos >= `reuse_similarity`) and that namespace's corpus version is
+    unchanged. Returns the pack and build counters.
+    """
+    x = l2_normalize(embeddings)
+    init = previous.centroids if previous is not None else None
+    centroids = l2_normalize(kmeans(x, clusters, iters=iters, init=init))
+    labels = np.argmax(x @ centroids.T, axis=1)
+
+    counts: dict[tuple[int, str], int] = {}
+    for label, ns in zip(labels.tolist(), namespaces):
+        counts[(label, ns)] = counts.get((label, ns), 0) + 1
+
+    old_versions = previous.meta.get("corpus_versions", {}) if previous is not None else {}
+    reusable = previous is not None and previous.top_k >= top_k
+    results: dict[tuple[int, str], list[dict]] = {}
+    reused = searched = 0
+    for (centroid, ns), n in sorted(counts.items()):
+        if n < min_queries:
+            continue
+        if reusable and old_versions.get(ns) == corpus_versions.get(ns):
+            old, sim = previous.nearest(centroids[centroid])
+            if sim >= reuse_similarity and (old, ns) in previous.results:
+                results[(centroid, ns)] = previous.results[(old, ns)][:top_k]
+                reused += 1
+                continue
+        results[(centroid, ns)] = search(ns, centroids[centroid], top_k)
+        searched += 1
+
+    meta = {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "queries": len(x),
+        "clusters": len(centroids),
+        "top_k": top_k,
+        "min_queries": min_queries,
+        "corpus_versions": corpus_versions,
+    }
+    pack = AnswerPack(centroids, results, meta,
+                      min_similarity=previous.min_similarity if previous is not None else 0.92)
+    return pack, {"entries": len(results), "searched": searched, "reused": reused}
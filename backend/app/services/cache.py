@@ -0,0 +1,328 @@
+"""
+Embedding and result caches, per process or shared across workers.
+
+Two table backends with the same bytes-in, bytes-out interface:
+
+- MemoryTable:  an LRU dict inside one process (CACHE_BACKEND=memory)
+- SharedTable:  a set-associative hash table in a memory-mapped file
+                (CACHE_BACKEND=shared), so every uvicorn worker on the
+                instance reads and fills the same entries
+
+SharedTable has fixed-size slots (key, seqlock counter, length, timestamp,
+payload). Lookups are lock-free: a reader copies the payload and retries
+if the slot's sequence number was odd or changed meanwhile. Writers take
+one of `stripes` locks (a thread lock plus an fcntl byte-range lock, so
+threads and processes both exclude each other) and evict the oldest entry
+of the key's set. `clear()` bumps a generation counter in the file header
+that is mixed into every key, which invalidates all workers at once.
+
+The file's layout (slots, slot_bytes, ways) is part of its name, and an
+existing file is never resized: other workers have it mapped, and reading
+past a truncated end kills them with SIGBUS. A file whose header doesn't
+match raises instead.
+
+On top of the tables:
+
+- EmbeddingCache: query text -> float16 embedding
+- ResultCache:    (namespace, query, top_k, filter) -> [(id, score), ...],
+                  expiring after `ttl_s` and cleared on ingest; RAGService
+                  rehydrates ids from the local store or Pinecone fetch
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the memory backend still works
+    fcntl = None
+
+MAGIC = b"PTCACHE2"
+HEADER = struct.Struct("<8sQQQQ")  # magic, slots, slot_bytes, ways, generation
+HEADER_BYTES = 64
+GENERATION_OFFSET = 32
+LOCK_BASE = 1 << 40  # fcntl stripe locks live past any real file offset
+
+
+def cache_key(*parts) -> int:
+    """Non-zero 64-bit key (0 marks an empty slot)."""
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | 1
+
+
+class MemoryTable:
+    """Per-process LRU table."""
+
+    backend = "memory"
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._data: OrderedDict[int, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def get(self, key: int, max_age: Optional[float] = None) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (max_age is None or time.time() - entry[1] <= max_age):
+                self._data.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[0]
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: int, value: bytes) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            if len(self._data) > self.slots:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+        self.counters["puts"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        self.counters["clears"] += 1
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "slots": self.slots, "entries": len(self._data), **self.counters}
+
+
+class SharedTable:
+    """Memory-mapped, set-associative table shared by every process that opens `path`."""
+
+    backend = "shared"
+
+    def __init__(self, path, slots: int, slot_bytes: int, ways: int = 4, stripes: int = 64):
+        if fcntl is None:
+            raise RuntimeError("The shared cache backend needs fcntl (Linux/macOS)")
+        self.path = Path(path)
+        self.ways = ways
+        self.slots = max(ways, slots - slots % ways)
+        self.slot_bytes = slot_bytes
+        self.stripes = stripes
+        self.counters = Counter()
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+
+        n = self.slots
+        layout = [("keys", np.uint64, 8), ("seq", np.uint32, 4), ("lengths", np.uint32, 4),
+                  ("stamps", np.float64, 8), ("generations", np.uint64, 8)]
+        offset, self._offsets = HEADER_BYTES, {}
+        for name, _, itemsize in layout:
+            self._offsets[name] = offset
+            offset += n * itemsize
+        self._offsets["payload"] = offset = (offset + 63) // 64 * 64
+        size = offset + n * slot_bytes
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            expected = (MAGIC, self.slots, slot_bytes, ways)
+            found = HEADER.unpack(header)[:4] if len(header) == HEADER.size else None
+            if found is None or found[0] == bytes(len(MAGIC)):
+                # New file (or one whose creator died before writing the header)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(*expected, 0), 0)
+                found = expected
+            elif found == expected and os.fstat(self._fd).st_size != size:
+                found = "a different file size"
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+        if found != expected:
+            os.close(self._fd)
+            raise ValueError(
+                f"{self.path} has {found}, expected {expected} (magic, slots, slot_bytes, ways). "
+                f"It is not resized, since other processes may have it mapped; remove it or use another path."
+            )
+
+        self._mmap = mmap.mmap(self._fd, size)
+        for name, dtype, _ in layout:
+            setattr(self, f"_{name}", np.frombuffer(self._mmap, dtype=dtype, count=n, offset=self._offsets[name]))
+        self._payload = np.frombuffer(self._mmap, dtype=np.uint8, count=n * slot_bytes,
+                                      offset=self._offsets["payload"]).reshape(n, slot_bytes)
+        self._generation = np.frombuffer(self._mmap, dtype=np.uint64, count=1, offset=GENERATION_OFFSET)
+
+    def _locate(self, key: int) -> tuple[int, int]:
+        """(first slot of the key's set, stripe) for a generation-mixed key."""
+        bucket = (key >> 8) % (self.slots // self.ways)  # the low bit is always set
+        return bucket * self.ways, bucket % self.stripes
+
+    def _mixed(self, key: int, generation: Optional[int] = None) -> int:
+        if generation is None:
+            generation = int(self._generation[0])
+        return ((key ^ (generation * 0x9E3779B97F4A7C15)) & 0xFFFFFFFFFFFFFFFF) | 1
+
+    def get(self, key: int, max_age: Optional[float] = None) -> Optional[bytes]:
+        key = self._mixed(key)
+        start, _ = self._locate(key)
+        for slot in range(start, start + self.ways):
+            for _ in range(3):
+                before = int(self._seq[slot])
+                if before & 1:
+                    continue  # being written
+                if int(self._keys[slot]) != key:
+                    break
+                stamp = float(self._stamps[slot])
+                value = self._payload[slot, :int(self._lengths[slot])].tobytes()
+                if int(self._seq[slot]) != before:
+                    continue
+                if max_age is not None and time.time() - stamp > max_age:
+                    break
+                self.counters["hits"] += 1
+                return value
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: int, value: bytes) -> None:
+        if len(value) > self.slot_bytes:
+            self.counters["too_large"] += 1
+            return
+        generation = int(self._generation[0])
+        key = self._mixed(key, generation)
+        start, stripe = self._locate(key)
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, LOCK_BASE + stripe)
+            try:
+                keys = self._keys[start:start + self.ways]
+                match = np.flatnonzero(keys == key)
+                empty = np.flatnonzero(keys == 0)
+                if len(match):
+                    slot = start + int(match[0])
+                elif len(empty):
+                    slot = start + int(empty[0])
+                else:
+                    slot = start + int(np.argmin(self._stamps[start:start + self.ways]))
+                    self.counters["evictions"] += 1
+                self._seq[slot] += 1  # odd: readers back off
+                self._keys[slot] = key
+                self._lengths[slot] = len(value)
+                self._stamps[slot] = time.time()
+                self._generations[slot] = generation
+                self._payload[slot, :len(value)] = np.frombuffer(value, dtype=np.uint8)
+                self._seq[slot] += 1
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, LOCK_BASE + stripe)
+        self.counters["puts"] += 1
+
+    def clear(self) -> None:
+        """Invalidate every entry for all processes (generation bump)."""
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            self._generation[0] += 1
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+        self.counters["clears"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "path": str(self.path),
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "entries": int(np.count_nonzero((self._keys != 0) & (self._generations == self._generation[0]))),
+            "generation": int(self._generation[0]),
+            **self.counters,
+        }
+
+
+def default_cache_dir() -> Path:
+    shm = Path("/dev/shm")
+    return shm / "prompttriage" if shm.is_dir() else Path(tempfile.gettempdir()) / "prompttriage"
+
+
+def make_table(name: str, slots: int, slot_bytes: int):
+    """Table for one cache per settings.cache_backend (None when off)."""
+    if settings.cache_backend == "off" or slots <= 0:
+        return None
+    if settings.cache_backend == "shared":
+        root = Path(settings.cache_dir) if settings.cache_dir else default_cache_dir()
+        # Layout in the name: workers with other settings use their own file
+        return SharedTable(root / f"{name}-{slots}x{slot_bytes}.cache", slots, slot_bytes)
+    if settings.cache_backend == "memory":
+        return MemoryTable(slots)
+    raise ValueError("cache_backend must be one of memory, shared, off")
+
+
+class EmbeddingCache:
+    """Query text -> embedding, stored as float16."""
+
+    def __init__(self, table, model: str, dim: int):
+        self.table = table
+        self.model = model
+        self.dim = dim
+
+    def get(self, text: str) -> Optional[list[float]]:
+        if self.table is None:
+            return None
+        value = self.table.get(cache_key("embedding", self.model, self.dim, text))
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32).tolist()
+
+    def put(self, text: str, embedding) -> None:
+        if self.table is not None:
+            value = np.asarray(embedding, dtype=np.float16).tobytes()
+            self.table.put(cache_key("embedding", self.model, self.dim, text), value)
+
+    def stats(self) -> Optional[dict]:
+        return self.table.stats() if self.table is not None else None
+
+
+class ResultCache:
+    """(namespace, query, top_k, filter) -> [(id, score), ...] with a TTL."""
+
+    def __init__(self, table, ttl_s: float):
+        self.table = table
+        self.ttl_s = ttl_s
+
+    @staticmethod
+    def _key(namespace: str, query: str, top_k: int, filter: Optional[dict]) -> int:
+        return cache_key("results", namespace, query, top_k, json.dumps(filter, sort_keys=True, default=str))
+
+    @staticmethod
+    def encode(hits: list[tuple[str, float]]) -> bytes:
+        scores = np.asarray([s for _, s in hits], dtype=np.float64).tobytes()
+        return struct.pack("<H", len(hits)) + scores + "\x00".join(i for i, _ in hits).encode("utf-8")
+
+    @staticmethod
+    def decode(value: bytes) -> list[tuple[str, float]]:
+        (n,) = struct.unpack_from("<H", value)
+        if n == 0:
+            return []
+        scores = np.frombuffer(value, dtype=np.float64, count=n, offset=2)
+        ids = value[2 + 8 * n:].decode("utf-8").split("\x00")
+        return list(zip(ids, scores.tolist()))
+
+    def get(self, namespace: str, query: str, top_k: int, filter: Optional[dict]) -> Optional[list[tuple[str, float]]]:
+        if self.table is None:
+            return None
+        value = self.table.get(self._key(namespace, query, top_k, filter), max_age=self.ttl_s)
+        return self.decode(value) if value is not None else None
+
+    def put(self, namespace: str, query: str, top_k: int, filter: Optional[dict], results: list[dict]) -> None:
+        if self.table is not None:
+            hits = [(r["id"], float(r["similarity"])) for r in results]
+            self.table.put(self._key(namespace, query, top_k, filter), self.encode(hits))
+
+    def invalidate(self) -> None:
+        if self.table is not None:
+            self.table.clear()
+
+    def stats(self) -> Optional[dict]:
+        return self.table.stats() if self.table is not None else None
@@ -0,0 +1,28 @@
+"""Local vector search over namespace snapshots (see corpus.py for the layout)."""
+
+from app.services.local_index.bitmap import MetadataIndex, combine_filters
+from app.services.local_index.corpus import LocalCorpus, l2_normalize
+from app.services.local_index.exact import ExactIndex
+from app.services.local_index.hnsw import HNSWIndex
+from app.services.local_index.matryoshka import MatryoshkaIndex
+from app.services.local_index.quantized import IVFPQIndex, ScalarQuantizedIndex
+from app.services.local_index.snapshot import export_namespace, import_namespace
+from app.services.local_index.store import LocalNamespace, LocalVectorStore, build_index, index_dir
+
+__all__ = [
+    "LocalCorpus",
+    "LocalNamespace",
+    "LocalVectorStore",
+    "MetadataIndex",
+    "ExactIndex",
+    "MatryoshkaIndex",
+    "ScalarQuantizedIndex",
+    "IVFPQIndex",
+    "HNSWIndex",
+    "build_index",
+    "combine_filters",
+    "export_namespace",
+    "import_namespace",
+    "index_dir",
+    "l2_normalize",
+]
@@ -0,0 +1,244 @@
+"""
+Bitmap metadata index for filtered local search.
+
+Every indexed (field, value) pair maps to the rows carrying it, stored as a
+sorted int32 id array when sparse or a packed bitmap when dense (whichever
+is smaller). Filters are evaluated with bitwise AND/OR/NOT over packed
+bitmaps, and only the surviving row ids are handed to the vector index, so
+non-matching rows are never scored.
+
+Filters use Pinecone's metadata filter syntax, so the same expression
+works whether a namespace is served locally or by Pinecone:
+
+    {"category": "coding"}
+    {"source": {"$in": ["awesome-prompts", "system-prompts"]}}
+    {"$or": [{"modality": "image"}, {"techniques": "chain-of-thought"}],
+     "quality": {"$gte": 4}}
+
+List-valued metadata (e.g. `techniques`) matches when any element matches.
+"""
+
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+
+COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+FIELD_OPERATORS = {"$eq", "$ne", "$in", "$nin", "$exists", *COMPARISONS}
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class _Rows:
+    """Postings over the first `n_rows` rows; replaced, not mutated, when rows are appended."""
+
+    def __init__(self, n_rows: int, fields: Optional[dict] = None):
+        self.n_rows = n_rows
+        self.nbytes = (n_rows + 7) // 8
+        # field -> (value -> ids or bitmap, bitmap of rows having the field)
+        self.fields: dict[str, tuple[dict, np.ndarray]] = fields if fields is not None else {}
+
+    def compact(self, ids: np.ndarray):
+        """Sorted int32 ids, or a packed bitmap when that is smaller."""
+        if len(ids) * 4 <= self.nbytes:
+            return ids.astype(np.int32)
+        return self.ids_to_bitmap(ids)
+
+    def ids_to_bitmap(self, ids: np.ndarray) -> np.ndarray:
+        bits = np.zeros(self.n_rows, dtype=bool)
+        bits[ids] = True
+        return np.packbits(bits)
+
+    def as_bitmap(self, posting) -> np.ndarray:
+        if posting.dtype == np.uint8:
+            return posting
+        return self.ids_to_bitmap(posting)
+
+    def resize(self, bitmap: np.ndarray) -> np.ndarray:
+        """A bitmap from fewer rows, zero-padded to this many."""
+        if len(bitmap) == self.nbytes:
+            return bitmap
+        return np.concatenate([bitmap, np.zeros(self.nbytes - len(bitmap), dtype=np.uint8)])
+
+    def empty(self) -> np.ndarray:
+        return np.zeros(self.nbytes, dtype=np.uint8)
+
+    def all(self) -> np.ndarray:
+        return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def union(self, postings: list) -> np.ndarray:
+        out = self.empty()
+        for p in postings:
+            np.bitwise_or(out, self.as_bitmap(p), out=out)
+        return out
+
+
+def _group(metadata: list[dict], field: str, start: int, stop: int) -> tuple[dict, list[int]]:
+    """value -> rows, and the rows having `field`, over metadata[start:stop]."""
+    groups: dict = {}
+    present = []
+    for row in range(start, stop):
+        meta = metadata[row]
+        if field not in meta:
+            continue
+        present.append(row)
+        value = meta[field]
+        for v in (value if isinstance(value, list) else [value]):
+            groups.setdefault(_hashable(v), []).append(row)
+    return groups, present
+
+
+class MetadataIndex:
+    """Per-field posting lists over row ids, built on first use of a field.
+
+    Queries read one `_Rows` snapshot throughout, so a concurrent `refresh`
+    (appended rows) never changes bitmap sizes or drops fields mid-query.
+    """
+
+    def __init__(self, metadata: list[dict], fields: Iterable[str] = ()):
+        self._metadata = metadata
+        self._rows = _Rows(len(metadata))
+        self._lock = threading.Lock()
+        for field in fields:
+            self._field(self._rows, field)
+
+    @property
+    def n_rows(self) -> int:
+        return self._rows.n_rows
+
+    # ── building ────────────────────────────────────────────────────────
+
+    def _field(self, rows: _Rows, field: str) -> tuple[dict, np.ndarray]:
+        """(postings, presence bitmap) for `field` in `rows`, building them on first use."""
+        entry = rows.fields.get(field)
+        if entry is None:
+            with self._lock:
+                entry = rows.fields.get(field)
+                if entry is None:
+                    groups, present = _group(self._metadata, field, 0, rows.n_rows)
+                    entry = (
+                        {v: rows.compact(np.asarray(r, dtype=np.int64)) for v, r in groups.items()},
+                        rows.ids_to_bitmap(np.asarray(present, dtype=np.int64)),
+                    )
+                    rows.fields[field] = entry
+        return entry
+
+    def refresh(self) -> None:
+        """Pick up rows appended to the metadata list, extending built postings with them."""
+        with self._lock:
+            old = self._rows
+            rows = _Rows(len(self._metadata))
+            for field, (postings, present) in old.fields.items():
+                groups, added = _group(self._metadata, field, old.n_rows, rows.n_rows)
+                extended = {
+                    v: p if p.dtype != np.uint8 else rows.resize(p)
+                    for v, p in postings.items() if v not in groups
+                }
+                for v, new_rows in groups.items():
+                    ids = np.asarray(new_rows, dtype=np.int64)
+                    p = postings.get(v)
+                    if p is not None:
+                        if p.dtype == np.uint8:
+                            p = np.flatnonzero(np.unpackbits(p, count=old.n_rows))
+                        ids = np.concatenate([p.astype(np.int64), ids])
+                    extended[v] = rows.compact(ids)
+                present = rows.resize(present).copy()
+                if added:
+                    np.bitwise_or(present, rows.ids_to_bitmap(np.asarray(added, dtype=np.int64)), out=present)
+                rows.fields[field] = (extended, present)
+            self._rows = rows
+
+    # ── evaluation ──────────────────────────────────────────────────────
+
+    def _eq(self, rows: _Rows, field: str, value) -> np.ndarray:
+        posting = self._field(rows, field)[0].get(_hashable(value))
+        return rows.empty() if posting is None else rows.as_bitmap(posting)
+
+    def _in(self, rows: _Rows, field: str, values) -> np.ndarray:
+        if not isinstance(values, list):
+            raise ValueError(f"$in/$nin on '{field}' needs a list")
+        postings = self._field(rows, field)[0]
+        return rows.union([postings[_hashable(v)] for v in values if _hashable(v) in postings])
+
+    def _field_clause(self, rows: _Rows, field: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            return self._eq(rows, field, condition)
+
+        result = rows.all()
+        for op, arg in condition.items():
+            if op not in FIELD_OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            postings, present = self._field(rows, field)
+            if op == "$eq":
+                bits = self._eq(rows, field, arg)
+            elif op == "$in":
+                bits = self._in(rows, field, arg)
+            elif op == "$ne":
+                bits = present & ~self._eq(rows, field, arg)
+            elif op == "$nin":
+                bits = present & ~self._in(rows, field, arg)
+            elif op == "$exists":
+                bits = present if arg else ~present
+            else:
+                compare = COMPARISONS[op]
+                bits = rows.union([
+                    p for v, p in postings.items()
+                    if isinstance(v, (int, float)) and not isinstance(v, bool) and compare(v, arg)
+                ])
+            np.bitwise_and(result, bits, out=result)
+        return result
+
+    def _evaluate(self, rows: _Rows, expression: dict) -> np.ndarray:
+        if not isinstance(expression, dict):
+            raise ValueError("Filter must be an object")
+        result = rows.all()
+        for key, value in expression.items():
+            if key in ("$and", "$or"):
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"{key} needs a non-empty list of filters")
+                parts = [self._evaluate(rows, sub) for sub in value]
+                bits = parts[0]
+                for part in parts[1:]:
+                    bits = (bits & part) if key == "$and" else (bits | part)
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported filter operator: {key}")
+            else:
+                bits = self._field_clause(rows, key, value)
+            np.bitwise_and(result, bits, out=result)
+        return result
+
+    def evaluate(self, expression: dict) -> np.ndarray:
+        """Packed bitmap of rows matching a filter expression."""
+        return self._evaluate(self._rows, expression)
+
+    def select(self, expression: dict) -> np.ndarray:
+        """Sorted row ids matching a filter expression."""
+        rows = self._rows
+        return np.flatnonzero(np.unpackbits(self._evaluate(rows, expression), count=rows.n_rows))
+
+    @property
+    def nbytes(self) -> int:
+        fields = list(self._rows.fields.values())
+        postings = sum(p.nbytes for values, _ in fields for p in values.values())
+        return postings + sum(present.nbytes for _, present in fields)
+
+    def stats(self) -> dict:
+        return {
+            "fields": {f: len(values) for f, (values, _) in list(self._rows.fields.items())},
+            "bytes": self.nbytes,
+        }
+
+
+def combine_filters(*filters: Optional[dict]) -> Optional[dict]:
+    """AND together the non-empty filters (None when there are none)."""
+    present = [f for f in filters if f]
+    if not present:
+        return None
+    return present[0] if len(present) == 1 else {"$and": present}
@@ -0,0 +1,158 @@
+"""
+On-disk namespace corpus: vectors + metadata for local search.
+
+Layout of one namespace directory:
+    vectors.npy        float32 (N, D) raw embeddings, memory-mapped on load
+    metadata.parquet   columns: id, content, metadata (JSON-encoded dict)
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.parquet"
+DEFAULT_NAMESPACE_DIR = "__default__"
+
+
+def namespace_dir(namespace: str) -> str:
+    """Directory name for a Pinecone namespace ("" is the default one)."""
+    return namespace or DEFAULT_NAMESPACE_DIR
+
+
+def l2_normalize(x: np.ndarray) -> np.ndarray:
+    """Row-normalize to unit length (cosine similarity becomes a dot product)."""
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def top_k_desc(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the `k` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def blocked_dot(codes: np.ndarray, q: np.ndarray, block_rows: int = 2048) -> np.ndarray:
+    """`codes @ q` for a compact (int8/float16) matrix.
+
+    Rows are upcast to float32 a cache-sized block at a time, so the full
+    matrix is never materialised in float32.
+    """
+    scores = np.empty(len(codes), dtype=np.float32)
+    buffer = np.empty((min(block_rows, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), block_rows):
+        block = codes[start:start + block_rows]
+        upcast = buffer[:len(block)]
+        np.copyto(upcast, block, casting="unsafe")
+        np.dot(upcast, q, out=scores[start:start + len(block)])
+    return scores
+
+
+class LocalCorpus:
+    """Vectors and records for one namespace."""
+
+    def __init__(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        contents: list[str],
+        metadata: list[dict],
+        namespace: str = "",
+    ):
+        if not (len(ids) == len(vectors) == len(contents) == len(metadata)):
+            raise ValueError("ids, vectors, contents and metadata must have equal length")
+        self.ids = ids
+        self.vectors = vectors
+        self.contents = contents
+        self.metadata = metadata
+        self.namespace = namespace
+        self._buffer: Optional[np.ndarray] = None  # growable copy once appended to
+        self._rows: Optional[dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Row of a record id (latest one if the id was re-ingested)."""
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        return self._rows.get(doc_id)
+
+    def append(self, doc_id: str, vector: np.ndarray, content: str, metadata: dict) -> int:
+        """Add one record and return its row.
+
+        The first append copies the (possibly memory-mapped) vectors into a
+        growable in-memory buffer; later appends are amortised O(1).
+        """
+        row = len(self)
+        if self._buffer is None or row == len(self._buffer):
+            buffer = np.empty((max(16, 2 * row), self.dim), dtype=np.float32)
+            buffer[:row] = self.vectors
+            self._buffer = buffer
+        self._buffer[row] = vector
+        self.ids.append(doc_id)
+        self.contents.append(content)
+        self.metadata.append(metadata)
+        self.vectors = self._buffer[:row + 1]
+        if self._rows is not None:
+            self._rows[doc_id] = row
+        return row
+
+    def record(self, row: int, score: float) -> dict:
+        """Format one row like a Pinecone match in RAGService.query."""
+        return {
+            "id": self.ids[row],
+            "content": self.contents[row],
+            "similarity": float(score),
+            "metadata": self.metadata[row],
+        }
+
+    @classmethod
+    def load(cls, path, namespace: Optional[str] = None, mmap: bool = True) -> "LocalCorpus":
+        """Load a namespace directory; vectors stay on disk when `mmap`."""
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r" if mmap else None)
+        table = pq.read_table(path / METADATA_FILE).to_pydict()
+        if namespace is None:
+            namespace = "" if path.name == DEFAULT_NAMESPACE_DIR else path.name
+        return cls(
+            ids=table["id"],
+            vectors=vectors,
+            contents=table["content"],
+            metadata=[json.loads(m) if m else {} for m in table["metadata"]],
+            namespace=namespace,
+        )
+
+    def save(self, path) -> Path:
+        """Write vectors.npy + metadata.parquet into `path`."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        # Write beside and rename: the old file may still be memory-mapped
+        tmp = path / f"{VECTORS_FILE}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(self.vectors, dtype=np.float32))
+        os.replace(tmp, path / VECTORS_FILE)
+        table = pa.table({
+            "id": self.ids,
+            "content": self.contents,
+            "metadata": [json.dumps(m, ensure_ascii=False) for m in self.metadata],
+        })
+        pq.write_table(table, path / METADATA_FILE, compression="zstd")
+        return path
@@ -0,0 +1,44 @@
+"""
+Exact (brute-force) cosine search — the recall baseline for every other index.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from app.services.local_index.corpus import l2_normalize, top_k_desc
+
+
+class ExactIndex:
+    """Full-dimensional float32 matrix, one matmul per query."""
+
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self._matrix = l2_normalize(vectors)
+
+    def __len__(self) -> int:
+        return len(self._matrix)
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) of the best `top_k` rows.
+
+        `allowed` restricts the search to a sorted array of row ids.
+        """
+        q = l2_normalize(query)
+        if allowed is None:
+            scores = self._matrix @ q
+            best = top_k_desc(scores, top_k)
+            return best, scores[best]
+        scores = self._matrix[allowed] @ q
+        best = top_k_desc(scores, top_k)
+        return allowed[best], scores[best]
@@ -0,0 +1,362 @@
+"""
+Hierarchical navigable small-world (HNSW) graph index.
+
+Approximate nearest-neighbour search whose cost grows roughly with log(N),
+for corpora where exact local search is too slow for interactive queries
+(Malkov & Yashunin, 2016). Similarity is the inner product of unit vectors.
+
+- Layer 0 links live in a fixed-width int32 table (2*M per node, -1 padded);
+  the few nodes on upper layers keep their links in per-layer dicts.
+- Inserts are incremental (`add`) and serialised by a lock; searches do not
+  take the lock.
+- Deletes are tombstones: the node keeps routing traffic but is never
+  returned. Rebuild from the snapshot once tombstones pile up.
+- `ef_construction` / `M` trade build time and memory for recall;
+  `ef_search` trades query latency for recall at search time.
+
+On-disk format (directory): index.json, vectors.npy (float16), levels.npy,
+CSR layer-0 links (links0_offsets.npy, links0.npy), CSR upper layers
+(upper_nodes.npy, upper_levels.npy, upper_offsets.npy, upper_links.npy) and
+a packed tombstone bitmap (deleted.npy).
+"""
+
+import heapq
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.services.local_index.corpus import l2_normalize, top_k_desc
+
+META_FILE = "index.json"
+
+
+class HNSWIndex:
+    """Incremental HNSW graph over unit vectors; row id == insertion order."""
+
+    kind = "hnsw"
+
+    def __init__(
+        self,
+        dim: int,
+        M: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        capacity: int = 1024,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._ml = 1 / math.log(M)
+        self._rng = np.random.default_rng(seed)
+
+        self._vectors = np.empty((capacity, dim), dtype=np.float32)
+        self._levels = np.zeros(capacity, dtype=np.int8)
+        self._links0 = np.full((capacity, self.M0), -1, dtype=np.int32)
+        self._deleted = np.zeros(capacity, dtype=bool)
+        self._upper: list[dict[int, list[int]]] = []  # layer l (>=1) at index l-1
+        self._size = 0
+        self._n_deleted = 0
+        self.entry = -1
+        self.max_level = -1
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def tombstones(self) -> int:
+        return self._n_deleted
+
+    @property
+    def nbytes(self) -> int:
+        upper = sum(len(links) * 4 + 64 for layer in self._upper for links in layer.values())
+        return (self._vectors[:self._size].nbytes + self._links0[:self._size].nbytes
+                + self._size * 2 + upper)
+
+    # ── graph primitives ────────────────────────────────────────────────
+
+    def _neighbors(self, node: int, level: int) -> list:
+        if level == 0:
+            links = self._links0[node]
+            return links[links >= 0].tolist()
+        return self._upper[level - 1].get(node, [])
+
+    def _set_neighbors(self, node: int, level: int, nodes: list) -> None:
+        if level == 0:
+            row = np.full(self.M0, -1, dtype=np.int32)
+            row[:len(nodes)] = nodes
+            self._links0[node] = row
+        else:
+            self._upper[level - 1][node] = list(nodes)
+
+    def _search_layer(self, q: np.ndarray, entry_points: list, ef: int, level: int) -> list:
+        """Best-first search on one layer; returns up to `ef` (sim, node), best first."""
+        visited = set(entry_points)
+        sims = (self._vectors[entry_points] @ q).tolist()
+        candidates = [(-s, n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        results = [(s, n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            fresh = [n for n in self._neighbors(node, level) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for s, n in zip((self._vectors[fresh] @ q).tolist(), fresh):
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select(self, scored: list, m: int) -> list:
+        """HNSW neighbour heuristic: keep diverse neighbours, fill up with the closest.
+
+        `scored` is [(sim to base, node)] sorted best first.
+        """
+        if len(scored) <= m:
+            return [n for _, n in scored]
+        nodes = [n for _, n in scored]
+        vecs = self._vectors[nodes]
+        pairwise = vecs @ vecs.T
+        # Best similarity of every candidate to any chosen neighbour so far
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        chosen: list[int] = []
+        for i, (sim, _) in enumerate(scored):
+            if len(chosen) >= m:
+                break
+            # Skip candidates closer to an already chosen neighbour than to the base
+            if closest[i] < sim:
+                chosen.append(i)
+                np.maximum(closest, pairwise[i], out=closest)
+        if len(chosen) < m:
+            taken = set(chosen)
+            chosen += [i for i in range(len(nodes)) if i not in taken][:m - len(chosen)]
+        return [nodes[i] for i in chosen]
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        new_cap = max(needed, capacity * 2)
+        vectors = np.empty((new_cap, self.dim), dtype=np.float32)
+        vectors[:capacity] = self._vectors
+        levels = np.zeros(new_cap, dtype=np.int8)
+        levels[:capacity] = self._levels
+        links0 = np.full((new_cap, self.M0), -1, dtype=np.int32)
+        links0[:capacity] = self._links0
+        deleted = np.zeros(new_cap, dtype=bool)
+        deleted[:capacity] = self._deleted
+        self._vectors, self._levels, self._links0, self._deleted = vectors, levels, links0, deleted
+
+    # ── public API ──────────────────────────────────────────────────────
+
+    def add(self, vector: np.ndarray) -> int:
+        """Insert one vector; returns its row id."""
+        q = l2_normalize(vector)
+        with self._lock:
+            row = self._size
+            self._grow(row + 1)
+            level = int(-math.log(1.0 - self._rng.random()) * self._ml)
+            self._vectors[row] = q
+            self._levels[row] = level
+            while len(self._upper) < level:
+                self._upper.append({})
+            self._size += 1
+
+            if self.entry < 0:
+                for lc in range(1, level + 1):
+                    self._upper[lc - 1][row] = []
+                self.entry, self.max_level = row, level
+                return row
+
+            ep = [self.entry]
+            for lc in range(self.max_level, level, -1):
+                ep = [self._search_layer(q, ep, 1, lc)[0][1]]
+
+            for lc in range(min(level, self.max_level), -1, -1):
+                found = self._search_layer(q, ep, self.ef_construction, lc)
+                neighbors = self._select(found, self.M)
+                self._set_neighbors(row, lc, neighbors)
+
+                m_max = self.M0 if lc == 0 else self.M
+                for n in neighbors:
+                    links = self._neighbors(n, lc)
+                    if len(links) < m_max:
+                        self._set_neighbors(n, lc, links + [row])
+                        continue
+                    pool = links + [row]
+                    sims = (self._vectors[pool] @ self._vectors[n]).tolist()
+                    scored = sorted(zip(sims, pool), reverse=True)
+                    self._set_neighbors(n, lc, self._select(scored, m_max))
+                ep = [n for _, n in found]
+
+            for lc in range(self.max_level + 1, level + 1):
+                self._upper[lc - 1][row] = []
+            if level > self.max_level:
+                self.entry, self.max_level = row, level
+            return row
+
+    def delete(self, row: int) -> None:
+        """Tombstone a row: it still routes searches but is never returned."""
+        with self._lock:
+            if 0 <= row < self._size and not self._deleted[row]:
+                self._deleted[row] = True
+                self._n_deleted += 1
+
+    def is_deleted(self, row: int) -> bool:
+        return bool(self._deleted[row])
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        M: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        seed: int = 0,
+    ) -> "HNSWIndex":
+        index = cls(vectors.shape[1], M=M, ef_construction=ef_construction,
+                    ef_search=ef_search, capacity=max(1, len(vectors)), seed=seed)
+        for start in range(0, len(vectors), 4096):
+            for v in l2_normalize(vectors[start:start + 4096]):
+                index.add(v)
+        return index
+
+    def _exact(self, q: np.ndarray, rows: np.ndarray, top_k: int,
+               deleted: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+        deleted = self._deleted if deleted is None else deleted
+        rows = rows[~deleted[rows]]
+        scores = self._vectors[rows] @ q
+        best = top_k_desc(scores, top_k)
+        return rows[best].astype(np.int64), scores[best]
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+        ef: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) of the best live rows.
+
+        Filters small enough to scan cheaply are searched exactly; otherwise
+        the graph is searched with a widened beam and non-matching rows are
+        dropped, falling back to exact search if too few survive.
+
+        Searches don't take the lock: rows added concurrently (row >= the
+        size seen at the start) are ignored, and tombstones are read from one
+        array even if `add` grows it mid-search.
+        """
+        size = self._size
+        deleted = self._deleted
+        if size == 0 or self.entry < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = l2_normalize(query)
+        ef = max(ef or self.ef_search, top_k)
+
+        mask = None
+        if allowed is not None:
+            allowed = np.asarray(allowed)
+            if len(allowed) <= 8 * ef:
+                return self._exact(q, allowed[allowed < size], top_k, deleted)
+            mask = np.zeros(size, dtype=bool)
+            mask[allowed[allowed < size]] = True
+            # Widen the beam in proportion to how selective the filter is
+            ef = min(size, int(ef * min(8.0, size / len(allowed))))
+
+        ep = [self.entry]
+        for lc in range(self.max_level, 0, -1):
+            ep = [self._search_layer(q, ep, 1, lc)[0][1]]
+        found = self._search_layer(q, ep, ef, 0)
+
+        rows = np.array([n for _, n in found], dtype=np.int64)
+        scores = np.array([s for s, _ in found], dtype=np.float32)
+        seen = rows < size
+        rows, scores = rows[seen], scores[seen]
+        keep = ~deleted[rows]
+        if mask is not None:
+            keep &= mask[rows]
+        rows, scores = rows[keep], scores[keep]
+        if mask is not None and len(rows) < top_k:
+            return self._exact(q, allowed[allowed < size], top_k, deleted)
+        return rows[:top_k], scores[:top_k]
+
+    # ── persistence ─────────────────────────────────────────────────────
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        n = self._size
+        (path / META_FILE).write_text(json.dumps({
+            "kind": self.kind, "count": n, "dim": self.dim, "M": self.M,
+            "ef_construction": self.ef_construction, "ef_search": self.ef_search,
+            "entry": self.entry, "max_level": self.max_level,
+        }, indent=2))
+        np.save(path / "vectors.npy", self._vectors[:n].astype(np.float16))
+        np.save(path / "levels.npy", self._levels[:n])
+
+        links0 = self._links0[:n]
+        counts = (links0 >= 0).sum(axis=1)
+        np.save(path / "links0_offsets.npy", np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+        np.save(path / "links0.npy", links0[links0 >= 0].astype(np.int32))
+
+        nodes, levels, offsets, links = [], [], [0], []
+        for lc, layer in enumerate(self._upper, start=1):
+            for node, node_links in layer.items():
+                nodes.append(node)
+                levels.append(lc)
+                links.extend(node_links)
+                offsets.append(len(links))
+        np.save(path / "upper_nodes.npy", np.asarray(nodes, dtype=np.int32))
+        np.save(path / "upper_levels.npy", np.asarray(levels, dtype=np.int8))
+        np.save(path / "upper_offsets.npy", np.asarray(offsets, dtype=np.int64))
+        np.save(path / "upper_links.npy", np.asarray(links, dtype=np.int32))
+        np.save(path / "deleted.npy", np.packbits(self._deleted[:n]))
+        return path
+
+    @classmethod
+    def load(cls, path, ef_search: Optional[int] = None) -> "HNSWIndex":
+        path = Path(path)
+        meta = json.loads((path / META_FILE).read_text())
+        if meta.get("kind") != cls.kind:
+            raise ValueError(f"{path} holds a {meta.get('kind')!r} index, expected {cls.kind!r}")
+        n = meta["count"]
+        index = cls(meta["dim"], M=meta["M"], ef_construction=meta["ef_construction"],
+                    ef_search=ef_search or meta["ef_search"], capacity=max(1, n))
+        index._vectors[:n] = np.load(path / "vectors.npy")
+        index._levels[:n] = np.load(path / "levels.npy")
+
+        offsets = np.load(path / "links0_offsets.npy")
+        flat = np.load(path / "links0.npy")
+        counts = np.diff(offsets)
+        rows = np.repeat(np.arange(n), counts)
+        cols = np.arange(len(flat)) - np.repeat(offsets[:-1], counts)
+        index._links0[rows, cols] = flat
+
+        index._upper = [{} for _ in range(max(0, meta["max_level"]))]
+        up_offsets = np.load(path / "upper_offsets.npy")
+        up_links = np.load(path / "upper_links.npy").tolist()
+        for i, (node, lc) in enumerate(zip(np.load(path / "upper_nodes.npy").tolist(),
+                                            np.load(path / "upper_levels.npy").tolist())):
+            index._upper[lc - 1][node] = up_links[up_offsets[i]:up_offsets[i + 1]]
+
+        index._deleted[:n] = np.unpackbits(np.load(path / "deleted.npy"), count=n).astype(bool)
+        index._n_deleted = int(index._deleted[:n].sum())
+        index._size = n
+        index.entry, index.max_level = meta["entry"], meta["max_level"]
+        return index
@@ -0,0 +1,60 @@
+"""
+NumPy k-means (Lloyd's algorithm) used to train IVF lists and PQ codebooks.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+def assign(x: np.ndarray, centroids: np.ndarray, block_rows: int = 8192) -> np.ndarray:
+    """Index of the nearest centroid (Euclidean) for every row of `x`."""
+    half_c_sq = (centroids ** 2).sum(axis=1) / 2
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block_rows):
+        block = np.asarray(x[start:start + block_rows], dtype=np.float32)
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2), computed in place
+        scores = block @ centroids.T
+        scores -= half_c_sq
+        out[start:start + len(block)] = np.argmax(scores, axis=1)
+    return out
+
+
+def kmeans(
+    x: np.ndarray,
+    k: int,
+    iters: int = 20,
+    seed: int = 0,
+    max_train: Optional[int] = None,
+    init: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Train `k` centroids on (a sample of) `x`. Returns a (k, D) float32 array.
+
+    `init` warm-starts from existing centroids (e.g. the previous build),
+    which keeps cluster ids stable across incremental rebuilds.
+    """
+    rng = np.random.default_rng(seed)
+    if max_train and len(x) > max_train:
+        x = x[np.sort(rng.choice(len(x), size=max_train, replace=False))]
+    x = np.asarray(x, dtype=np.float32)
+    k = min(k, len(x))
+
+    if init is not None and len(init) == k:
+        centroids = np.array(init, dtype=np.float32)
+    else:
+        centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=k)
+
+        # Per-cluster sums via one sort + reduceat (much faster than np.add.at)
+        order = np.argsort(labels, kind="stable")
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        centroids[nonempty] = np.add.reduceat(x[order], starts, axis=0) / counts[nonempty, None]
+
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), size=len(empty), replace=False)]
+    return centroids
@@ -0,0 +1,101 @@
+"""
+Matryoshka two-stage retrieval.
+
+gemini-embedding-001 is trained so that a prefix of the embedding is itself
+a usable embedding. A compact 128/256-d prefix of every vector is kept in
+RAM as int8 + per-row scale (or float16) for a fast candidate pass; the
+candidates are then rescored against the full-dimensional vectors, which
+can stay memory-mapped on disk since only a few hundred rows are read.
+
+The candidate pass upcasts small cache-sized blocks to float32 before the
+matmul. int8 is the fast path on CPU; NumPy's float16 conversion is much
+slower, so float16 trades speed for a little extra candidate precision.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from app.services.local_index.corpus import blocked_dot, l2_normalize, top_k_desc
+
+COMPACT_DTYPES = ("float16", "int8")
+
+
+class MatryoshkaIndex:
+    """Low-dimensional candidate pass + full-dimensional rescoring."""
+
+    kind = "matryoshka"
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        dims: int = 256,
+        dtype: str = "int8",
+        candidates: int = 100,
+        block_rows: int = 2048,
+    ):
+        if dims >= vectors.shape[1]:
+            raise ValueError(f"dims ({dims}) must be below the full dimension ({vectors.shape[1]})")
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"dtype must be one of {COMPACT_DTYPES}")
+
+        self.dims = dims
+        self.dtype = dtype
+        self.candidates = candidates
+        self.block_rows = block_rows
+        self._full = vectors
+
+        n = len(vectors)
+        self._codes = np.empty((n, dims), dtype=np.dtype(dtype))
+        self._scales = np.empty(n, dtype=np.float32) if dtype == "int8" else None
+
+        # Build block by block so a memory-mapped source is never fully loaded
+        for start in range(0, n, block_rows):
+            block = l2_normalize(vectors[start:start + block_rows, :dims])
+            end = start + len(block)
+            if self._scales is None:
+                self._codes[start:end] = block
+            else:
+                peak = np.abs(block).max(axis=1)
+                peak[peak == 0] = 1.0
+                self._codes[start:end] = np.round(block * (127.0 / peak)[:, None])
+                self._scales[start:end] = peak / 127.0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes (the full vectors are not counted when memory-mapped)."""
+        resident = self._codes.nbytes
+        if self._scales is not None:
+            resident += self._scales.nbytes
+        if not isinstance(self._full, np.memmap):
+            resident += self._full.nbytes
+        return resident
+
+    def _coarse_scores(self, q_low: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate cosine scores from the compact prefix matrix."""
+        if rows is not None:
+            scores = self._codes[rows].astype(np.float32) @ q_low
+            return scores * self._scales[rows] if self._scales is not None else scores
+
+        scores = blocked_dot(self._codes, q_low, self.block_rows)
+        return scores * self._scales if self._scales is not None else scores
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, full-dimensional cosine scores) of the best rows."""
+        query = np.asarray(query, dtype=np.float32)
+        coarse = self._coarse_scores(l2_normalize(query[:self.dims]), allowed)
+
+        picked = top_k_desc(coarse, max(top_k, self.candidates))
+        rows = np.sort(picked if allowed is None else allowed[picked])  # sorted = sequential reads
+
+        exact = l2_normalize(self._full[rows]) @ l2_normalize(query)
+        best = top_k_desc(exact, top_k)
+        return rows[best], exact[best]
@@ -0,0 +1,328 @@
+"""
+Compressed local indexes for the full corpus.
+
+- ScalarQuantizedIndex ("int8"): every dimension of the unit-normalised
+  vectors is mapped to int8 with a per-dimension scale and midpoint.
+  768 bytes/vector (4x smaller than float32), scores within ~1% of exact.
+- IVFPQIndex ("ivfpq"): k-means inverted lists + product quantization of
+  the residuals (m sub-vectors x 256 centroids, one byte each), searched
+  with asymmetric distance tables. ~m bytes/vector; recall traded for
+  memory via nprobe, and optionally restored by rescoring the best
+  candidates against the full vectors (`refine`).
+
+Both save to a directory of .npy files that load memory-mapped.
+"""
+
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.services.local_index.corpus import blocked_dot, l2_normalize, top_k_desc
+from app.services.local_index.kmeans import assign, kmeans
+
+META_FILE = "index.json"
+
+
+def _normalized_blocks(vectors: np.ndarray, block_rows: int = 65536):
+    """Yield (start, unit-normalised float32 block) without loading everything."""
+    for start in range(0, len(vectors), block_rows):
+        yield start, l2_normalize(vectors[start:start + block_rows])
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    (path / META_FILE).write_text(json.dumps(meta, indent=2))
+
+
+def _read_meta(path: Path, kind: str) -> dict:
+    meta = json.loads((Path(path) / META_FILE).read_text())
+    if meta.get("kind") != kind:
+        raise ValueError(f"{path} holds a {meta.get('kind')!r} index, expected {kind!r}")
+    return meta
+
+
+# ── int8 scalar quantization ─────────────────────────────────────────────
+
+class ScalarQuantizedIndex:
+    """Per-dimension int8 codes; score = codes @ (q * scale) + q . mid."""
+
+    kind = "int8"
+
+    def __init__(self, codes: np.ndarray, scale: np.ndarray, mid: np.ndarray):
+        self._codes = codes
+        self._scale = scale
+        self._mid = mid
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._codes, self._scale, self._mid)
+        return sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray) -> "ScalarQuantizedIndex":
+        lo = np.full(vectors.shape[1], np.inf, dtype=np.float32)
+        hi = np.full(vectors.shape[1], -np.inf, dtype=np.float32)
+        for _, block in _normalized_blocks(vectors):
+            lo = np.minimum(lo, block.min(axis=0))
+            hi = np.maximum(hi, block.max(axis=0))
+        mid = (hi + lo) / 2
+        scale = np.maximum((hi - lo) / 254.0, 1e-12).astype(np.float32)
+
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        for start, block in _normalized_blocks(vectors):
+            codes[start:start + len(block)] = np.clip(np.round((block - mid) / scale), -127, 127)
+        return cls(codes, scale, mid.astype(np.float32))
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, approximate cosine scores) of the best rows."""
+        q = l2_normalize(query)
+        q_scaled = q * self._scale
+        offset = float(q @ self._mid)
+        if allowed is None:
+            scores = blocked_dot(self._codes, q_scaled) + offset
+            best = top_k_desc(scores, top_k)
+            return best, scores[best]
+        scores = self._codes[allowed].astype(np.float32) @ q_scaled + offset
+        best = top_k_desc(scores, top_k)
+        return allowed[best], scores[best]
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        _write_meta(path, {"kind": self.kind, "count": len(self), "dim": int(self._codes.shape[1])})
+        np.save(path / "codes.npy", self._codes)
+        np.save(path / "scale.npy", self._scale)
+        np.save(path / "mid.npy", self._mid)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "ScalarQuantizedIndex":
+        path = Path(path)
+        _read_meta(path, cls.kind)
+        return cls(
+            np.load(path / "codes.npy", mmap_mode="r" if mmap else None),
+            np.load(path / "scale.npy"),
+            np.load(path / "mid.npy"),
+        )
+
+
+# ── IVF-PQ ───────────────────────────────────────────────────────────────
+
+class IVFPQIndex:
+    """
+    Inverted file + product quantization, inner-product metric.
+
+    Rows are stored grouped by IVF list: `codes[offsets[l]:offsets[l+1]]`
+    are the PQ codes of list `l`, and `row_ids` maps each stored position
+    back to the corpus row. For unit vectors x = c_l + r,
+        q . x = q . c_l + sum_j q_j . codebook_j[code_j]
+    so one (m, 256) lookup table per query scores every probed list.
+    """
+
+    kind = "ivfpq"
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        codes: np.ndarray,
+        offsets: np.ndarray,
+        row_ids: np.ndarray,
+        nprobe: int = 16,
+        refine: int = 0,
+        refine_vectors: Optional[np.ndarray] = None,
+    ):
+        self.centroids = centroids
+        self.codebooks = codebooks  # (m, ksub, dsub)
+        self.codes = codes          # (N, m) uint8, grouped by list
+        self.offsets = offsets      # (nlist + 1,)
+        self.row_ids = row_ids      # (N,) stored position -> corpus row
+        self.nprobe = nprobe
+        self.refine = refine
+        self.refine_vectors = refine_vectors
+        self._positions = None      # corpus row -> stored position, built on demand
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def m(self) -> int:
+        return self.codebooks.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.centroids, self.codebooks, self.codes, self.offsets, self.row_ids)
+        return sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: int = 0,
+        m: int = 96,
+        nprobe: int = 16,
+        iters: int = 10,
+        max_train: int = 65536,
+        seed: int = 0,
+        refine: int = 0,
+    ) -> "IVFPQIndex":
+        """Train lists and codebooks, then encode every vector.
+
+        `nlist=0` picks ~4*sqrt(N) lists. `m` must divide the dimension.
+        Codebooks are trained on at most 64 residuals per PQ centroid.
+        """
+        n, dim = vectors.shape
+        if dim % m:
+            raise ValueError(f"m ({m}) must divide the vector dimension ({dim})")
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), n // 39))
+        dsub = dim // m
+
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(n, size=min(n, max_train), replace=False))
+        train = l2_normalize(vectors[train_rows])
+
+        centroids = kmeans(train, nlist, iters=iters, seed=seed)
+        ksub = min(256, len(train))
+        pq_train = train[:64 * ksub]  # train rows are already a random sample
+        residuals = pq_train - centroids[assign(pq_train, centroids)]
+        codebooks = np.stack([
+            kmeans(residuals[:, j * dsub:(j + 1) * dsub], ksub, iters=iters, seed=seed + j)
+            for j in range(m)
+        ])
+
+        # Encode all vectors block by block
+        lists = np.empty(n, dtype=np.int64)
+        codes = np.empty((n, m), dtype=np.uint8)
+        for start, block in _normalized_blocks(vectors):
+            end = start + len(block)
+            lists[start:end] = assign(block, centroids)
+            res = block - centroids[lists[start:end]]
+            for j in range(m):
+                codes[start:end, j] = assign(res[:, j * dsub:(j + 1) * dsub], codebooks[j])
+
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=len(centroids)))))
+        return cls(
+            centroids.astype(np.float32),
+            codebooks.astype(np.float32),
+            codes[order],
+            offsets.astype(np.int64),
+            order.astype(np.int32),
+            nprobe=nprobe,
+            refine=refine,
+            refine_vectors=vectors if refine else None,
+        )
+
+    def _adc(self, lut: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Sum of lookup-table entries for each code row."""
+        return lut[np.arange(self.m), codes].sum(axis=1)
+
+    def _lists_of(self, positions: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.offsets, positions, side="right") - 1
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, approximate cosine scores) of the best rows.
+
+        With a filter smaller than what the probed lists would scan, the
+        allowed rows are scored directly so selective filters never come
+        back short.
+        """
+        q = l2_normalize(query)
+        dsub = self.codebooks.shape[2]
+        lut = np.einsum("jkd,jd->jk", self.codebooks, q.reshape(self.m, dsub))
+        list_scores = self.centroids @ q
+        want = max(top_k, self.refine)
+
+        expected_scan = len(self) * min(self.nprobe, self.nlist) / self.nlist
+        if allowed is not None and len(allowed) <= expected_scan:
+            if self._positions is None:
+                self._positions = np.argsort(self.row_ids)
+            positions = self._positions[allowed]
+            scores = list_scores[self._lists_of(positions)] + self._adc(lut, self.codes[positions])
+            rows = np.asarray(allowed)
+        else:
+            probe = top_k_desc(list_scores, self.nprobe)
+            mask = None
+            if allowed is not None:
+                mask = np.zeros(len(self), dtype=bool)
+                mask[allowed] = True
+            row_parts, score_parts = [], []
+            for lst in probe:
+                a, b = self.offsets[lst], self.offsets[lst + 1]
+                if a == b:
+                    continue
+                rows = np.asarray(self.row_ids[a:b])
+                codes = self.codes[a:b]
+                if mask is not None:
+                    keep = mask[rows]
+                    rows, codes = rows[keep], codes[keep]
+                row_parts.append(rows)
+                score_parts.append(list_scores[lst] + self._adc(lut, codes))
+            if not row_parts:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            rows = np.concatenate(row_parts)
+            scores = np.concatenate(score_parts)
+
+        best = top_k_desc(scores, want)
+        rows, scores = rows[best].astype(np.int64), scores[best]
+        if self.refine and self.refine_vectors is not None:
+            order = np.argsort(rows)
+            rows = rows[order]
+            scores = l2_normalize(self.refine_vectors[rows]) @ q
+            best = top_k_desc(scores, top_k)
+            return rows[best], scores[best]
+        return rows[:top_k], scores[:top_k]
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        _write_meta(path, {
+            "kind": self.kind, "count": len(self), "nlist": self.nlist,
+            "m": self.m, "ksub": int(self.codebooks.shape[1]), "nprobe": self.nprobe,
+        })
+        np.save(path / "centroids.npy", self.centroids)
+        np.save(path / "codebooks.npy", self.codebooks)
+        np.save(path / "codes.npy", self.codes)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "row_ids.npy", self.row_ids)
+        return path
+
+    @classmethod
+    def load(
+        cls,
+        path,
+        mmap: bool = True,
+        nprobe: Optional[int] = None,
+        refine: int = 0,
+        refine_vectors: Optional[np.ndarray] = None,
+    ) -> "IVFPQIndex":
+        path = Path(path)
+        meta = _read_meta(path, cls.kind)
+        mode = "r" if mmap else None
+        return cls(
+            np.load(path / "centroids.npy"),
+            np.load(path / "codebooks.npy"),
+            np.load(path / "codes.npy", mmap_mode=mode),
+            np.load(path / "offsets.npy"),
+            np.load(path / "row_ids.npy", mmap_mode=mode),
+            nprobe=nprobe or meta["nprobe"],
+            refine=refine,
+            refine_vectors=refine_vectors,
+        )
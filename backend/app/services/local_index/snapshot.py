@@ -0,0 +1,136 @@
+"""
+Namespace snapshots: copy a Pinecone namespace to local files and back.
+
+Export pages through every id with `index.list()`, fetches vectors and
+metadata in parallel batches, and writes the LocalCorpus layout
+(vectors.npy + metadata.parquet) plus a small snapshot.json manifest.
+Import upserts a snapshot into a namespace in parallel batches.
+
+Pinecone stores the document text in metadata["content"]; snapshots keep it
+in the `content` column instead, exactly like RAGService.query results.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.local_index.corpus import LocalCorpus
+
+MANIFEST_FILE = "snapshot.json"
+FETCH_BATCH = 100
+UPSERT_BATCH = 100
+
+
+def _page_ids(page) -> list[str]:
+    """Ids of one `index.list()` page (a plain list in pinecone-client, a ListResponse in newer SDKs)."""
+    if isinstance(page, list):
+        return page
+    return [v.id for v in page.vectors]
+
+
+def list_ids(index, namespace: str = "") -> list[str]:
+    """Every vector id in a namespace (serverless indexes only)."""
+    ids = []
+    for page in index.list(namespace=namespace):
+        ids.extend(_page_ids(page))
+    return ids
+
+
+def index_dimension(index) -> int:
+    """Vector dimension of a Pinecone index (settings.embedding_dimensions if stats are unavailable)."""
+    try:
+        return int(index.describe_index_stats().dimension)
+    except Exception:
+        return settings.embedding_dimensions
+
+
+def _batches(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def export_namespace(
+    index,
+    namespace: str,
+    path,
+    batch_size: int = FETCH_BATCH,
+    workers: int = 8,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> LocalCorpus:
+    """Fetch a whole namespace and save it as a snapshot directory at `path`.
+
+    Ids deleted between listing and fetching are skipped. `progress(done, total)`
+    is called after each fetched batch.
+    """
+    ids = list_ids(index, namespace)
+    batches = _batches(ids, batch_size)
+
+    out_ids, vectors, contents, metadata = [], [], [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = pool.map(lambda batch: index.fetch(ids=batch, namespace=namespace), batches)
+        for i, (batch, response) in enumerate(zip(batches, fetched)):
+            for doc_id in batch:
+                vec = response.vectors.get(doc_id)
+                if vec is None:
+                    continue
+                meta = dict(vec.metadata or {})
+                out_ids.append(doc_id)
+                vectors.append(vec.values)
+                contents.append(meta.pop("content", ""))
+                metadata.append(meta)
+            if progress:
+                progress(min((i + 1) * batch_size, len(ids)), len(ids))
+
+    # An empty namespace still needs a (0, dim) matrix; -1 can't be inferred from 0 rows
+    dim = len(vectors[0]) if vectors else index_dimension(index)
+    corpus = LocalCorpus(
+        ids=out_ids,
+        vectors=np.asarray(vectors, dtype=np.float32).reshape(len(out_ids), dim),
+        contents=contents,
+        metadata=metadata,
+        namespace=namespace,
+    )
+    path = corpus.save(path)
+    (path / MANIFEST_FILE).write_text(json.dumps({
+        "namespace": namespace,
+        "vectors": len(corpus),
+        "dim": corpus.dim,
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }, indent=2))
+    return corpus
+
+
+def import_namespace(
+    index,
+    path,
+    namespace: Optional[str] = None,
+    batch_size: int = UPSERT_BATCH,
+    workers: int = 8,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Upsert a snapshot into `namespace` (default: the one it was exported from).
+
+    Returns the number of vectors written.
+    """
+    corpus = LocalCorpus.load(path)
+    namespace = corpus.namespace if namespace is None else namespace
+    rows = _batches(list(range(len(corpus))), batch_size)
+
+    def upsert(batch: list[int]) -> int:
+        vectors = [
+            (corpus.ids[r], corpus.vectors[r].tolist(), {**corpus.metadata[r], "content": corpus.contents[r]})
+            for r in batch
+        ]
+        index.upsert(vectors=vectors, namespace=namespace)
+        return len(vectors)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for n in pool.map(upsert, rows):
+            done += n
+            if progress:
+                progress(done, len(corpus))
+    return done
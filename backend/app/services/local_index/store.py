@@ -0,0 +1,255 @@
+"""
+Local vector store: serves namespaces from snapshot directories on disk.
+
+Each namespace under `settings.local_index_dir` is loaded on first use and
+indexed with `settings.local_index_kind`. With "auto", small namespaces use
+exact search and namespaces of at least `settings.two_stage_min_vectors`
+use Matryoshka two-stage retrieval.
+
+Compressed indexes ("int8", "ivfpq") are loaded memory-mapped from
+`<namespace>/index-<kind>/` when present (see scripts/build_local_index.py)
+and built in memory otherwise.
+
+With "hnsw", documents ingested through the API are inserted into the
+loaded graph as well, and upserts/deletes tombstone the old row; `save`
+writes the namespace back so the changes survive a restart. The graph is
+only built on load for namespaces of up to `settings.hnsw_build_max_vectors`;
+larger ones without a prebuilt graph fall back to (read-only) exact search.
+"""
+
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.local_index.bitmap import MetadataIndex
+from app.services.local_index.corpus import LocalCorpus, namespace_dir
+from app.services.local_index.exact import ExactIndex
+from app.services.local_index.hnsw import HNSWIndex
+from app.services.local_index.matryoshka import MatryoshkaIndex
+from app.services.local_index.quantized import IVFPQIndex, ScalarQuantizedIndex
+
+INDEX_KINDS = ("auto", "exact", "matryoshka", "int8", "ivfpq", "hnsw")
+PERSISTED_KINDS = {"int8": ScalarQuantizedIndex, "ivfpq": IVFPQIndex, "hnsw": HNSWIndex}
+
+
+def index_dir(namespace_path: Path, kind: str) -> Path:
+    """Where a prebuilt index of `kind` lives inside a namespace directory."""
+    return Path(namespace_path) / f"index-{kind}"
+
+
+def build_index(kind: str, vectors: np.ndarray):
+    """Build a local index of `kind` over `vectors` using configured parameters."""
+    if kind == "exact":
+        return ExactIndex(vectors)
+    if kind == "matryoshka":
+        return MatryoshkaIndex(
+            vectors,
+            dims=settings.matryoshka_dims,
+            dtype=settings.matryoshka_dtype,
+            candidates=settings.matryoshka_candidates,
+        )
+    if kind == "int8":
+        return ScalarQuantizedIndex.build(vectors)
+    if kind == "ivfpq":
+        return IVFPQIndex.build(
+            vectors,
+            nlist=settings.ivf_nlist,
+            m=settings.pq_m,
+            nprobe=settings.ivf_nprobe,
+            refine=settings.ivfpq_refine,
+        )
+    if kind == "hnsw":
+        return HNSWIndex.build(
+            vectors,
+            M=settings.hnsw_m,
+            ef_construction=settings.hnsw_ef_construction,
+            ef_search=settings.hnsw_ef_search,
+        )
+    raise ValueError(f"Unknown local index kind: {kind}")
+
+
+def load_prebuilt_index(kind: str, corpus: LocalCorpus, prebuilt: Path):
+    """Memory-map the prebuilt index of `kind` in `prebuilt`."""
+    if kind == "ivfpq":
+        return IVFPQIndex.load(
+            prebuilt,
+            nprobe=settings.ivf_nprobe,
+            refine=settings.ivfpq_refine,
+            refine_vectors=corpus.vectors if settings.ivfpq_refine else None,
+        )
+    if kind == "hnsw":
+        return HNSWIndex.load(prebuilt, ef_search=settings.hnsw_ef_search)
+    return PERSISTED_KINDS[kind].load(prebuilt)
+
+
+def load_or_build_index(kind: str, corpus: LocalCorpus, namespace_path: Path):
+    """Memory-map a prebuilt index when one exists and covers the corpus, otherwise build it.
+
+    A prebuilt index with a different row count than the corpus (e.g. built
+    before the snapshot was re-exported) would map rows to the wrong
+    documents, so it is ignored. HNSW takes minutes to build in pure Python,
+    and this runs inside the first request for a namespace, so past
+    `settings.hnsw_build_max_vectors` exact search is served instead.
+    """
+    prebuilt = index_dir(namespace_path, kind)
+    problem = f"no {prebuilt}"
+    if kind in PERSISTED_KINDS and prebuilt.is_dir():
+        index = load_prebuilt_index(kind, corpus, prebuilt)
+        if len(index) == len(corpus):
+            return index
+        problem = f"{prebuilt} covers {len(index)} of {len(corpus)} vectors"
+        if kind != "hnsw" or len(corpus) <= settings.hnsw_build_max_vectors:
+            print(f"⚠ {problem}, rebuilding")
+    if kind == "hnsw" and len(corpus) > settings.hnsw_build_max_vectors:
+        print(f"⚠ {problem}; serving read-only exact search instead of building HNSW inside "
+              f"a request (run scripts/build_local_index.py --kind hnsw)")
+        return build_index("exact", corpus.vectors)
+    return build_index(kind, corpus.vectors)
+
+
+class LocalNamespace:
+    """A loaded corpus plus its search and metadata indexes."""
+
+    def __init__(self, corpus: LocalCorpus, index):
+        self.corpus = corpus
+        self.index = index
+        self.metadata_index = MetadataIndex(
+            corpus.metadata,
+            fields=[f.strip() for f in settings.metadata_index_fields.split(",") if f.strip()],
+        )
+        self._write_lock = threading.Lock()
+
+    @property
+    def mutable(self) -> bool:
+        """Whether the index accepts inserts and deletes (HNSW only)."""
+        return hasattr(self.index, "add")
+
+    def upsert(self, records: list[tuple[str, np.ndarray, str, dict]]) -> int:
+        """Insert (id, vector, content, metadata) records, tombstoning old rows of the same ids."""
+        if not self.mutable:
+            raise ValueError(f"{self.index.kind} indexes are read-only")
+        with self._write_lock:
+            for doc_id, vector, content, metadata in records:
+                old = self.corpus.row_of(doc_id)
+                if old is not None:
+                    self.index.delete(old)
+                row = self.corpus.append(doc_id, vector, content, metadata)
+                if self.index.add(vector) != row:
+                    raise RuntimeError("Local index and corpus rows are out of sync")
+            self.metadata_index.refresh()
+        return len(records)
+
+    def delete(self, ids: list[str]) -> int:
+        """Tombstone records by id; returns how many were live."""
+        if not self.mutable:
+            raise ValueError(f"{self.index.kind} indexes are read-only")
+        deleted = 0
+        with self._write_lock:
+            for doc_id in ids:
+                row = self.corpus.row_of(doc_id)
+                if row is not None and not self.index.is_deleted(row):
+                    self.index.delete(row)
+                    deleted += 1
+        return deleted
+
+    def save(self, path: Path) -> Path:
+        """Write the corpus and (for HNSW) the graph, tombstones included."""
+        with self._write_lock:
+            self.corpus.save(path)
+            if self.mutable:
+                self.index.save(index_dir(path, self.index.kind))
+        return path
+
+    def fetch(self, hits: list[tuple[str, float]]) -> Optional[list[dict]]:
+        """Records for (id, score) pairs, or None if any id is no longer live."""
+        records = []
+        for doc_id, score in hits:
+            row = self.corpus.row_of(doc_id)
+            if row is None or (self.mutable and self.index.is_deleted(row)):
+                return None
+            records.append(self.corpus.record(row, score))
+        return records
+
+    def query(self, embedding, top_k: int = 5, filter: Optional[dict] = None) -> list[dict]:
+        """Search this namespace; results match RAGService.query's format.
+
+        A metadata filter is resolved to row ids first, so the vector index
+        only scores matching rows.
+        """
+        allowed = self.metadata_index.select(filter) if filter else None
+        if allowed is not None and len(allowed) == 0:
+            return []
+        rows, scores = self.index.search(np.asarray(embedding, dtype=np.float32), top_k, allowed)
+        return [self.corpus.record(int(r), s) for r, s in zip(rows, scores)]
+
+
+class LocalVectorStore:
+    """Lazily loaded namespaces under a snapshot root directory."""
+
+    def __init__(self, root=None, index_kind: Optional[str] = None):
+        self.root = Path(root or settings.local_index_dir)
+        self.index_kind = index_kind or settings.local_index_kind
+        if self.index_kind not in INDEX_KINDS:
+            raise ValueError(f"local_index_kind must be one of {INDEX_KINDS}")
+        self._namespaces: dict[str, LocalNamespace] = {}
+        self._lock = threading.Lock()
+
+    def has_namespace(self, namespace: str) -> bool:
+        return namespace in self._namespaces or (self.root / namespace_dir(namespace)).is_dir()
+
+    def resolve_kind(self, n_vectors: int) -> str:
+        if self.index_kind != "auto":
+            return self.index_kind
+        return "matryoshka" if n_vectors >= settings.two_stage_min_vectors else "exact"
+
+    def get(self, namespace: str) -> LocalNamespace:
+        """Load (once) and return a namespace."""
+        if namespace not in self._namespaces:
+            with self._lock:
+                if namespace not in self._namespaces:
+                    path = self.root / namespace_dir(namespace)
+                    corpus = LocalCorpus.load(path, namespace=namespace)
+                    index = load_or_build_index(self.resolve_kind(len(corpus)), corpus, path)
+                    self._namespaces[namespace] = LocalNamespace(corpus, index)
+        return self._namespaces[namespace]
+
+    def query(self, namespace: str, embedding, top_k: int = 5, filter: Optional[dict] = None) -> list[dict]:
+        return self.get(namespace).query(embedding, top_k=top_k, filter=filter)
+
+    def fetch(self, namespace: str, hits: list[tuple[str, float]]) -> Optional[list[dict]]:
+        return self.get(namespace).fetch(hits)
+
+    def upsert(self, namespace: str, records: list[tuple[str, np.ndarray, str, dict]]) -> int:
+        """Mirror ingested records into a local namespace with a mutable index.
+
+        Returns 0 (and does nothing) when the namespace is not served locally
+        or its index is read-only; those snapshots are refreshed by re-export.
+        """
+        if not self.has_namespace(namespace):
+            return 0
+        loaded = self.get(namespace)
+        if not loaded.mutable:
+            return 0
+        return loaded.upsert(records)
+
+    def delete(self, namespace: str, ids: list[str]) -> int:
+        return self.get(namespace).delete(ids)
+
+    def save(self, namespace: str) -> Path:
+        return self.get(namespace).save(self.root / namespace_dir(namespace))
+
+    def stats(self) -> dict:
+        """Per loaded namespace: index kind, size and resident bytes."""
+        return {
+            namespace_dir(ns): {
+                "index": loaded.index.kind,
+                "vectors": len(loaded.corpus),
+                "index_bytes": loaded.index.nbytes,
+                **({"tombstones": loaded.index.tombstones} if loaded.mutable else {}),
+                "metadata_index": loaded.metadata_index.stats(),
+            }
+            for ns, loaded in self._namespaces.items()
+        }
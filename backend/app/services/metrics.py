@@ -0,0 +1,83 @@
+"""
+Lightweight in-process metrics for the RAG service.
+
+Latency is tracked per named stage (embed, search, ...) over a rolling
+window so /api/rag/stats can report recent percentiles without a metrics
+backend. `request_stages()` additionally collects the stage timings of the
+current request (e.g. for the query log).
+"""
+
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Stage timings of the request being served, when a caller asked for them
+_request_stages: ContextVar[Optional[dict]] = ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def request_stages():
+    """Collect {stage: ms} for every tracked stage inside the block.
+
+    Tasks spawned inside (asyncio.gather, to_thread) share the same dict.
+    """
+    stages: dict = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class LatencyTracker:
+    """Rolling per-stage latency samples (milliseconds)."""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+
+    def record(self, stage: str, ms: float) -> None:
+        """Add one sample for `stage`."""
+        if stage not in self._samples:
+            self._samples[stage] = deque(maxlen=self.window)
+            self._counts[stage] = 0
+        self._samples[stage].append(ms)
+        self._counts[stage] += 1
+
+    @contextmanager
+    def track(self, stage: str):
+        """`with latency.track("search"): ...`"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self.record(stage, ms)
+            stages = _request_stages.get()
+            if stages is not None:
+                stages[stage] = round(stages.get(stage, 0.0) + ms, 3)
+
+    def snapshot(self) -> dict:
+        """Count and p50/p95/p99 per stage over the current window."""
+        out = {}
+        for stage, samples in self._samples.items():
+            values = sorted(samples)
+            out[stage] = {
+                "count": self._counts[stage],
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+            }
+        return out
@@ -0,0 +1,151 @@
+"""
+Sampled query log in NDJSON, for capacity planning and traffic replay.
+
+One compact JSON object per served /api/rag/query:
+
+    {"ts": 1760850000.123, "query_hash": "3f2a...", "query": "...",
+     "namespace": "system-prompts-anthropic", "top_k": 5, "category": null,
+     "filter": null, "stages_ms": {"embed": 88.1, "search": 41.7},
+     "result_ids": ["...", "..."]}
+
+`log()` only samples and enqueues; a daemon thread serialises and appends
+in batches, so request handlers never wait on disk. When the queue is full
+records are dropped (and counted) rather than blocking. The file rotates
+at `max_bytes` to <path>.1 ... <path>.<backups>.
+
+Replay with scripts/replay_query_log.py; build answer packs from it with
+scripts/build_answer_pack.py.
+"""
+
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+
+class QueryLogWriter:
+    """Non-blocking, sampled, size-rotated NDJSON appender."""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        sample_rate: float = 1.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        backups: int = 5,
+        queue_size: int = 10_000,
+    ):
+        self.path = Path(path) if path else None
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._counters = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None and self.sample_rate > 0
+
+    def log(self, record: dict) -> bool:
+        """Sample and enqueue one record; True if it will be written."""
+        if not self.enabled:
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._counters["sampled_out"] += 1
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._counters["dropped"] += 1
+            return False
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self) -> None:
+        f = open(self.path, "a", encoding="utf-8")
+        size = f.tell()
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                batch = [record]
+                # Drain whatever else is waiting into the same write
+                while len(batch) < 1024:
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(record)
+                data = "".join(
+                    json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in batch
+                )
+                f.write(data)
+                f.flush()
+                size += len(data.encode("utf-8"))
+                self._counters["written"] += len(batch)
+                if size >= self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                    size = 0
+        finally:
+            f.close()
+
+    def _rotate(self) -> None:
+        """queries.ndjson -> .1 -> .2 ...; the oldest backup is discarded."""
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._counters["rotations"] += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued records and stop the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path) if self.path else None,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "written": self._counters["written"],
+            "sampled_out": self._counters["sampled_out"],
+            "dropped": self._counters["dropped"],
+            "rotations": self._counters["rotations"],
+        }
+
+
+query_log = QueryLogWriter(
+    settings.query_log_path or None,
+    sample_rate=settings.query_log_sample_rate,
+    max_bytes=settings.query_log_max_mb * 1024 * 1024,
+    backups=settings.query_log_backups,
+)
@@ -6,17 +6,41 @@ Architecture:
 - Pinecone: Stores all 20,800+ prompts across vendor/modality namespaces
 
 Query Flow:
-1. Embed query with Gemini
-2. Search Pinecone (full corpus, namespace-routed)
-3. Return top-K results
+1. Repeated query: rehydrate its cached result ids (CACHE_BACKEND; shared
+   across workers with "shared"), skipping steps 2-4
+2. Embed query with Gemini (embedding cache first)
+3. Answer from the precomputed answer pack when the query is close to a
+   frequent-intent centroid (ANSWER_PACK_PATH)
+4. Otherwise search Pinecone (full corpus, namespace-routed), or the local
+   snapshot of the namespace when LOCAL_INDEX_DIR has one
+5. Return top-K results
+
+query_progressive streams the same search followed by LLM rerank and
+judge stages (see app/services/refine.py).
+
+Gemini and Pinecone clients are blocking, so upstream calls run in worker
+threads; the event loop stays free to admit or shed other requests.
 """
 
+import asyncio
+import math
+import time
 import uuid
+from collections import Counter
 from typing import Optional, List
 from google import genai
 from pinecone import Pinecone, ServerlessSpec
 
 from app.config import settings
+from app.services.answer_pack import AnswerPack
+from app.services.cache import EmbeddingCache, ResultCache, make_table
+from app.services.local_index import LocalVectorStore, combine_filters
+from app.services.local_index.snapshot import list_ids
+from app.services.metrics import LatencyTracker
+from app.services import refine
+
+VIDEO_NAMESPACE = "video-prompts"
+NEGATIVE_NAMESPACE = "video-negative-prompts"
 
 
 class RAGService:
@@ -31,6 +55,44 @@ class RAGService:
         """Initialize connections."""
         self._pinecone_index = None
         self._genai_client = None
+        self.latency = LatencyTracker()
+        self.local_store = LocalVectorStore() if settings.local_index_dir else None
+        self.answer_pack = self._load_answer_pack()
+        self._pack_counters = Counter()
+        
+        # Query embedding + result id caches (per process or shared, CACHE_BACKEND)
+        self.embedding_cache = EmbeddingCache(
+            make_table("embeddings", settings.embedding_cache_slots, 2 * settings.embedding_dimensions),
+            model="gemini-embedding-001",
+            dim=settings.embedding_dimensions,
+        )
+        self.result_cache = ResultCache(
+            make_table("results", settings.result_cache_slots, settings.result_cache_slot_bytes),
+            ttl_s=settings.result_cache_ttl_s,
+        )
+        
+        # /stats snapshot (stale-while-revalidate, see get_stats)
+        self._stats_snapshot = None
+        self._stats_refreshed_at = 0.0
+        self._stats_refresh_task = None
+        self._stats_counters = Counter()
+        
+        # Negative-prompt library by category (see query_video); preloaded at
+        # startup, retried after settings.negative_library_retry_s on failure
+        self._negative_library: dict = {}
+        self._negative_library_task = None
+        self._negative_library_retry_at = 0.0  # inf once loaded
+        self._negative_library_counters = Counter()
+    
+    def _load_answer_pack(self) -> Optional[AnswerPack]:
+        """Load the precomputed answer pack, if one is configured and built."""
+        if not settings.answer_pack_path:
+            return None
+        try:
+            return AnswerPack.load(settings.answer_pack_path, min_similarity=settings.answer_pack_min_similarity)
+        except FileNotFoundError:
+            print(f"⚠ No answer pack at {settings.answer_pack_path}; serving every query from the index")
+            return None
     
     def _get_genai_client(self):
         """Get or create Gemini client."""
@@ -53,7 +115,11 @@ class RAGService:
         return result.embeddings[0].values
     
     def embed_query(self, text: str) -> List[float]:
-        """Generate query embedding using Gemini."""
+        """Generate query embedding using Gemini (served from the embedding cache when seen)."""
+        cached = self.embedding_cache.get(text)
+        if cached is not None:
+            return cached
+        
         client = self._get_genai_client()
         
         if not client:
@@ -64,6 +130,7 @@ class RAGService:
             contents=text,
             config={"task_type": "RETRIEVAL_QUERY", "output_dimensionality": settings.embedding_dimensions},
         )
+        self.embedding_cache.put(text, result.embeddings[0].values)
         return result.embeddings[0].values
     
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
@@ -115,35 +182,163 @@ class RAGService:
         category: Optional[str] = None,
         modality: str = "text",
         namespace: Optional[str] = None,
+        filter: Optional[dict] = None,
     ) -> List[dict]:
         """
         Query Pinecone for similar prompts.
         
         Namespace logic:
         - If 'namespace' is provided explicitly, use it.
-        - Else if modality="video", use "video-prompts".
+        - Else if modality="video", use "video-prompts" (see query_video for
+          prompts paired with negative prompts).
         - Else use default namespace (None).
+        
+        `filter` is a Pinecone-style metadata filter ($and, $or, $in, ...),
+        ANDed with `category` when both are given.
         """
         # Determine namespace
-        target_namespace = namespace
-        if not target_namespace:
-            if modality == "video":
-                target_namespace = "video-prompts"
+        target_namespace = self.resolve_namespace(namespace, modality)
+        
+        # Build metadata filter
+        filter_dict = combine_filters({"category": category} if category else None, filter)
+        
+        # Repeated queries: cached result ids, rehydrated without embedding or searching
+        hits = self.result_cache.get(target_namespace, query, top_k, filter_dict)
+        if hits is not None:
+            with self.latency.track("result_cache"):
+                cached = await asyncio.to_thread(self._hydrate, target_namespace, hits)
+            if cached is not None:
+                return cached
         
         # Embed query and search Pinecone
-        query_embedding = self.embed_query(query)
+        with self.latency.track("embed"):
+            query_embedding = await asyncio.to_thread(self.embed_query, query)
         
-        # Build filter for Pinecone
-        filter_dict = {"category": category} if category else None
+        # Frequent intents are answered from the precomputed pack
+        if self.answer_pack:
+            with self.latency.track("answer_pack"):
+                packed = self.answer_pack.lookup(query_embedding, target_namespace, top_k, filter_dict)
+            self._pack_counters["hits" if packed is not None else "misses"] += 1
+            if packed is not None:
+                return packed
         
-        # Query Pinecone with namespace
-        results = self.pinecone_index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True,
-            filter=filter_dict,
-            namespace=target_namespace or ""  # Pinecone uses "" for default
+        results = await self.search(target_namespace, query_embedding, top_k, filter_dict)
+        self.result_cache.put(target_namespace, query, top_k, filter_dict, results)
+        return results
+    
+    def _hydrate(self, namespace: str, hits: List[tuple]) -> Optional[List[dict]]:
+        """Full results for cached (id, score) pairs; None if any record is gone."""
+        if self.local_store and self.local_store.has_namespace(namespace):
+            return self.local_store.fetch(namespace, hits)
+        if not hits:
+            return []
+        response = self.pinecone_index.fetch(ids=[doc_id for doc_id, _ in hits], namespace=namespace)
+        vectors = response.vectors
+        if any(doc_id not in vectors for doc_id, _ in hits):
+            return None
+        results = []
+        for doc_id, score in hits:
+            metadata = dict(vectors[doc_id].metadata or {})
+            results.append({
+                "id": doc_id,
+                "content": metadata.pop("content", ""),
+                "similarity": score,
+                "metadata": metadata,
+            })
+        return results
+    
+    async def query_progressive(
+        self,
+        query: str,
+        top_k: int = 5,
+        category: Optional[str] = None,
+        modality: str = "text",
+        namespace: Optional[str] = None,
+        filter: Optional[dict] = None,
+        vendor: str = "",
+        stages: tuple = ("rerank", "judge"),
+    ):
+        """
+        Progressive retrieval: yields {"stage", "results", "elapsed_ms"}
+        as each level finishes.
+        
+        - naive:  embedding search; top_k of a REFINE_CANDIDATES-wide pool
+        - rerank: the pool re-sorted by an LLM relevance score
+        - judge:  the top top_k+2 reranked docs, each kept only if an LLM
+                  judges it useful (judged concurrently)
+        
+        The naive stage arrives in embed + search time; the LLM stages
+        follow seconds later. Consumers can render each stage as it comes.
+        """
+        t0 = time.perf_counter()
+        elapsed_ms = lambda: round((time.perf_counter() - t0) * 1000, 1)
+        
+        target_namespace = self.resolve_namespace(namespace, modality)
+        with self.latency.track("embed"):
+            query_embedding = await asyncio.to_thread(self.embed_query, query)
+        filter_dict = combine_filters({"category": category} if category else None, filter)
+        pool = await self.search(
+            target_namespace, query_embedding, max(top_k, settings.refine_candidates), filter_dict
         )
+        yield {"stage": "naive", "results": pool[:top_k], "elapsed_ms": elapsed_ms()}
+        
+        if not pool:
+            return
+        client = self._get_genai_client()
+        
+        if "rerank" in stages:
+            with self.latency.track("rerank"):
+                pool = await asyncio.to_thread(refine.rerank, client, query, pool)
+            yield {"stage": "rerank", "results": pool[:top_k], "elapsed_ms": elapsed_ms()}
+        
+        if "judge" in stages:
+            shortlist = pool[:top_k + 2]
+            with self.latency.track("judge"):
+                verdicts = await asyncio.gather(*(
+                    asyncio.to_thread(refine.judge, client, query, doc, vendor) for doc in shortlist
+                ))
+            judged = [
+                {**doc, "judge_reasoning": verdict["reasoning"]}
+                for doc, verdict in zip(shortlist, verdicts)
+                if verdict["useful"]
+            ]
+            yield {"stage": "judge", "results": judged[:top_k], "elapsed_ms": elapsed_ms()}
+    
+    @staticmethod
+    def resolve_namespace(namespace: Optional[str] = None, modality: str = "text") -> str:
+        """Namespace a query is served from ("" is Pinecone's default)."""
+        if namespace:
+            return namespace
+        return VIDEO_NAMESPACE if modality == "video" else ""
+    
+    async def search(
+        self,
+        namespace: str,
+        query_embedding: List[float],
+        top_k: int,
+        filter_dict: Optional[dict] = None,
+    ) -> List[dict]:
+        """Search one namespace: the local snapshot when there is one, else Pinecone."""
+        if self.local_store and self.local_store.has_namespace(namespace):
+            with self.latency.track("local_search"):
+                return await asyncio.to_thread(
+                    self.local_store.query,
+                    namespace,
+                    query_embedding,
+                    top_k=top_k,
+                    filter=filter_dict,
+                )
+        
+        # Query Pinecone with namespace
+        with self.latency.track("search"):
+            results = await asyncio.to_thread(
+                self.pinecone_index.query,
+                vector=query_embedding,
+                top_k=top_k,
+                include_metadata=True,
+                filter=filter_dict,
+                namespace=namespace,  # Pinecone uses "" for default
+            )
         
         # Format results
         formatted = []
@@ -157,6 +352,89 @@ class RAGService:
         
         return formatted[:top_k]
     
+    async def query_video(
+        self,
+        query: str,
+        top_k: int = 5,
+        negative_top_k: int = 3,
+        category: Optional[str] = None,
+        filter: Optional[dict] = None,
+    ) -> dict:
+        """
+        Video prompts plus matching negative prompts from one embedding.
+        
+        Both namespaces are searched concurrently. Each video prompt is paired
+        with the negative-prompt library entry of its own category (looked up
+        in an in-memory map preloaded at startup), falling back to the best
+        semantic negative hit, e.g. while the library is unavailable.
+        """
+        with self.latency.track("embed"):
+            query_embedding = await asyncio.to_thread(self.embed_query, query)
+        
+        filter_dict = combine_filters({"category": category} if category else None, filter)
+        prompts, negatives, library = await asyncio.gather(
+            self.search(VIDEO_NAMESPACE, query_embedding, top_k, filter_dict),
+            self.search(NEGATIVE_NAMESPACE, query_embedding, negative_top_k),
+            self._get_negative_library(),
+        )
+        
+        for prompt in prompts:
+            entry = library.get(prompt["metadata"].get("category"))
+            if entry is not None:
+                prompt["negative"] = {**entry, "match": "category"}
+            elif negatives:
+                prompt["negative"] = {**negatives[0]["metadata"], "match": "semantic"}
+            else:
+                prompt["negative"] = None
+        return {"results": prompts, "negatives": negatives}
+    
+    async def _get_negative_library(self) -> dict:
+        """
+        category -> negative-prompt library entry. Never raises.
+        
+        Only the first requests wait on the startup load; after a failed load
+        the empty map is served (semantic-only pairing) and a reload is
+        started in the background once the retry backoff has passed.
+        """
+        task = self._negative_library_task
+        first_load = not (self._negative_library_counters["loads"] or self._negative_library_counters["errors"])
+        if task is not None and not task.done() and first_load:
+            await asyncio.shield(task)
+        elif time.monotonic() >= self._negative_library_retry_at:
+            self.schedule_negative_library_load()
+        return self._negative_library
+    
+    def schedule_negative_library_load(self) -> asyncio.Task:
+        """Start loading the negative-prompt library unless a load is in flight."""
+        if self._negative_library_task is None or self._negative_library_task.done():
+            self._negative_library_task = asyncio.create_task(self._load_negative_library())
+        return self._negative_library_task
+    
+    async def _load_negative_library(self) -> None:
+        """Fetch the whole (small) negative namespace. Never raises."""
+        try:
+            records = await asyncio.to_thread(self._load_namespace_metadata, NEGATIVE_NAMESPACE)
+        except Exception as e:
+            self._negative_library_counters["errors"] += 1
+            self._negative_library_retry_at = time.monotonic() + settings.negative_library_retry_s
+            print(f"⚠ Negative-prompt library load failed ({e}); pairing negatives semantically, "
+                  f"retrying in {settings.negative_library_retry_s:.0f}s")
+            return
+        self._negative_library = {meta["category"]: meta for meta in records if meta.get("category")}
+        self._negative_library_retry_at = math.inf
+        self._negative_library_counters["loads"] += 1
+    
+    def _load_namespace_metadata(self, namespace: str) -> List[dict]:
+        """Metadata of every record in a (small) namespace."""
+        if self.local_store and self.local_store.has_namespace(namespace):
+            return list(self.local_store.get(namespace).corpus.metadata)
+        records = []
+        ids = list_ids(self.pinecone_index, namespace)
+        for start in range(0, len(ids), 100):
+            response = self.pinecone_index.fetch(ids=ids[start:start + 100], namespace=namespace)
+            records.extend(dict(vec.metadata or {}) for vec in response.vectors.values())
+        return records
+    
     async def ingest_to_pinecone(
         self,
         content: str,
@@ -166,15 +444,17 @@ class RAGService:
         doc_id = str(uuid.uuid4())
         
         # Generate embedding with Gemini
-        embedding = self.embed_text(content)
+        embedding = await asyncio.to_thread(self.embed_text, content)
         
         # Store in Pinecone with content in metadata
         doc_metadata = metadata or {}
         doc_metadata["content"] = content
         
-        self.pinecone_index.upsert(
-            vectors=[(doc_id, embedding, doc_metadata)]
+        await asyncio.to_thread(
+            self.pinecone_index.upsert,
+            vectors=[(doc_id, embedding, doc_metadata)],
         )
+        await self._mirror_local([(doc_id, embedding, doc_metadata)])
         
         return doc_id
     
@@ -195,7 +475,7 @@ class RAGService:
             doc_ids.append(doc_id)
             
             # Generate embedding with Gemini
-            embedding = self.embed_text(doc["content"])
+            embedding = await asyncio.to_thread(self.embed_text, doc["content"])
             
             # Prepare metadata
             metadata = doc.get("metadata", {})
@@ -205,18 +485,99 @@ class RAGService:
             
             # Batch upsert to Pinecone
             if len(vectors) >= batch_size:
-                self.pinecone_index.upsert(vectors=vectors)
+                await asyncio.to_thread(self.pinecone_index.upsert, vectors=vectors)
+                await self._mirror_local(vectors)
                 vectors = []
                 print(f"  Ingested batch {i // batch_size + 1}")
         
         # Upsert remaining
         if vectors:
-            self.pinecone_index.upsert(vectors=vectors)
+            await asyncio.to_thread(self.pinecone_index.upsert, vectors=vectors)
+            await self._mirror_local(vectors)
         
         return doc_ids
     
-    async def get_stats(self) -> dict:
-        """Get RAG system statistics."""
+    async def _mirror_local(self, vectors: list, namespace: str = "") -> None:
+        """
+        Propagate freshly upserted vectors: drop cached result lists and
+        the namespace's answer-pack entries (new documents can change any
+        ranking) and insert the vectors into the local namespace, if it is
+        live-updatable.
+        """
+        self.result_cache.invalidate()
+        if self.answer_pack:
+            self.answer_pack.invalidate(namespace)
+        if self.local_store is None:
+            return
+        records = [
+            (doc_id, embedding, metadata["content"],
+             {k: v for k, v in metadata.items() if k != "content"})
+            for doc_id, embedding, metadata in vectors
+        ]
+        await asyncio.to_thread(self.local_store.upsert, namespace, records)
+    
+    async def get_stats(self, fresh: bool = False) -> dict:
+        """
+        Get RAG system statistics.
+        
+        Index stats come from a snapshot that is refreshed in the background
+        once older than settings.stats_ttl_s, so polling dashboards never wait
+        on describe_index_stats(). `fresh=True` forces a refresh first.
+        Service latency and cache metrics are always live.
+        """
+        if fresh or self._stats_snapshot is None:
+            self._stats_counters["misses"] += 1
+            await self._schedule_stats_refresh()
+        else:
+            self._stats_counters["hits"] += 1
+            if time.monotonic() - self._stats_refreshed_at > settings.stats_ttl_s:
+                self._schedule_stats_refresh()
+        
+        age_s = time.monotonic() - self._stats_refreshed_at
+        stats = dict(self._stats_snapshot)
+        stats["snapshot"] = {
+            "age_s": round(age_s, 2),
+            "ttl_s": settings.stats_ttl_s,
+            "stale": age_s > settings.stats_ttl_s,
+        }
+        stats["latency"] = self.latency.snapshot()
+        stats["caches"] = self.cache_stats()
+        if self.local_store:
+            stats["local_index"] = self.local_store.stats()
+        return stats
+    
+    def cache_stats(self) -> dict:
+        """Hit/miss counters for the service's caches."""
+        return {
+            "stats_snapshot": {
+                "hits": self._stats_counters["hits"],
+                "misses": self._stats_counters["misses"],
+                "refreshes": self._stats_counters["refreshes"],
+                "refresh_errors": self._stats_counters["refresh_errors"],
+            },
+            **{name: cache.stats() for name, cache in
+               (("embeddings", self.embedding_cache), ("results", self.result_cache))
+               if cache.table is not None},
+            "negative_library": {
+                "entries": len(self._negative_library),
+                "loads": self._negative_library_counters["loads"],
+                "errors": self._negative_library_counters["errors"],
+            },
+            **({"answer_pack": {
+                "hits": self._pack_counters["hits"],
+                "misses": self._pack_counters["misses"],
+                **self.answer_pack.stats(),
+            }} if self.answer_pack else {}),
+        }
+    
+    def _schedule_stats_refresh(self) -> asyncio.Task:
+        """Start a snapshot refresh unless one is already in flight."""
+        if self._stats_refresh_task is None or self._stats_refresh_task.done():
+            self._stats_refresh_task = asyncio.create_task(self._refresh_stats())
+        return self._stats_refresh_task
+    
+    async def _refresh_stats(self) -> None:
+        """Rebuild the index stats snapshot. Never raises."""
         stats = {
             "embedding_model": "gemini-embedding-001",
             "embedding_dimensions": settings.embedding_dimensions,
@@ -230,9 +591,26 @@ class RAGService:
         # Get Pinecone stats
         if settings.pinecone_api_key:
             try:
-                index_stats = self.pinecone_index.describe_index_stats()
+                with self.latency.track("describe_index_stats"):
+                    index_stats = await asyncio.to_thread(
+                        lambda: self.pinecone_index.describe_index_stats()
+                    )
                 stats["pinecone"]["total_vectors"] = index_stats.total_vector_count
+                stats["pinecone"]["dimension"] = index_stats.dimension
+                stats["pinecone"]["index_fullness"] = index_stats.index_fullness
+                stats["pinecone"]["namespaces"] = {
+                    ns or "__default__": summary.vector_count
+                    for ns, summary in (index_stats.namespaces or {}).items()
+                }
+                if self.answer_pack:
+                    # Other workers' ingests only show up as changed counts
+                    self.answer_pack.check_versions({
+                        ns: summary.vector_count for ns, summary in (index_stats.namespaces or {}).items()
+                    })
             except Exception:
+                self._stats_counters["refresh_errors"] += 1
                 stats["pinecone"]["total_vectors"] = "unknown"
         
-        return stats
+        self._stats_snapshot = stats
+        self._stats_refreshed_at = time.monotonic()
+        self._stats_counters["refreshes"] += 1
@@ -0,0 +1,73 @@
+"""
+LLM refinement stages for progressive retrieval.
+
+The API-side counterparts of the L2 (rerank) and L4 (judge) levels in
+research/rag_methods.py, using the same prompts and Gemini Flash:
+
+- rerank: one call scores every candidate 1-10, candidates are re-sorted
+- judge:  one call per document decides whether it is a useful reference
+
+Both take the blocking genai client and run in worker threads. Failures
+degrade gracefully (similarity order, or keeping the document) so a flaky
+LLM never loses results that were already shown.
+"""
+
+import json
+from typing import List
+
+from app.config import settings
+
+
+def rerank(client, query: str, docs: List[dict]) -> List[dict]:
+    """Docs re-sorted by LLM relevance; each gains `rerank_score` (1-10)."""
+    prompt = f"""Score how relevant each document is to this query on a 1-10 scale.
+Query: "{query}"
+
+Documents:
+"""
+    for i, d in enumerate(docs):
+        prompt += f"\n[{i}] {d['content'][:300]}\n"
+    prompt += "\nRespond with JSON array of scores: [{\"index\": 0, \"score\": 8}, ...]"
+
+    scores = {}
+    try:
+        resp = client.models.generate_content(
+            model=settings.refine_model,
+            contents=prompt,
+            config={"temperature": 0.1, "response_mime_type": "application/json"},
+        )
+        for item in json.loads(resp.text):
+            idx = item.get("index", 0)
+            if 0 <= idx < len(docs):
+                scores[idx] = float(item.get("score", 5))
+    except Exception as e:
+        print(f"⚠ Rerank scoring failed: {e}, using similarity order")
+
+    reranked = [
+        {**d, "rerank_score": scores.get(i, d.get("similarity", 0.5) * 10)}
+        for i, d in enumerate(docs)
+    ]
+    reranked.sort(key=lambda d: d["rerank_score"], reverse=True)
+    return reranked
+
+
+def judge(client, query: str, doc: dict, vendor: str = "") -> dict:
+    """{"useful": bool, "reasoning": str} for one retrieved document."""
+    target = f"a {vendor} system prompt" if vendor else "a system prompt"
+    prompt = f"""Is this document useful as a reference for generating {target}?
+
+User request: "{query}"
+Document snippet: "{doc['content'][:500]}"
+
+Respond JSON: {{"useful": true/false, "reasoning": "brief explanation"}}"""
+
+    try:
+        resp = client.models.generate_content(
+            model=settings.refine_model,
+            contents=prompt,
+            config={"temperature": 0.1, "response_mime_type": "application/json"},
+        )
+        verdict = json.loads(resp.text)
+        return {"useful": bool(verdict.get("useful", True)), "reasoning": verdict.get("reasoning", "")}
+    except Exception:
+        return {"useful": True, "reasoning": "Judge failed, keeping doc"}
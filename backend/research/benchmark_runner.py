@@ -15,6 +15,7 @@ Hardware: Azure ML Standard_NC24ads_A100_v4 (A100 80GB)
 
 Usage:
     python -m research.benchmark_runner --study A
+    python -m research.benchmark_runner --study A --isolated   # standalone retrieval latency
     python -m research.benchmark_runner --study B --round 1
     python -m research.benchmark_runner --study B --round all
     python -m research.benchmark_runner --study C
@@ -22,6 +23,8 @@ Usage:
 """
 
 import argparse
+import asyncio
+import csv
 import json
 import os
 import time
@@ -31,10 +34,15 @@ from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
+from research import replay
+from research.context_packer import pack_context
 from research.test_suite import ALL_TEST_PROMPTS, TestPrompt
 from research.llm_judge import LLMJudge, BenchmarkResult, JudgeScore
 from research.llm_judge import aggregate_scores, format_summary_table
-from research.rag_methods import RAG_METHODS, run_rag_method
+from research.rag_methods import (
+    RAG_METHODS, WEB_CACHE, RAGPipeline, RAGResult, RetrievalCache, arun_rag_methods,
+    run_rag_method,
+)
 
 RESULTS_DIR = Path(__file__).parent / "results"
 RESULTS_DIR.mkdir(exist_ok=True)
@@ -97,16 +105,68 @@ def generate_system_prompt(
     return output, latency
 
 
+# ── Retrieval ────────────────────────────────────────────────────────────
+
+def prefetch_retrievals(
+    prompts: list[TestPrompt], methods: list[str], top_k: int = 3,
+    cache: RetrievalCache = None, isolated: bool = False,
+) -> dict[tuple[str, str], RAGResult]:
+    """Retrieve context for every (prompt, method) pair concurrently.
+
+    Methods for the same prompt share one RAGPipeline, so their common
+    stages run once; with a `cache`, pairs retrieved by an earlier run are
+    read back instead. Generation and judging stay sequential.
+
+    Shared, concurrent retrieval makes `retrieval_ms` a level's incremental
+    latency: it excludes stages another level computed first and includes
+    contention. `isolated=True` retrieves each pair on its own pipeline,
+    one at a time and without reading the cache, so `retrieval_ms` is the
+    level's standalone latency (comparable with runs before prefetching).
+    """
+    pairs = [(test, method) for test in prompts for method in methods]
+    mode = "isolated, sequential" if isolated else "shared pipelines, concurrent"
+    print(f"Retrieving {len(pairs)} contexts ({len(prompts)} prompts × {len(methods)} methods, {mode})...")
+    t0 = time.time()
+    if isolated:
+        results = []
+        for test, method in pairs:
+            result = run_rag_method(method, query=test.user_prompt, vendor=test.target_vendor,
+                                    top_k=top_k, pipeline=RAGPipeline())
+            if cache is not None and method != "L0_no_rag":
+                cache.put(method, test.user_prompt, test.target_vendor, top_k, result, mode="isolated")
+            results.append(result)
+    else:
+        pipelines = {test.id: RAGPipeline() for test in prompts}
+        results = asyncio.run(arun_rag_methods([
+            {"method_name": method, "query": test.user_prompt,
+             "vendor": test.target_vendor, "top_k": top_k,
+             "pipeline": pipelines[test.id], "cache": cache}
+            for test, method in pairs
+        ]))
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    cached = f", {cache.hits} from cache" if cache is not None else ""
+    print(f"  done in {time.time() - t0:.1f}s{cached}")
+    return {(test.id, method): result for (test, method), result in zip(pairs, results)}
+
+
 # ── Study A: RAG Architecture ───────────────────────────────────────────
 
 def run_study_a(
     prompts: list[TestPrompt] = None,
     methods: list[str] = None,
     model: str = "gemini-2.5-pro-preview-05-06",
+    cache: RetrievalCache = None,
+    isolated: bool = False,
 ) -> list[BenchmarkResult]:
-    """Run all RAG methods across test prompts."""
+    """Run all RAG methods across test prompts.
+
+    latency_ms includes the level's retrieval_ms, which is incremental
+    unless `isolated` (see prefetch_retrievals).
+    """
     from google import genai
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    client = replay.gemini_client(lambda: genai.Client(api_key=os.getenv("GOOGLE_API_KEY")))
     judge = LLMJudge()
 
     prompts = prompts or ALL_TEST_PROMPTS
@@ -118,23 +178,20 @@ def run_study_a(
     print(f"Prompts: {len(prompts)} | Methods: {len(methods)}")
     print(f"{'='*60}\n")
 
+    # Step 1: Retrieve context for every prompt × method up front
+    retrievals = prefetch_retrievals(prompts, methods, cache=cache, isolated=isolated)
+
     for method_name in methods:
         print(f"\n--- Method: {method_name} ---")
         for i, test in enumerate(prompts):
             print(f"  [{i+1}/{len(prompts)}] {test.id}: {test.user_prompt[:50]}...")
 
-            # Step 1: Retrieve context
-            rag_result = run_rag_method(
-                method_name, query=test.user_prompt,
-                vendor=test.target_vendor, top_k=3,
-            )
-            context = "\n---\n".join(
-                d["content"][:1000] for d in rag_result.documents
-            )
+            rag_result = retrievals[(test.id, method_name)]
+            packed = pack_context(test.user_prompt, rag_result.documents)
 
             # Step 2: Generate system prompt
             output, latency = generate_system_prompt(
-                client, test, rag_context=context, model=model,
+                client, test, rag_context=packed.text, model=model,
             )
 
             # Step 3: Judge
@@ -154,7 +211,13 @@ def run_study_a(
                 latency_ms=latency + rag_result.retrieval_ms,
                 cost_usd=0.0,
                 metadata={"rag_retrieval_ms": rag_result.retrieval_ms,
-                          "rag_docs": rag_result.num_after_filter},
+                          "retrieval_mode": "isolated" if isolated else "shared",
+                          "rag_docs": rag_result.num_after_filter,
+                          "rag_context_tokens": packed.tokens,
+                          "rag_source_tokens": packed.source_tokens,
+                          "rag_context_scoring": packed.scoring,
+                          **rag_result.trace_summary(),
+                          "rag_trace": rag_result.trace},
             ))
 
             time.sleep(1)  # Rate limiting
@@ -204,22 +267,19 @@ def _benchmark_model(
     client, judge: "LLMJudge", prompts: list[TestPrompt],
     model_label: str, model_id: str,
     rag_method: str = "L2_rerank_rag",
+    retrievals: dict[tuple[str, str], RAGResult] = None,
 ) -> list[BenchmarkResult]:
     """Run benchmark for one model across all prompts."""
+    retrievals = retrievals or prefetch_retrievals(prompts, [rag_method])
     results = []
     for i, test in enumerate(prompts):
         print(f"  [{i+1}/{len(prompts)}] {test.id}")
 
-        rag_result = run_rag_method(
-            rag_method, query=test.user_prompt,
-            vendor=test.target_vendor, top_k=3,
-        )
-        context = "\n---\n".join(
-            d["content"][:1000] for d in rag_result.documents
-        )
+        rag_result = retrievals[(test.id, rag_method)]
+        packed = pack_context(test.user_prompt, rag_result.documents)
 
         output, latency = generate_system_prompt(
-            client, test, rag_context=context, model=model_id,
+            client, test, rag_context=packed.text, model=model_id,
         )
 
         score = judge.score(
@@ -236,7 +296,13 @@ def _benchmark_model(
             category=test.category,
             generated_prompt=output, score=score,
             latency_ms=latency, cost_usd=0.0,
-            metadata={"active_params": model_label},
+            metadata={"active_params": model_label,
+                      "rag_retrieval_ms": rag_result.retrieval_ms,
+                      "rag_context_tokens": packed.tokens,
+                      "rag_source_tokens": packed.source_tokens,
+                      "rag_context_scoring": packed.scoring,
+                      **rag_result.trace_summary(),
+                      "rag_trace": rag_result.trace},
         ))
         time.sleep(1)
     return results
@@ -247,6 +313,8 @@ def run_study_b(
     rounds: list[int] = None,
     rag_method: str = "L2_rerank_rag",
     vllm_base_url: str = None,
+    cache: RetrievalCache = None,
+    isolated: bool = False,
 ) -> list[BenchmarkResult]:
     """Progressive dense vs MoE breaking point analysis.
 
@@ -258,9 +326,11 @@ def run_study_b(
                  Use [1] for quick test, [1,2,3] for full analysis.
         vllm_base_url: Base URL for vLLM-served fine-tuned models.
                        Format: http://host:port/v1
+        isolated: Retrieve each prompt on its own, sequentially, so
+                  rag_retrieval_ms is standalone latency.
     """
     from google import genai
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    client = replay.gemini_client(lambda: genai.Client(api_key=os.getenv("GOOGLE_API_KEY")))
     judge = LLMJudge()
 
     prompts = prompts or ALL_TEST_PROMPTS[:10]
@@ -274,11 +344,14 @@ def run_study_b(
     print(f"RAG Method: {rag_method}")
     print(f"{'='*60}\n")
 
+    # Every model sees the same retrieved context
+    retrievals = prefetch_retrievals(prompts, [rag_method], cache=cache, isolated=isolated)
+
     # ── Run proprietary baselines first ──
     for label, model_id in STUDY_B_BASELINES.items():
         print(f"\n--- Baseline: {label} ({model_id}) ---")
         results = _benchmark_model(
-            client, judge, prompts, label, model_id, rag_method)
+            client, judge, prompts, label, model_id, rag_method, retrievals)
         all_results.extend(results)
 
     # ── Progressive rounds ──
@@ -308,7 +381,7 @@ def run_study_b(
 
             print(f"\n--- {arch_type.upper()}: {label} ---")
             results = _benchmark_model(
-                client, judge, prompts, label, model_id, rag_method)
+                client, judge, prompts, label, model_id, rag_method, retrievals)
             all_results.extend(results)
 
         # Determine round winner
@@ -375,7 +448,7 @@ def run_study_c(
 ) -> list[BenchmarkResult]:
     """Test how system prompt complexity affects output quality."""
     from google import genai
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    client = replay.gemini_client(lambda: genai.Client(api_key=os.getenv("GOOGLE_API_KEY")))
     judge = LLMJudge()
 
     prompts = prompts or ALL_TEST_PROMPTS[:10]
@@ -431,8 +504,19 @@ def run_study_c(
 
 # ── Save & Report ────────────────────────────────────────────────────────
 
+def result_row(r: BenchmarkResult) -> dict:
+    """One flat row per result: scores, latency and scalar metadata
+    (including the rag_* retrieval trace totals)."""
+    row = {"prompt_id": r.prompt_id, "method": r.method,
+           "target_vendor": r.target_vendor, "category": r.category,
+           "total": r.score.total, "latency_ms": r.latency_ms, "cost_usd": r.cost_usd}
+    row.update({k: v for k, v in (r.metadata or {}).items()
+                if isinstance(v, (int, float, str, bool))})
+    return row
+
+
 def save_results(results: list[BenchmarkResult], study: str):
-    """Save results to JSON and print summary."""
+    """Save results to JSON (full) and CSV (one row per result) and print summary."""
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = RESULTS_DIR / f"study_{study}_{ts}.json"
     data = [r.to_dict() for r in results]
@@ -440,6 +524,15 @@ def save_results(results: list[BenchmarkResult], study: str):
         json.dump(data, f, indent=2, default=str)
     print(f"\nResults saved to: {path}")
 
+    rows = [result_row(r) for r in results]
+    if rows:
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        with open(path.with_suffix(".csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Per-result columns saved to: {path.with_suffix('.csv')}")
+
     summary = aggregate_scores(results)
     print(f"\n{format_summary_table(summary)}")
     return path
@@ -457,7 +550,13 @@ def main():
                         help="Study B rounds: '1', '1,2', or 'all' (default: all)")
     parser.add_argument("--vllm-url", default=None,
                         help="vLLM base URL for fine-tuned models")
+    parser.add_argument("--fresh-retrieval", action="store_true",
+                        help="Ignore the on-disk retrieval cache and retrieve everything again")
+    parser.add_argument("--isolated", action="store_true",
+                        help="Retrieve each prompt × method on its own pipeline, sequentially, "
+                             "so retrieval latency is standalone rather than incremental")
     args = parser.parse_args()
+    cache = None if args.fresh_retrieval else RetrievalCache()
 
     prompts = ALL_TEST_PROMPTS
     if args.prompts:
@@ -470,18 +569,24 @@ def main():
         rounds = [int(r.strip()) for r in args.round.split(",")]
 
     if args.study in ("A", "all"):
-        results = run_study_a(prompts, model=args.model)
+        results = run_study_a(prompts, model=args.model, cache=cache, isolated=args.isolated)
         save_results(results, "A")
 
     if args.study in ("B", "all"):
         results = run_study_b(prompts, rounds=rounds,
-                              vllm_base_url=args.vllm_url)
+                              vllm_base_url=args.vllm_url, cache=cache,
+                              isolated=args.isolated)
         save_results(results, "B")
 
     if args.study in ("C", "all"):
         results = run_study_c(prompts, model=args.model)
         save_results(results, "C")
 
+    if WEB_CACHE.hits or WEB_CACHE.misses:
+        print(f"\nWeb fallback cache: {WEB_CACHE.stats()}")
+    if replay.STORE.enabled:
+        print(f"\nRecord/replay: {replay.STORE.stats()}")
+
 
 if __name__ == "__main__":
     main()
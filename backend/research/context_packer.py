@@ -0,0 +1,252 @@
+"""
+Context packing: fit retrieved documents into a token budget.
+
+Replaces fixed character slices (`content[:1000]`) when building the
+reference context for generation:
+
+1. Split every document into paragraphs (long ones at ~CHUNK_TOKENS)
+2. Drop paragraphs whose normalized text already appeared (within or
+   across docs), then merge short neighbours into chunks
+3. Score chunks by cosine similarity to the query, using chunk-level
+   Gemini embeddings (lexical overlap if embedding is unavailable)
+4. Give each document its best chunk (in retrieval order), then fill the
+   rest of the budget with the highest-scoring chunks overall
+5. Emit the chosen chunks per document in their original order, with
+   "[...]" marking skipped text
+
+Token counts are estimated at ~4 characters per token (Gemini's rule of
+thumb), so no tokenizer is needed.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+CONTEXT_BUDGET_TOKENS = int(os.getenv("RAG_CONTEXT_BUDGET_TOKENS", "600"))
+CHUNK_TOKENS = 120
+CHARS_PER_TOKEN = 4
+EMBED_BATCH = 100  # Gemini embed_content accepts at most 100 contents per request
+GAP_MARKER = "[...]"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+@dataclass
+class PackedContext:
+    """Packed text plus accounting."""
+    text: str                   # Documents joined with the separator
+    tokens: int                 # Estimated tokens in `text`
+    documents: list[str]        # Packed text per input doc ("" if none kept)
+    source_tokens: int          # Estimated tokens in the full documents
+    chunks_used: int = 0
+    paragraphs_duplicate: int = 0
+    scoring: str = "embedding"  # or "lexical"
+    doc_tokens: list[int] = field(default_factory=list)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+
+def split_paragraphs(content: str, chunk_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """Paragraphs, with any longer than `chunk_tokens` split on lines/sentences."""
+    limit = chunk_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for para in re.split(r"\n\s*\n", content):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= limit:
+            pieces.append(para)
+            continue
+        buf = ""
+        for part in re.split(r"(?<=[.!?])\s+|\n", para):
+            if buf and len(buf) + len(part) + 1 > limit:
+                pieces.append(buf)
+                buf = ""
+            while len(part) > limit:  # no sentence breaks at all
+                pieces.append(part[:limit])
+                part = part[limit:]
+            buf = f"{buf} {part}".strip() if buf else part
+        if buf:
+            pieces.append(buf)
+    return pieces
+
+
+def merge_paragraphs(pieces: list[str], chunk_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """Merge short neighbours (headings, one-liners) into chunks of about half `chunk_tokens`."""
+    limit = chunk_tokens * CHARS_PER_TOKEN // 2
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 2 <= limit:
+            chunks[-1] = f"{chunks[-1]}\n\n{piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def _lexical(query: str, chunk: str) -> float:
+    q = set(_normalize(query).split())
+    c = set(_normalize(chunk).split())
+    return len(q & c) / math.sqrt(len(q) * len(c)) if q and c else 0.0
+
+
+def _key(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class GeminiChunkEmbedder:
+    """
+    Embeds the query and chunks (RETRIEVAL_DOCUMENT, in requests of up to
+    EMBED_BATCH chunks), remembering vectors so the same query and
+    documents packed for several methods are embedded once.
+    """
+
+    def __init__(self, clients=None, max_cached: int = 50_000):
+        self.clients = clients
+        self.max_cached = max_cached
+        self._vectors: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str, chunks: list[str]) -> tuple[list[float], list[list[float]]]:
+        from research.rag_methods import CLIENTS, embed_query, embed_queries
+
+        client, _ = (self.clients or CLIENTS).acquire("gemini")
+        with self._lock:
+            missing = list(dict.fromkeys(c for c in chunks if _key(c) not in self._vectors))
+            known = {_key(c): self._vectors.get(_key(c)) for c in chunks}
+            query_vec = self._vectors.get(_key("query:" + query))
+        if query_vec is None:
+            query_vec = embed_query(client, query)
+            with self._lock:
+                self._vectors[_key("query:" + query)] = query_vec
+        for start in range(0, len(missing), EMBED_BATCH):
+            batch = missing[start:start + EMBED_BATCH]
+            vectors = embed_queries(client, batch, task_type="RETRIEVAL_DOCUMENT")
+            if len(vectors) != len(batch):
+                raise ValueError(f"expected {len(batch)} chunk embeddings, got {len(vectors)}")
+            fresh = {_key(c): v for c, v in zip(batch, vectors)}
+            known.update(fresh)
+            with self._lock:
+                if len(self._vectors) + len(fresh) > self.max_cached:
+                    self._vectors.clear()
+                self._vectors.update(fresh)
+        return query_vec, [known[_key(c)] for c in chunks]
+
+
+_default_embedder: Optional[GeminiChunkEmbedder] = None
+
+
+def default_embedder() -> GeminiChunkEmbedder:
+    global _default_embedder
+    if _default_embedder is None:
+        _default_embedder = GeminiChunkEmbedder()
+    return _default_embedder
+
+
+def pack_context(query: str, docs: list[dict], budget_tokens: int = 0,
+                 embed: Optional[Callable] = None, use_embeddings: bool = True,
+                 separator: str = "\n---\n",
+                 chunk_tokens: int = CHUNK_TOKENS) -> PackedContext:
+    """
+    Pack `docs` (dicts with "content", in retrieval order) into at most
+    `budget_tokens` (default CONTEXT_BUDGET_TOKENS) estimated tokens.
+
+    `embed(query, chunks) -> (query_vector, chunk_vectors)` scores chunks;
+    it defaults to Gemini chunk embeddings, and any failure (or
+    use_embeddings=False) falls back to lexical overlap with the query.
+    """
+    budget = budget_tokens or CONTEXT_BUDGET_TOKENS
+    source_tokens = sum(estimate_tokens(d.get("content", "")) for d in docs)
+
+    # 1-2: drop paragraphs already seen (within or across docs), then chunk
+    chunks = []  # (doc index, position, text)
+    totals = []  # chunks per doc after dedup
+    seen = set()
+    duplicates = 0
+    for i, doc in enumerate(docs):
+        kept = []
+        for para in split_paragraphs(doc.get("content", ""), chunk_tokens):
+            key = _normalize(para)
+            if not key or key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            kept.append(para)
+        doc_chunks = merge_paragraphs(kept, chunk_tokens)
+        chunks.extend((i, pos, text) for pos, text in enumerate(doc_chunks))
+        totals.append(len(doc_chunks))
+
+    if not chunks:
+        return PackedContext(text="", tokens=0, documents=[""] * len(docs),
+                             source_tokens=source_tokens, paragraphs_duplicate=duplicates,
+                             doc_tokens=[0] * len(docs))
+
+    # 3: score
+    scoring = "lexical"
+    scores = [_lexical(query, text) for _, _, text in chunks]
+    if use_embeddings:
+        try:
+            query_vec, vectors = (embed or default_embedder())(query, [t for _, _, t in chunks])
+            scores = [_cosine(query_vec, v) for v in vectors]
+            scoring = "embedding"
+        except Exception as e:
+            print(f"  [Pack] ⚠ Chunk embedding failed for {len(chunks)} chunks "
+                  f"({type(e).__name__}: {e}), falling back to lexical scoring")
+
+    # 4: best chunk per doc first, then best remaining overall
+    sep_tokens = estimate_tokens(separator)
+    gap_tokens = estimate_tokens(GAP_MARKER) + 1
+    order = sorted(range(len(chunks)), key=lambda c: -scores[c])
+    firsts = []
+    for i in range(len(docs)):
+        best = next((c for c in order if chunks[c][0] == i), None)
+        if best is not None:
+            firsts.append(best)
+    chosen = set()
+    used = 0
+    for c in firsts + [c for c in order if c not in firsts]:
+        cost = estimate_tokens(chunks[c][2]) + gap_tokens
+        if not any(chunks[o][0] == chunks[c][0] for o in chosen):
+            cost += sep_tokens
+        if used + cost > budget:
+            continue
+        chosen.add(c)
+        used += cost
+
+    # 5: emit per doc in original order
+    per_doc = [[] for _ in docs]
+    for c in sorted(chosen, key=lambda c: (chunks[c][0], chunks[c][1])):
+        per_doc[chunks[c][0]].append(chunks[c])
+    documents = []
+    for i, doc_chunks in enumerate(per_doc):
+        parts, last = [], -1
+        for _, pos, text in doc_chunks:
+            if pos != last + 1:
+                parts.append(GAP_MARKER)
+            parts.append(text)
+            last = pos
+        if doc_chunks and last != totals[i] - 1:
+            parts.append(GAP_MARKER)
+        documents.append("\n\n".join(parts))
+
+    text = separator.join(d for d in documents if d)
+    return PackedContext(
+        text=text, tokens=estimate_tokens(text), documents=documents,
+        source_tokens=source_tokens, chunks_used=len(chosen),
+        paragraphs_duplicate=duplicates, scoring=scoring,
+        doc_tokens=[estimate_tokens(d) for d in documents],
+    )
@@ -37,6 +37,7 @@ load_dotenv()
 
 DATA_DIR = Path(__file__).parent / "training_data"
 DATA_DIR.mkdir(exist_ok=True)
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", Path(__file__).parent.parent / "snapshots"))
 
 SYSTEM_MSG = (
     "You are an expert system prompt engineer. Generate production-quality "
@@ -75,52 +76,52 @@ def get_vertex_claude_client():
 
 # ── Approach 3: Corpus-Direct ────────────────────────────────────────────
 
-def fetch_corpus_prompts(namespaces=None, limit=200) -> list[dict]:
-    """Fetch real system prompts from Pinecone."""
+def fetch_corpus_prompts(namespaces=None, limit=200, refresh=False) -> list[dict]:
+    """Load real system prompts from local namespace snapshots.
+
+    A namespace missing from SNAPSHOT_DIR (or every one, with `refresh`) is
+    exported from Pinecone first (scripts/snapshot_namespace.py does the
+    same). `limit` caps prompts per namespace (None = all).
+    """
+    from app.services.local_index import LocalCorpus, export_namespace
+
     namespaces = namespaces or [
         "system-prompts-anthropic",
         "system-prompts-openai",
         "system-prompts-google",
         "system-prompts-misc",
     ]
-    index = get_pinecone_index()
+    index = None
     all_prompts = []
 
     for ns in namespaces:
+        path = SNAPSHOT_DIR / ns
         try:
-            # Use a broad query to fetch docs
-            from google.genai import types
-            client = get_client()
-            dummy_emb = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents="system prompt engineering best practices",
-                config=types.EmbedContentConfig(
-                    task_type="RETRIEVAL_QUERY",
-                    output_dimensionality=768,
-                ),
-            ).embeddings[0].values
-
-            results = index.query(
-                vector=dummy_emb, top_k=limit,
-                include_metadata=True, namespace=ns,
-            )
-            for m in results.matches:
-                content = m.metadata.get("content", "")
+            if refresh or not path.is_dir():
+                index = index or get_pinecone_index()
+                export_namespace(index, ns, path)
+            corpus = LocalCorpus.load(path)
+
+            vendor = "misc"
+            if "anthropic" in ns:
+                vendor = "anthropic"
+            elif "openai" in ns:
+                vendor = "openai"
+            elif "google" in ns:
+                vendor = "google"
+            fetched = 0
+            for row, content in enumerate(corpus.contents):
+                if limit is not None and fetched >= limit:
+                    break
                 if len(content) > 100:
-                    vendor = "misc"
-                    if "anthropic" in ns:
-                        vendor = "anthropic"
-                    elif "openai" in ns:
-                        vendor = "openai"
-                    elif "google" in ns:
-                        vendor = "google"
                     all_prompts.append({
-                        "id": m.id,
+                        "id": corpus.ids[row],
                         "content": content,
                         "vendor": vendor,
-                        "metadata": m.metadata,
+                        "metadata": {**corpus.metadata[row], "content": content},
                     })
-            print(f"  Fetched {len(results.matches)} from {ns}")
+                    fetched += 1
+            print(f"  Loaded {fetched} of {len(corpus)} from {ns}")
         except Exception as e:
             print(f"  Error fetching from {ns}: {e}")
 
@@ -142,10 +143,10 @@ def reverse_engineer_user_prompt(client, system_prompt: str, vendor: str) -> str
     return resp.text.strip()
 
 
-def generate_corpus_pairs(max_pairs: int = 500) -> list[dict]:
+def generate_corpus_pairs(max_pairs: int = 500, refresh_snapshots: bool = False) -> list[dict]:
     """Generate training pairs from real corpus prompts."""
     client = get_client()
-    prompts = fetch_corpus_prompts()
+    prompts = fetch_corpus_prompts(refresh=refresh_snapshots)
     print(f"\nGenerating corpus-direct pairs from {len(prompts)} prompts...")
 
     pairs = []
@@ -354,10 +355,12 @@ def main():
                         help="Teacher model for distillation: "
                              "gemini (default), gradient (DO Claude Opus 4.6), "
                              "vertex (GCP Claude)")
+    parser.add_argument("--refresh-snapshots", action="store_true",
+                        help="Re-export corpus namespaces from Pinecone")
     args = parser.parse_args()
 
     if args.approach in ("corpus", "both"):
-        pairs = generate_corpus_pairs(args.max_pairs)
+        pairs = generate_corpus_pairs(args.max_pairs, refresh_snapshots=args.refresh_snapshots)
         save_jsonl(pairs, "corpus_direct_pairs.jsonl")
 
     if args.approach in ("distillation", "both"):
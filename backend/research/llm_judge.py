@@ -22,6 +22,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from research import replay
+
 # ---------------------------------------------------------------------------
 # Data structures
 # ---------------------------------------------------------------------------
@@ -143,9 +145,9 @@ class LLMJudge:
     def __init__(self, model_name: str = "gemini-3.1-pro-preview"):
         from google import genai
         api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and not replay.STORE.offline:
             raise ValueError("GOOGLE_API_KEY not set")
-        self.client = genai.Client(api_key=api_key)
+        self.client = replay.gemini_client(lambda: genai.Client(api_key=api_key))
         self.model_name = model_name
 
     def score(
@@ -270,6 +272,13 @@ def aggregate_scores(results: list[BenchmarkResult]) -> dict:
             "avg_word_count": round(sum(s.word_count for s in scores) / n, 0),
             "avg_latency_ms": round(sum(r.latency_ms for r in method_results) / n, 0),
         }
+        # Retrieval trace columns (rag_retrieval_ms, rag_llm_calls, rag_*_tokens,
+        # rag_<stage>_ms, ...) when the results carry them
+        rag_keys = sorted({k for r in method_results for k, v in (r.metadata or {}).items()
+                           if k.startswith("rag_") and isinstance(v, (int, float))})
+        for key in rag_keys:
+            values = [(r.metadata or {}).get(key, 0) for r in method_results]
+            summary[method][f"avg_{key}"] = round(sum(values) / n, 1)
 
     return summary
 
@@ -280,6 +289,11 @@ def format_summary_table(summary: dict) -> str:
         return "No results to display."
 
     header = f"{'Method':<25} {'Total':<7} {'Struct':<7} {'Compl':<7} {'Vendor':<7} {'Conc':<7} {'Action':<7} {'Words':<7} {'ms':<7}"
+    # Per-level cost columns use the rag_full_* totals, which don't depend on
+    # which level computed a shared stage first
+    with_rag = any("avg_rag_full_llm_calls" in stats for stats in summary.values())
+    if with_rag:
+        header += f" {'RAG ms':<8} {'Calls':<6} {'Tok in':<8} {'Tok out':<8} {'Ctx tok':<8}"
     separator = "-" * len(header)
     lines = [header, separator]
 
@@ -294,6 +308,10 @@ def format_summary_table(summary: dict) -> str:
             f"{stats['avg_actionability']:<7.1f} "
             f"{stats['avg_word_count']:<7.0f} "
             f"{stats['avg_latency_ms']:<7.0f}"
+            + (f" {stats.get('avg_rag_retrieval_ms', 0):<8.0f} {stats.get('avg_rag_full_llm_calls', 0):<6.1f} "
+               f"{stats.get('avg_rag_full_input_tokens', 0):<8.0f} {stats.get('avg_rag_full_output_tokens', 0):<8.0f} "
+               f"{stats.get('avg_rag_context_tokens', 0):<8.0f}"
+               if with_rag else "")
         )
 
     return "\n".join(lines)
@@ -8,9 +8,27 @@ Outputs: named-outputs/study_a/rag_contexts.json — a file listing all 180
 
 This file is then uploaded to Azure ML as an input for the GPU generation step.
 
+Each prompt runs all six levels on one RAGPipeline, so embedding, search,
+rerank, judging and decomposition happen once per prompt and every level
+is derived from the shared results. Per-level retrieval_ms is then the
+level's incremental cost; pass --isolated to time each level on its own.
+
+Retrievals go through the shared on-disk RetrievalCache, which is also the
+resume mechanism: a re-run rebuilds rag_contexts.json from cached results
+and only retrieves what is missing (--fresh ignores the cache; --isolated
+never reads it, since timings depend on the retrieval mode).
+
+Reference documents are packed into a token budget (--context-tokens,
+default 1200) by research.context_packer instead of being cut at 2000
+characters each.
+
 Usage:
     python study_a_precompute_rag.py
+    python study_a_precompute_rag.py --isolated
+    python study_a_precompute_rag.py --fresh
+    python study_a_precompute_rag.py --context-tokens 800
 """
+import argparse
 import json
 import os
 import sys
@@ -26,8 +44,9 @@ sys.path.insert(0, str(BACKEND_DIR))
 from dotenv import load_dotenv
 load_dotenv(str(BACKEND_DIR / ".env"))
 
+from research.context_packer import estimate_tokens, pack_context
 from research.rag_methods import (
-    RAG_METHODS, run_rag_method, no_rag, naive_rag, rerank_rag,
+    CLIENTS, RAG_METHODS, WEB_CACHE, RAGPipeline, RetrievalCache, run_rag_method, no_rag, naive_rag, rerank_rag,
     corrective_rag, judge_rag, agentic_rag,
 )
 
@@ -74,64 +93,84 @@ TEST_PROMPTS = [
 RAG_LEVELS = ["L0_no_rag", "L1_naive_rag", "L2_rerank_rag", "L3_corrective_rag", "L4_judge_rag", "L5_agentic_rag"]
 
 
-def format_rag_context(docs: list[dict]) -> str:
-    """Format retrieved documents into context string for injection."""
+def format_rag_context(query: str, docs: list[dict], budget_tokens: int) -> tuple[str, int]:
+    """Pack retrieved documents into `budget_tokens`; (context string, estimated tokens)."""
     if not docs:
-        return ""
+        return "", 0
+    packed = pack_context(query, docs, budget_tokens=budget_tokens)
     parts = []
-    for i, doc in enumerate(docs, 1):
-        content = doc.get("content", "")[:2000]  # Cap individual docs
+    for doc, content in zip(docs, packed.documents):
+        if not content:
+            continue
+        i = len(parts) + 1
         score = doc.get("score", doc.get("rerank_score", 0))
         parts.append(f"<reference_prompt_{i} relevance=\"{score:.2f}\">\n{content}\n</reference_prompt_{i}>")
-    return "\n\n".join(parts)
+    context = "\n\n".join(parts)
+    return context, estimate_tokens(context)
 
 
 def main():
-    output_file = OUTPUT_DIR / "rag_contexts.json"
+    parser = argparse.ArgumentParser(description="Pre-compute Study A RAG contexts")
+    parser.add_argument("--isolated", action="store_true",
+                        help="Fresh pipeline per level (standalone latencies, no shared stages; "
+                             "never reads the cache)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Ignore cached retrievals (results are still written to the cache)")
+    parser.add_argument("--context-tokens", type=int, default=1200,
+                        help="Token budget for the packed reference context (default 1200)")
+    args = parser.parse_args()
 
-    # Resume support
-    existing = []
-    done_keys = set()
-    if output_file.exists():
-        existing = json.loads(output_file.read_text(encoding="utf-8"))
-        done_keys = {(r["prompt_id"], r["rag_level"]) for r in existing}
-        print(f"Loaded {len(existing)} existing entries ({len(done_keys)} unique)")
+    output_file = OUTPUT_DIR / "rag_contexts.json"
+    cache = RetrievalCache()
+    # Cached entries from shared pipelines carry incremental retrieval_ms
+    read_cache = not args.fresh and not args.isolated
+    mode = "isolated" if args.isolated else "shared"
 
-    results = list(existing)
+    results = []
     total = len(TEST_PROMPTS) * len(RAG_LEVELS)
-    completed = len(done_keys)
+    setup_saved_ms = 0
+    retrieved = 0
 
-    print(f"\nPre-computing RAG contexts: {total - completed} remaining of {total}")
+    print(f"\nPre-computing {total} RAG contexts (corpus version {cache.version})")
     print(f"RAG levels: {RAG_LEVELS}\n")
 
-    for rag_level in RAG_LEVELS:
-        print(f"\n{'='*60}")
-        print(f"  RAG Level: {rag_level}")
-        print(f"{'='*60}")
+    stage_counts: dict[str, dict[str, int]] = {}
 
-        for i, test in enumerate(TEST_PROMPTS, 1):
-            key = (test["id"], rag_level)
-            if key in done_keys:
-                continue
+    for i, test in enumerate(TEST_PROMPTS, 1):
+        print(f"\n[{i}/{len(TEST_PROMPTS)}] {test['id']} ({test['vendor']})")
+        pipeline = RAGPipeline(CLIENTS)
 
-            print(f"  [{i}/{len(TEST_PROMPTS)}] {test['id']} ({test['vendor']})...", end="", flush=True)
+        for rag_level in RAG_LEVELS:
+            print(f"  {rag_level}...", end="", flush=True)
             t0 = time.time()
 
             try:
-                rag_result = run_rag_method(
-                    rag_level, query=test["prompt"], vendor=test["vendor"], top_k=3
+                rag_result = None
+                if read_cache and rag_level != "L0_no_rag":
+                    rag_result = cache.get(rag_level, test["prompt"], test["vendor"], 3, mode=mode)
+                if rag_result is None:
+                    rag_result = run_rag_method(
+                        rag_level, query=test["prompt"], vendor=test["vendor"], top_k=3,
+                        pipeline=RAGPipeline(CLIENTS) if args.isolated else pipeline,
+                    )
+                    if rag_level != "L0_no_rag":
+                        cache.put(rag_level, test["prompt"], test["vendor"], 3, rag_result, mode=mode)
+                        retrieved += 1
+                context_str, context_tokens = format_rag_context(
+                    test["prompt"], rag_result.documents, args.context_tokens,
                 )
-                context_str = format_rag_context(rag_result.documents)
                 retrieval_ms = rag_result.retrieval_ms
                 num_docs = rag_result.num_after_filter
+                setup_saved_ms += rag_result.setup_saved_ms
             except Exception as e:
                 print(f" ERROR: {e}")
                 context_str = ""
+                context_tokens = 0
                 retrieval_ms = 0
                 num_docs = 0
 
             elapsed = time.time() - t0
-            print(f" {num_docs} docs, {len(context_str)} chars ({elapsed:.1f}s)")
+            print(f" {num_docs} docs, {context_tokens} tokens ({elapsed:.1f}s)")
 
             # Build the full user message with RAG context injected
             user_msg = f"User request: {test['prompt']}"
@@ -158,8 +197,10 @@ def main():
                 "user_prompt": test["prompt"],
                 "rag_level": rag_level,
                 "rag_context_chars": len(context_str),
+                "rag_context_tokens": context_tokens,
                 "rag_num_docs": num_docs,
                 "rag_retrieval_ms": retrieval_ms,
+                "rag_shared_stages": not args.isolated,
                 "full_user_message": user_msg,
             })
 
@@ -168,7 +209,20 @@ def main():
                 json.dumps(results, indent=2, ensure_ascii=True), encoding="utf-8"
             )
 
+        for stage, counts in pipeline.stats().items():
+            totals = stage_counts.setdefault(stage, {"computed": 0, "reused": 0})
+            totals["computed"] += counts["computed"]
+            totals["reused"] += counts["reused"]
+
     print(f"\n✅ Pre-computed {len(results)} RAG contexts -> {output_file}")
+    print(f"   Retrieval cache: {cache.hits} reused, {retrieved} retrieved ({cache.root / cache.version})")
+    print(f"   Web fallback cache: {WEB_CACHE.hits} reused, {WEB_CACHE.misses} fetched ({WEB_CACHE.root})")
+    setup_once = ", ".join(f"{name} {ms:.0f} ms" for name, ms in CLIENTS.setup_ms.items())
+    print(f"   Client setup paid once ({setup_once or 'none'}); "
+          f"reuse avoided {setup_saved_ms / 1000:.1f}s of setup")
+    if stage_counts:
+        print("   Shared stages (computed / reused): " + ", ".join(
+            f"{stage} {c['computed']}/{c['reused']}" for stage, c in stage_counts.items()))
 
 
 if __name__ == "__main__":
@@ -26,6 +26,10 @@ from dotenv import load_dotenv
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..'))
 load_dotenv(os.path.join(project_root, 'backend', '.env'))
 
+# Record/replay for provider calls (RESEARCH_REPLAY, see research/replay.py)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+from research import replay
+
 # ── Same 30 test prompts as Phase 1 ──
 TEST_PROMPTS = [
     # Coding (10)
@@ -99,7 +103,7 @@ class GeminiProvider:
     
     def __init__(self):
         from google import genai
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.client = replay.gemini_client(lambda: genai.Client(api_key=os.getenv("GOOGLE_API_KEY")))
         self.model = "gemini-3.1-pro-preview"
     
     def generate(self, user_msg: str) -> str:
@@ -121,10 +125,10 @@ class ClaudeVertexProvider:
     
     def __init__(self):
         from anthropic import AnthropicVertex
-        self.client = AnthropicVertex(
+        self.client = replay.anthropic_client(lambda: AnthropicVertex(
             project_id=os.getenv("GOOGLE_CLOUD_PROJECT", "modelsandtraining"),
             region="global",
-        )
+        ))
         self.model = "claude-sonnet-4-5@20250929"
     
     def generate(self, user_msg: str) -> str:
@@ -143,8 +147,6 @@ class TogetherProvider:
     name = "qwen3_235b_a22b_base"
     
     def __init__(self):
-        import requests as _requests
-        self._requests = _requests
         self.api_key = os.getenv("TOGETHER_API_KEY")
         self.model = "Qwen/Qwen3-235B-A22B-Instruct-2507-tput"
         self.base_url = "https://api.together.xyz/v1/chat/completions"
@@ -163,7 +165,7 @@ class TogetherProvider:
                 {"role": "user", "content": user_msg},
             ],
         }
-        resp = self._requests.post(self.base_url, headers=headers, json=payload, timeout=300)
+        resp = replay.post_json(self.base_url, headers=headers, json_body=payload, timeout=300)
         resp.raise_for_status()
         data = resp.json()
         return data["choices"][0]["message"]["content"]
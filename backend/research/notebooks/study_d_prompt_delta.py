@@ -28,6 +28,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Record/replay for provider calls (RESEARCH_REPLAY, see research/replay.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from research import replay
+
 # ═══════════════════════════════════════════════════════════════════
 # SECTION 1: OUTPUT DIRECTORY
 # ═══════════════════════════════════════════════════════════════════
@@ -47,9 +51,9 @@ class GeminiProvider:
     def __init__(self):
         from google import genai
         api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and not replay.STORE.offline:
             raise ValueError("GOOGLE_API_KEY not set")
-        self.client = genai.Client(api_key=api_key)
+        self.client = replay.gemini_client(lambda: genai.Client(api_key=api_key))
         self.model = "gemini-3.1-pro-preview"
 
     def generate(self, user_msg: str, system_prompt: Optional[str] = None) -> str:
@@ -83,7 +87,8 @@ class ClaudeProvider:
         import anthropic
         project_id = os.getenv("VERTEX_PROJECT_ID", "modelsandtraining")
         region = os.getenv("VERTEX_REGION", "europe-west1")
-        self.client = anthropic.AnthropicVertex(project_id=project_id, region=region)
+        self.client = replay.anthropic_client(
+            lambda: anthropic.AnthropicVertex(project_id=project_id, region=region))
         self.model = "claude-sonnet-4-6@default"
 
     def generate(self, user_msg: str, system_prompt: Optional[str] = None) -> str:
@@ -198,12 +203,12 @@ def generate_prompttriage_prompts() -> dict[str, str]:
 
     # Initialize Pinecone for RAG
     from pinecone import Pinecone
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index = pc.Index(os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts"))
+    index = replay.pinecone_index(lambda: Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(
+        os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts")))
 
     # Initialize embedding model
     from google import genai
-    embed_client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    embed_client = replay.gemini_client(lambda: genai.Client(api_key=os.getenv("GOOGLE_API_KEY")))
 
     # Initialize generator
     provider = GeminiProvider()
@@ -7,18 +7,45 @@ L2: Rerank RAG    - L1 + cross-encoder reranker (top-20 -> top-3)
 L3: CRAG          - L2 + relevance evaluator + web fallback
 L4: Judge RAG     - L3 + LLM grades each doc before injection
 L5: Agentic RAG   - L4 + query decomposition + multi-step retrieval
+
+All levels take their Gemini client and Pinecone index from a shared
+ClientRegistry (CLIENTS unless one is passed), so nested levels and long
+sweeps reuse one set of connections; RAGResult.setup_saved_ms reports the
+setup time that reuse avoided.
+
+Each level is composed from the memoized stages of a RAGPipeline. Passing
+one pipeline to every level run for a prompt computes embedding, search,
+rerank, judging etc. once and derives all six levels from those results.
+
+ARAG_METHODS / arun_rag_method are coroutine versions of every level, run
+on a bounded retrieval thread pool so one event loop can drive dozens of
+retrievals at once; arun_rag_methods gathers a batch of them.
+
+Passing a RetrievalCache to run_rag_method / arun_rag_method stores each
+RAGResult on disk under (method, query, vendor, top_k, corpus version), so
+studies that re-run the same retrievals read them back instead.
 """
 
+import asyncio
+import copy
+import functools
+import hashlib
 import os
 import json
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
 from typing import Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
+from research import replay
+
 
 @dataclass
 class RAGResult:
@@ -28,14 +55,72 @@ class RAGResult:
     retrieval_ms: int           # Time spent on retrieval
     num_retrieved: int          # How many docs initially retrieved
     num_after_filter: int       # How many passed filtering/reranking
+    setup_saved_ms: int = 0     # Client/index setup avoided by reusing shared handles
+    trace: list[dict] = field(default_factory=list)  # Stage events, see RAGPipeline._memo
+
+    def trace_summary(self) -> dict:
+        """
+        Flat per-level totals from the trace (for result columns).
+
+        `rag_llm_calls`, `rag_*_tokens` and `rag_<stage>_ms` are incremental:
+        only the stages this level computed, so on a shared pipeline they
+        depend on which level got there first. The `rag_full_*` totals
+        count every stage the level needed once, computed or reused, at its
+        original cost, which is what the level costs on its own.
+        """
+        summary = {"rag_llm_calls": 0, "rag_input_tokens": 0,
+                   "rag_output_tokens": 0, "rag_cache_hits": 0,
+                   "rag_full_llm_calls": 0, "rag_full_input_tokens": 0,
+                   "rag_full_output_tokens": 0, "rag_full_ms": 0.0}
+        stage_ms: dict[str, float] = {}
+        counted = set()
+        for event in self.trace:
+            if event["cached"]:
+                summary["rag_cache_hits"] += 1
+            else:
+                summary["rag_llm_calls"] += event["llm_calls"]
+                summary["rag_input_tokens"] += event["input_tokens"]
+                summary["rag_output_tokens"] += event["output_tokens"]
+                stage_ms[event["stage"]] = stage_ms.get(event["stage"], 0) + event["self_ms"]
+            key = event.get("key")
+            if key is not None and key in counted:
+                continue
+            counted.add(key)
+            summary["rag_full_llm_calls"] += event["llm_calls"]
+            summary["rag_full_input_tokens"] += event["input_tokens"]
+            summary["rag_full_output_tokens"] += event["output_tokens"]
+            summary["rag_full_ms"] += event.get("cost_ms", event["self_ms"])
+        summary["rag_full_ms"] = round(summary["rag_full_ms"], 1)
+        for stage, ms in stage_ms.items():
+            summary[f"rag_{stage}_ms"] = round(ms, 1)
+        return summary
 
 
 # ── Shared Utilities ─────────────────────────────────────────────────────
 
+_usage = threading.local()  # per-thread stack of [stage event, nested stage ms] being computed
+
+
+def _generate(client, **kwargs):
+    """generate_content, counting the call and its tokens toward the current stage."""
+    stack = getattr(_usage, "stack", None)
+    event = stack[-1][0] if stack else None
+    if event is not None:
+        event["llm_calls"] += 1
+    resp = client.models.generate_content(**kwargs)
+    usage = getattr(resp, "usage_metadata", None)
+    if event is not None and usage is not None:
+        event["input_tokens"] += usage.prompt_token_count or 0
+        event["output_tokens"] += usage.candidates_token_count or 0
+    return resp
+
+
 def get_gemini_client():
-    """Create a Gemini client for embeddings and generation."""
-    from google import genai
-    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    """Create a Gemini client for embeddings and generation (record/replay aware)."""
+    def create():
+        from google import genai
+        return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    return replay.gemini_client(create)
 
 
 def embed_query(client, text: str) -> list[float]:
@@ -52,11 +137,72 @@ def embed_query(client, text: str) -> list[float]:
     return result.embeddings[0].values
 
 
+def embed_queries(client, texts: list[str],
+                  task_type: str = "RETRIEVAL_QUERY") -> list[list[float]]:
+    """Embed several queries (or RETRIEVAL_DOCUMENT passages) in one request."""
+    from google.genai import types
+    result = client.models.embed_content(
+        model="gemini-embedding-001",
+        contents=texts,
+        config=types.EmbedContentConfig(
+            task_type=task_type,
+            output_dimensionality=768,
+        ),
+    )
+    return [e.values for e in result.embeddings]
+
+
 def get_pinecone_index():
-    """Get Pinecone index handle."""
-    from pinecone import Pinecone
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    return pc.Index(os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts"))
+    """Get Pinecone index handle (record/replay aware)."""
+    def create():
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        return pc.Index(os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts"))
+    return replay.pinecone_index(create)
+
+
+class ClientRegistry:
+    """
+    Lazily created, thread-safe Gemini client and Pinecone index handles,
+    shared by every RAG level (and nested level) that is given the registry.
+
+    Handles are created once on first use; their HTTP connection pools are
+    reused from then on. Creation time is measured so each later
+    `acquire` can report the setup it avoided.
+    """
+
+    FACTORIES = {
+        "gemini": get_gemini_client,
+        "pinecone": get_pinecone_index,
+    }
+
+    def __init__(self):
+        self._handles: dict = {}
+        self.setup_ms: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str) -> tuple:
+        """(handle, setup ms avoided): 0 for the call that creates it."""
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle, self.setup_ms[name]
+        with self._lock:
+            if name not in self._handles:
+                t0 = time.perf_counter()
+                self._handles[name] = self.FACTORIES[name]()
+                self.setup_ms[name] = (time.perf_counter() - t0) * 1000
+                return self._handles[name], 0.0
+        return self._handles[name], self.setup_ms[name]
+
+    def reset(self) -> None:
+        """Drop the handles (e.g. after changing API keys)."""
+        with self._lock:
+            self._handles.clear()
+            self.setup_ms.clear()
+
+
+# Default registry for callers that don't pass their own
+CLIENTS = ClientRegistry()
 
 
 def query_pinecone(index, embedding, top_k=5, namespace=""):
@@ -76,6 +222,22 @@ def query_pinecone(index, embedding, top_k=5, namespace=""):
     return docs
 
 
+# L4 judging: "concurrent" (one call per doc, JUDGE_CONCURRENCY at a time)
+# or "batch" (one structured call grading every candidate)
+JUDGE_MODE = os.getenv("RAG_JUDGE_MODE", "concurrent")
+JUDGE_CONCURRENCY = int(os.getenv("RAG_JUDGE_CONCURRENCY", "4"))
+JUDGE_TIMEOUT_S = float(os.getenv("RAG_JUDGE_TIMEOUT_S", "15"))
+JUDGE_TIMEOUT_VERDICT = {"useful": True, "reasoning": "Judge timed out, keeping doc"}
+
+# L5 budget: stop collecting sub-query results once either is spent
+AGENTIC_MAX_LLM_CALLS = int(os.getenv("RAG_AGENTIC_MAX_LLM_CALLS", "30"))
+AGENTIC_MAX_WALL_S = float(os.getenv("RAG_AGENTIC_MAX_WALL_S", "60"))
+
+# L3 web fallback: started alongside the rerank when fewer than two of the
+# top_k search matches score >= RAG_WEB_SPECULATE_SCORE (0 disables)
+WEB_SPECULATE_SCORE = float(os.getenv("RAG_WEB_SPECULATE_SCORE", "0.65"))
+_WEB_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-web")
+
 VENDOR_NS = {
     "anthropic": "system-prompts-anthropic",
     "openai": "system-prompts-openai",
@@ -83,6 +245,313 @@ VENDOR_NS = {
 }
 
 
+# ── Shared Stages ───────────────────────────────────────────────────────
+
+class BudgetExhausted(RuntimeError):
+    """An LLM stage was not started because the level's budget is spent."""
+
+
+class LLMBudget:
+    """
+    Cap on the LLM stages a level (and every pipeline forked from it) may
+    start, plus a deadline. Checked in RAGPipeline._memo before each LLM
+    stage, so abandoned work in other threads can't keep spending; close()
+    stops it outright once the level has returned.
+    """
+
+    def __init__(self, max_calls: int, deadline: float):
+        self.max_calls = max_calls
+        self.deadline = deadline
+        self.calls = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def remaining(self) -> bool:
+        return not self.closed and self.calls < self.max_calls and time.time() < self.deadline
+
+    def take(self) -> bool:
+        with self._lock:
+            if not self.remaining():
+                return False
+            self.calls += 1
+            return True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class RAGPipeline:
+    """
+    The stages the levels are built from, memoized per pipeline:
+
+        embed -> search -> rerank -> relevance_gate (+ web) -> judge
+                                     decompose / gaps (agentic)
+
+    Each stage runs once per distinct input; repeat requests (from the same
+    or another level) get the stored result. Run every level for a prompt
+    with one pipeline and L1-L5 reuse each other's work: L1 is a prefix of
+    the search L2 reranks, L3 gates that rerank, L4 judges L3's docs, and
+    L5 runs L4 per sub-query.
+
+    `fork()` gives a level its own view of the pipeline: same stored
+    results, but its own `trace` of stage events (computed or reused,
+    timings, LLM calls and tokens), `llm_calls` (for budgets) and
+    `setup_saved_ms`, which also roll up into the pipeline it was forked
+    from. A fork can carry an LLMBudget that its own forks share; once it
+    is closed, late stage events are no longer recorded.
+
+    Searches fetch at least `min_search_k` matches so smaller top_k requests
+    are served from the same Pinecone query. Docs are returned as copies,
+    so levels can annotate them without changing the stored results.
+    """
+
+    LLM_STAGES = {"rerank", "web", "judge", "judge_batch", "decompose", "gaps"}
+
+    def __init__(self, clients: Optional[ClientRegistry] = None,
+                 min_search_k: int = 20):
+        self.clients = clients or CLIENTS
+        self.min_search_k = min_search_k
+        self.setup_saved_ms = 0
+        self.llm_calls = 0
+        self.trace: list[dict] = []
+        self.parent: Optional[RAGPipeline] = None
+        self.budget: Optional[LLMBudget] = None
+        self.started = time.time()
+        self.counts: dict[str, dict[str, int]] = {}
+        self._results: dict = {}
+        self._costs: dict = {}  # (stage, key) -> own cost and the stage keys it needed
+        self._key_locks: dict = {}
+        self._lock = threading.Lock()
+
+    def fork(self, budget: Optional[LLMBudget] = None) -> "RAGPipeline":
+        view = copy.copy(self)
+        view.parent = self
+        view.budget = budget or self.budget
+        view.setup_saved_ms = 0
+        view.llm_calls = 0
+        view.trace = []
+        return view
+
+    def _account(self, setup_saved_ms: int = 0, llm_calls: int = 0,
+                 event: Optional[dict] = None) -> None:
+        if self.budget is not None and self.budget.closed:
+            return  # the level already returned its result
+        with self._lock:
+            node = self
+            while node is not None:
+                node.setup_saved_ms += setup_saved_ms
+                node.llm_calls += llm_calls
+                if event is not None:
+                    node.trace.append(event)
+                node = node.parent
+
+    def _handle(self, name: str):
+        handle, saved = self.clients.acquire(name)
+        self._account(setup_saved_ms=int(saved))
+        return handle
+
+    def _event(self, full_key: tuple, cached: bool, cost: Optional[dict] = None) -> dict:
+        """A trace event; reused stages carry the cost of their original computation."""
+        now = round((time.time() - self.started) * 1000, 1)
+        cost = cost or {}
+        digest = hashlib.blake2b(repr(full_key).encode("utf-8"), digest_size=6).hexdigest()
+        return {"stage": full_key[0], "key": digest, "start_ms": now, "end_ms": now,
+                "self_ms": 0.0, "cached": cached, "cost_ms": cost.get("ms", 0.0),
+                "llm_calls": cost.get("llm_calls", 0), "input_tokens": cost.get("input_tokens", 0),
+                "output_tokens": cost.get("output_tokens", 0)}
+
+    def _reused(self, full_key: tuple) -> None:
+        """Cached events for a reused stage and every stage its computation needed."""
+        pending, seen = [full_key], set()
+        while pending:
+            k = pending.pop()
+            if k in seen:
+                continue
+            seen.add(k)
+            cost = self._costs.get(k, {})
+            self._account(event=self._event(k, cached=True, cost=cost))
+            pending.extend(cost.get("deps", ()))
+
+    def _memo(self, stage: str, key: tuple, compute):
+        """
+        compute() once per (stage, key); concurrent callers wait for it.
+
+        Every request adds a trace event; LLM calls made by compute() count
+        toward its event through _generate. `self_ms` excludes stages
+        computed inside compute() (e.g. the search a rerank needs). A reuse
+        adds cached events (original calls, tokens and `cost_ms`) for the
+        stage and the stages it depended on.
+        """
+        full_key = (stage, key)
+        stack = _usage.__dict__.setdefault("stack", [])
+        if stack:
+            stack[-1][2].append(full_key)
+        with self._lock:
+            counts = self.counts.setdefault(stage, {"computed": 0, "reused": 0})
+            key_lock = self._key_locks.setdefault(full_key, threading.Lock())
+        with key_lock:
+            if full_key in self._results:
+                with self._lock:
+                    counts["reused"] += 1
+                self._reused(full_key)
+                return self._results[full_key]
+            if stage in self.LLM_STAGES:
+                if self.budget is not None and not self.budget.take():
+                    raise BudgetExhausted(f"{stage}: LLM budget spent")
+                self._account(llm_calls=1)
+            event = self._event(full_key, cached=False)
+            stack.append([event, 0.0, []])
+            try:
+                value = compute()
+            finally:
+                _, nested_ms, deps = stack.pop()
+                event["end_ms"] = round((time.time() - self.started) * 1000, 1)
+                elapsed = event["end_ms"] - event["start_ms"]
+                event["self_ms"] = event["cost_ms"] = round(elapsed - nested_ms, 1)
+                if stack:
+                    stack[-1][1] += elapsed
+                self._account(event=event)
+            with self._lock:
+                self._results[full_key] = value
+                self._costs[full_key] = {"ms": event["cost_ms"], "llm_calls": event["llm_calls"],
+                                         "input_tokens": event["input_tokens"],
+                                         "output_tokens": event["output_tokens"], "deps": deps}
+                counts["computed"] += 1
+        return value
+
+    def embed_many(self, queries: list[str]) -> None:
+        """Embed the queries not embedded yet in one request (one event per query)."""
+        with self._lock:
+            missing = list(dict.fromkeys(q for q in queries if ("embed", (q,)) not in self._results))
+        if not missing:
+            return
+        start = time.time()
+        vectors = embed_queries(self._handle("gemini"), missing)
+        share = round((time.time() - start) * 1000 / len(missing), 1)
+        with self._lock:
+            counts = self.counts.setdefault("embed", {"computed": 0, "reused": 0})
+            fresh = []
+            for q, vector in zip(missing, vectors):
+                if ("embed", (q,)) not in self._results:
+                    self._results[("embed", (q,))] = vector
+                    self._costs[("embed", (q,))] = {"ms": share}
+                    counts["computed"] += 1
+                    fresh.append(q)
+        for q in fresh:
+            event = self._event(("embed", (q,)), cached=False, cost={"ms": share})
+            event["start_ms"] = round((start - self.started) * 1000, 1)
+            event["self_ms"] = share
+            self._account(event=event)
+
+    def embed(self, query: str) -> list[float]:
+        return self._memo("embed", (query,),
+                          lambda: embed_query(self._handle("gemini"), query))
+
+    def search(self, query: str, vendor: str, top_k: int) -> list[dict]:
+        """Top-k matches in the vendor namespace."""
+        k = max(top_k, self.min_search_k)
+        ns = VENDOR_NS.get(vendor, "")
+        docs = self._memo("search", (query, ns, k), lambda: query_pinecone(
+            self._handle("pinecone"), self.embed(query), top_k=k, namespace=ns))
+        return [dict(d) for d in docs[:top_k]]
+
+    def rerank(self, query: str, vendor: str, initial_k: int = 20) -> list[dict]:
+        """The top `initial_k` matches sorted by LLM rerank_score."""
+        def compute():
+            scored = _rerank_with_llm(self._handle("gemini"), query,
+                                      self.search(query, vendor, initial_k))
+            scored.sort(key=lambda x: x["rerank_score"], reverse=True)
+            return scored
+        return [dict(d) for d in self._memo("rerank", (query, vendor, initial_k), compute)]
+
+    def web(self, query: str, vendor: str) -> list[dict]:
+        def compute():
+            docs, saved = _web_fallback(query, vendor, self.clients)
+            self._account(setup_saved_ms=int(saved))
+            return docs
+        return [dict(d) for d in self._memo("web", (query, vendor), compute)]
+
+    def speculate_web(self, query: str, vendor: str, top_k: int) -> bool:
+        """
+        Start the web stage in the background if the search scores predict
+        relevance_gate will need it, so its latency overlaps the rerank.
+        """
+        if WEB_SPECULATE_SCORE <= 0:
+            return False
+        scores = [d.get("score", 0) for d in self.search(query, vendor, top_k)]
+        if sum(score >= WEB_SPECULATE_SCORE for score in scores) >= 2:
+            return False
+        print("  [CRAG] Low search scores — starting web fallback alongside rerank")
+        _WEB_POOL.submit(self.web, query, vendor)
+        return True
+
+    def relevance_gate(self, query: str, vendor: str, docs: list[dict],
+                       top_k: int, threshold: float = 5.0) -> list[dict]:
+        """Docs scoring >= threshold, topped up from the web if fewer than 2 pass."""
+        good_docs = [d for d in docs if float(d.get("rerank_score", 0)) >= threshold]
+        if len(good_docs) < 2:
+            # Fallback: web search via Gemini grounding
+            print("  [CRAG] Low confidence — attempting web fallback")
+            good_docs = (good_docs + self.web(query, vendor))[:top_k]
+        return good_docs
+
+    def judge(self, query: str, vendor: str, doc: dict) -> dict:
+        return self._memo("judge", (query, vendor, doc["id"]), lambda: _judge_document(
+            self._handle("gemini"), query, vendor, doc))
+
+    def judge_all(self, query: str, vendor: str, docs: list[dict],
+                  mode: str = "", concurrency: int = 0,
+                  timeout_s: float = 0) -> list[dict]:
+        """
+        Verdicts for `docs`, in order, graded concurrently or in one call.
+
+        Any doc whose verdict isn't back within `timeout_s` (from the start
+        of the stage) is kept, like a failed judge call.
+        """
+        mode = mode or JUDGE_MODE
+        timeout_s = timeout_s or JUDGE_TIMEOUT_S
+        if not docs:
+            return []
+        if mode == "batch":
+            ids = tuple(d["id"] for d in docs)
+            tasks = [lambda: self._memo("judge_batch", (query, vendor, ids), lambda: _judge_documents_batch(
+                self._handle("gemini"), query, vendor, docs))]
+        elif mode == "concurrent":
+            tasks = [lambda d=d: self.judge(query, vendor, d) for d in docs]
+        else:
+            raise ValueError(f"Unknown judge mode: {mode}")
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency or JUDGE_CONCURRENCY, len(tasks))))
+        try:
+            futures = [pool.submit(task) for task in tasks]
+            deadline = time.time() + timeout_s
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=max(0.0, deadline - time.time())))
+                except FutureTimeout:
+                    results.append(None)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)  # don't wait on stragglers
+
+        if mode == "batch":
+            results = results[0] or [None] * len(docs)
+        return [v if v is not None else dict(JUDGE_TIMEOUT_VERDICT) for v in results]
+
+    def decompose(self, query: str, vendor: str) -> list[str]:
+        return self._memo("decompose", (query, vendor), lambda: _decompose_query(
+            self._handle("gemini"), query, vendor))
+
+    def gaps(self, query: str, vendor: str, docs: list[dict]) -> Optional[str]:
+        return self._memo("gaps", (query, vendor, tuple(d["id"] for d in docs)),
+                          lambda: _identify_gaps(self._handle("gemini"), query, vendor, docs))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """{stage: {"computed": n, "reused": n}}."""
+        with self._lock:
+            return {stage: dict(c) for stage, c in self.counts.items()}
+
+
 # ── L0: No RAG ──────────────────────────────────────────────────────────
 
 def no_rag(**kwargs) -> RAGResult:
@@ -93,46 +562,48 @@ def no_rag(**kwargs) -> RAGResult:
 
 # ── L1: Naive RAG ───────────────────────────────────────────────────────
 
-def naive_rag(query: str, vendor: str = "", top_k: int = 5) -> RAGResult:
+def naive_rag(query: str, vendor: str = "", top_k: int = 5,
+              clients: Optional[ClientRegistry] = None,
+              pipeline: Optional[RAGPipeline] = None) -> RAGResult:
     """Standard embedding search -> top-K."""
     t0 = time.time()
-    client = get_gemini_client()
-    index = get_pinecone_index()
-    emb = embed_query(client, query)
-    ns = VENDOR_NS.get(vendor, "")
-    docs = query_pinecone(index, emb, top_k=top_k, namespace=ns)
+    pipeline = (pipeline or RAGPipeline(clients)).fork()
+    docs = pipeline.search(query, vendor, top_k)
     ms = int((time.time() - t0) * 1000)
     return RAGResult(documents=docs, method="L1_naive_rag",
                      retrieval_ms=ms, num_retrieved=len(docs),
-                     num_after_filter=len(docs))
+                     num_after_filter=len(docs),
+                     setup_saved_ms=pipeline.setup_saved_ms,
+                     trace=list(pipeline.trace))
 
 
 # ── L2: Rerank RAG ──────────────────────────────────────────────────────
 
 def rerank_rag(query: str, vendor: str = "", top_k: int = 3,
-               initial_k: int = 20) -> RAGResult:
+               initial_k: int = 20,
+               clients: Optional[ClientRegistry] = None,
+               pipeline: Optional[RAGPipeline] = None) -> RAGResult:
     """Retrieve broadly, then rerank with cross-encoder."""
     t0 = time.time()
-    client = get_gemini_client()
-    index = get_pinecone_index()
-    emb = embed_query(client, query)
-    ns = VENDOR_NS.get(vendor, "")
-    candidates = query_pinecone(index, emb, top_k=initial_k, namespace=ns)
+    pipeline = (pipeline or RAGPipeline(clients)).fork()
+    candidates = pipeline.search(query, vendor, initial_k)
 
     if not candidates:
         ms = int((time.time() - t0) * 1000)
         return RAGResult(documents=[], method="L2_rerank_rag",
-                         retrieval_ms=ms, num_retrieved=0, num_after_filter=0)
+                         retrieval_ms=ms, num_retrieved=0, num_after_filter=0,
+                         setup_saved_ms=pipeline.setup_saved_ms,
+                         trace=list(pipeline.trace))
 
     # Rerank using Gemini Flash as a lightweight scorer
-    scored = _rerank_with_llm(client, query, candidates)
-    scored.sort(key=lambda x: x["rerank_score"], reverse=True)
-    final = scored[:top_k]
+    final = pipeline.rerank(query, vendor, initial_k)[:top_k]
 
     ms = int((time.time() - t0) * 1000)
     return RAGResult(documents=final, method="L2_rerank_rag",
                      retrieval_ms=ms, num_retrieved=len(candidates),
-                     num_after_filter=len(final))
+                     num_after_filter=len(final),
+                     setup_saved_ms=pipeline.setup_saved_ms,
+                     trace=list(pipeline.trace))
 
 
 def _rerank_with_llm(client, query: str, docs: list[dict]) -> list[dict]:
@@ -149,7 +620,8 @@ Documents:
     prompt += "\nRespond with JSON array of scores: [{\"index\": 0, \"score\": 8}, ...]"
 
     try:
-        resp = client.models.generate_content(
+        resp = _generate(
+            client,
             model="gemini-2.0-flash",
             contents=prompt,
             config={"temperature": 0.1, "response_mime_type": "application/json"},
@@ -170,34 +642,40 @@ Documents:
 # ── L3: CRAG (Corrective RAG) ───────────────────────────────────────────
 
 def corrective_rag(query: str, vendor: str = "", top_k: int = 3,
-                   threshold: float = 5.0) -> RAGResult:
+                   threshold: float = 5.0,
+                   clients: Optional[ClientRegistry] = None,
+                   pipeline: Optional[RAGPipeline] = None) -> RAGResult:
     """Rerank + relevance check. If docs score below threshold, try web."""
     t0 = time.time()
-    reranked = rerank_rag(query, vendor, top_k=top_k, initial_k=20)
+    pipeline = (pipeline or RAGPipeline(clients)).fork()
+    pipeline.speculate_web(query, vendor, top_k)
+    reranked = rerank_rag(query, vendor, top_k=top_k, initial_k=20, pipeline=pipeline)
 
     # Check if top results are good enough
-    good_docs = [d for d in reranked.documents
-                 if float(d.get("rerank_score", 0)) >= threshold]
-
-    if len(good_docs) < 2:
-        # Fallback: web search via Gemini grounding
-        print("  [CRAG] Low confidence — attempting web fallback")
-        web_docs = _web_fallback(query, vendor)
-        good_docs = (good_docs + web_docs)[:top_k]
+    good_docs = pipeline.relevance_gate(query, vendor, reranked.documents,
+                                        top_k=top_k, threshold=threshold)
 
     ms = int((time.time() - t0) * 1000)
     return RAGResult(documents=good_docs, method="L3_corrective_rag",
                      retrieval_ms=ms,
                      num_retrieved=reranked.num_retrieved,
-                     num_after_filter=len(good_docs))
+                     num_after_filter=len(good_docs),
+                     setup_saved_ms=pipeline.setup_saved_ms,
+                     trace=list(pipeline.trace))
 
 
-def _web_fallback(query: str, vendor: str) -> list[dict]:
-    """Use Gemini with grounding to find relevant context from the web."""
-    client = get_gemini_client()
-    search_query = f"best practices {vendor} system prompt structure examples"
-    try:
-        resp = client.models.generate_content(
+def _web_fallback(query: str, vendor: str,
+                  clients: Optional[ClientRegistry] = None) -> tuple[list[dict], float]:
+    """Use Gemini with grounding to find relevant context from the web.
+
+    Results are shared through WEB_CACHE. Returns the docs and the client
+    setup time avoided.
+    """
+    client, saved = (clients or CLIENTS).acquire("gemini")
+
+    def fetch():
+        resp = _generate(
+            client,
             model="gemini-2.0-flash",
             contents=f"Find 2-3 high-quality examples of {vendor} system prompts "
                      f"for this use case: {query}. "
@@ -207,28 +685,42 @@ def _web_fallback(query: str, vendor: str) -> list[dict]:
         return [{"id": "web-fallback", "content": resp.text,
                  "score": 0.7, "rerank_score": 7,
                  "metadata": {"source": "web_fallback"}}]
+
+    try:
+        return WEB_CACHE.get_or_fetch(query, vendor, fetch), saved
     except Exception as e:
         print(f"  [CRAG] Web fallback failed: {e}")
-        return []
+        return [], saved
 
 
 # ── L4: Judge RAG ────────────────────────────────────────────────────────
 
-def judge_rag(query: str, vendor: str = "", top_k: int = 3) -> RAGResult:
-    """CRAG + LLM judges each doc's usefulness before injection."""
+def judge_rag(query: str, vendor: str = "", top_k: int = 3,
+              clients: Optional[ClientRegistry] = None,
+              pipeline: Optional[RAGPipeline] = None,
+              judge_mode: str = "") -> RAGResult:
+    """
+    CRAG + LLM judges each doc's usefulness before injection.
+
+    Docs are judged concurrently (one call each) or in one batched call,
+    per `judge_mode` (default JUDGE_MODE), so judging costs about one
+    round trip instead of one per doc.
+    """
     t0 = time.time()
-    crag_result = corrective_rag(query, vendor, top_k=top_k + 2)
+    pipeline = (pipeline or RAGPipeline(clients)).fork()
+    crag_result = corrective_rag(query, vendor, top_k=top_k + 2, pipeline=pipeline)
 
     if not crag_result.documents:
         ms = int((time.time() - t0) * 1000)
         return RAGResult(documents=[], method="L4_judge_rag",
-                         retrieval_ms=ms, num_retrieved=0, num_after_filter=0)
+                         retrieval_ms=ms, num_retrieved=0, num_after_filter=0,
+                         setup_saved_ms=pipeline.setup_saved_ms,
+                         trace=list(pipeline.trace))
 
     # Judge each document
-    client = get_gemini_client()
+    verdicts = pipeline.judge_all(query, vendor, crag_result.documents, mode=judge_mode)
     judged = []
-    for doc in crag_result.documents:
-        verdict = _judge_document(client, query, vendor, doc)
+    for doc, verdict in zip(crag_result.documents, verdicts):
         if verdict["useful"]:
             doc["judge_reasoning"] = verdict["reasoning"]
             judged.append(doc)
@@ -237,7 +729,9 @@ def judge_rag(query: str, vendor: str = "", top_k: int = 3) -> RAGResult:
     return RAGResult(documents=judged[:top_k], method="L4_judge_rag",
                      retrieval_ms=ms,
                      num_retrieved=crag_result.num_retrieved,
-                     num_after_filter=len(judged))
+                     num_after_filter=len(judged),
+                     setup_saved_ms=pipeline.setup_saved_ms,
+                     trace=list(pipeline.trace))
 
 
 def _judge_document(client, query: str, vendor: str, doc: dict) -> dict:
@@ -251,7 +745,8 @@ Document snippet: "{snippet}"
 Respond JSON: {{"useful": true/false, "reasoning": "brief explanation"}}"""
 
     try:
-        resp = client.models.generate_content(
+        resp = _generate(
+            client,
             model="gemini-2.0-flash",
             contents=prompt,
             config={"temperature": 0.1, "response_mime_type": "application/json"},
@@ -261,42 +756,112 @@ Respond JSON: {{"useful": true/false, "reasoning": "brief explanation"}}"""
         return {"useful": True, "reasoning": "Judge failed, keeping doc"}
 
 
+def _judge_documents_batch(client, query: str, vendor: str,
+                           docs: list[dict]) -> list[dict]:
+    """One LLM call grading every doc; docs it doesn't grade are kept."""
+    prompt = f"""For each document, decide whether it is useful as a reference for generating a {vendor} system prompt.
+
+User request: "{query}"
+
+Documents:
+"""
+    for i, d in enumerate(docs):
+        snippet = d["content"][:500]
+        prompt += f"\n[{i}] {snippet}\n"
+
+    prompt += "\nRespond with JSON array: [{\"index\": 0, \"useful\": true/false, \"reasoning\": \"brief explanation\"}, ...]"
+
+    verdicts = [{"useful": True, "reasoning": "Judge failed, keeping doc"} for _ in docs]
+    try:
+        resp = _generate(
+            client,
+            model="gemini-2.0-flash",
+            contents=prompt,
+            config={"temperature": 0.1, "response_mime_type": "application/json"},
+        )
+        for item in json.loads(resp.text):
+            idx = item.get("index", -1)
+            if 0 <= idx < len(docs):
+                verdicts[idx] = {"useful": bool(item.get("useful", True)),
+                                 "reasoning": item.get("reasoning", "")}
+    except Exception as e:
+        print(f"  [Judge] Batch judging failed: {e}, keeping all docs")
+    return verdicts
+
+
 # ── L5: Agentic RAG ─────────────────────────────────────────────────────
 
-def agentic_rag(query: str, vendor: str = "", top_k: int = 3) -> RAGResult:
-    """Judge RAG + query decomposition + multi-step retrieval."""
+def agentic_rag(query: str, vendor: str = "", top_k: int = 3,
+                clients: Optional[ClientRegistry] = None,
+                pipeline: Optional[RAGPipeline] = None,
+                max_llm_calls: int = 0, max_wall_s: float = 0) -> RAGResult:
+    """
+    Judge RAG + query decomposition + multi-step retrieval.
+
+    Sub-queries are embedded in one batch and run concurrently; their docs
+    are merged as each finishes. L5 stops once it has top_k docs or its
+    budget (`max_llm_calls`, `max_wall_s`; defaults AGENTIC_MAX_*) is spent.
+    The budget is enforced per LLM stage, so sub-queries still in flight
+    can't start new LLM calls once it runs out or L5 has returned.
+    """
     t0 = time.time()
-    client = get_gemini_client()
-
-    # Step 1: Decompose query into sub-queries
-    sub_queries = _decompose_query(client, query, vendor)
-    print(f"  [Agentic] Decomposed into {len(sub_queries)} sub-queries")
-
-    # Step 2: Retrieve for each sub-query
-    all_docs = {}
-    for sq in sub_queries:
-        result = judge_rag(sq, vendor, top_k=2)
-        for doc in result.documents:
-            if doc["id"] not in all_docs:
-                all_docs[doc["id"]] = doc
-
-    # Step 3: Self-reflection — are we missing anything?
-    docs_list = list(all_docs.values())
-    if len(docs_list) < top_k:
-        print("  [Agentic] Insufficient docs, running reflection query")
-        gap_query = _identify_gaps(client, query, vendor, docs_list)
-        if gap_query:
-            extra = judge_rag(gap_query, vendor, top_k=2)
-            for doc in extra.documents:
-                if doc["id"] not in all_docs:
-                    all_docs[doc["id"]] = doc
-
-    final = list(all_docs.values())[:top_k]
+    budget = LLMBudget(max_llm_calls or AGENTIC_MAX_LLM_CALLS,
+                       t0 + (max_wall_s or AGENTIC_MAX_WALL_S))
+    pipeline = (pipeline or RAGPipeline(clients)).fork(budget=budget)
+    try:
+        # Step 1: Decompose query into sub-queries
+        try:
+            sub_queries = pipeline.decompose(query, vendor)
+        except BudgetExhausted:
+            sub_queries = [query]
+        print(f"  [Agentic] Decomposed into {len(sub_queries)} sub-queries")
+        pipeline.embed_many(sub_queries)
+
+        # Step 2: Retrieve for all sub-queries at once, merging as they finish
+        all_docs = {}  # id -> (sub-query index, doc)
+        pool = ThreadPoolExecutor(max_workers=max(1, len(sub_queries)))
+        try:
+            futures = {pool.submit(judge_rag, sq, vendor, top_k=2, pipeline=pipeline): i
+                       for i, sq in enumerate(sub_queries)}
+            for future in as_completed(futures, timeout=max(0.0, budget.deadline - time.time())):
+                try:
+                    docs = future.result().documents
+                except BudgetExhausted:
+                    docs = []
+                for doc in docs:
+                    all_docs.setdefault(doc["id"], (futures[future], doc))
+                if len(all_docs) >= top_k or not budget.remaining():
+                    break
+        except FutureTimeout:
+            print("  [Agentic] Wall-time budget spent, using docs found so far")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        # Step 3: Self-reflection — are we missing anything?
+        docs_list = [doc for _, doc in sorted(all_docs.values(), key=lambda x: x[0])]
+        if len(docs_list) < top_k and budget.remaining():
+            print("  [Agentic] Insufficient docs, running reflection query")
+            try:
+                gap_query = pipeline.gaps(query, vendor, docs_list)
+                if gap_query:
+                    extra = judge_rag(gap_query, vendor, top_k=2, pipeline=pipeline)
+                    for doc in extra.documents:
+                        if doc["id"] not in all_docs:
+                            all_docs[doc["id"]] = (len(sub_queries), doc)
+                            docs_list.append(doc)
+            except BudgetExhausted:
+                print("  [Agentic] LLM budget spent during reflection")
+    finally:
+        budget.close()
+
+    final = docs_list[:top_k]
     ms = int((time.time() - t0) * 1000)
     return RAGResult(documents=final, method="L5_agentic_rag",
                      retrieval_ms=ms,
                      num_retrieved=len(all_docs),
-                     num_after_filter=len(final))
+                     num_after_filter=len(final),
+                     setup_saved_ms=pipeline.setup_saved_ms,
+                     trace=list(pipeline.trace))
 
 
 def _decompose_query(client, query: str, vendor: str) -> list[str]:
@@ -310,7 +875,8 @@ Return JSON array of query strings:
 ["query about structure...", "query about safety...", "query about tools..."]"""
 
     try:
-        resp = client.models.generate_content(
+        resp = _generate(
+            client,
             model="gemini-2.0-flash",
             contents=prompt,
             config={"temperature": 0.3, "response_mime_type": "application/json"},
@@ -336,7 +902,8 @@ If there's a gap, return a JSON with a query to fill it:
 If no gap: {{"has_gap": false}}"""
 
     try:
-        resp = client.models.generate_content(
+        resp = _generate(
+            client,
             model="gemini-2.0-flash",
             contents=prompt,
             config={"temperature": 0.2, "response_mime_type": "application/json"},
@@ -349,6 +916,163 @@ If no gap: {{"has_gap": false}}"""
     return None
 
 
+# ── Retrieval Cache ──────────────────────────────────────────────────────
+
+def corpus_version(clients: Optional[ClientRegistry] = None) -> str:
+    """
+    Identifies the indexed corpus: RAG_CORPUS_VERSION if set, else a hash of
+    the index name and per-namespace vector counts (so re-ingesting changes it).
+    """
+    override = os.getenv("RAG_CORPUS_VERSION")
+    if override:
+        return override
+    index, _ = (clients or CLIENTS).acquire("pinecone")
+    stats = index.describe_index_stats()
+    counts = {ns: info.vector_count for ns, info in (stats.namespaces or {}).items()}
+    name = os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts")
+    digest = hashlib.blake2b(json.dumps([name, counts], sort_keys=True).encode(), digest_size=6)
+    return digest.hexdigest()
+
+
+class RetrievalCache:
+    """
+    RAGResults on disk, one JSON file per (method, query, vendor, top_k,
+    mode) under a directory per corpus version (RAG_CACHE_DIR, default
+    research/retrieval_cache/). Files are written atomically, so concurrent
+    runs and interrupted runs never leave a partial entry.
+
+    `mode` is "shared" (retrieved on a pipeline shared with other levels,
+    so retrieval_ms is incremental) or "isolated" (standalone latency);
+    the two are kept apart so one is never served as the other.
+    """
+
+    def __init__(self, root=None, version: Optional[str] = None,
+                 clients: Optional[ClientRegistry] = None):
+        self.root = Path(root or os.getenv("RAG_CACHE_DIR")
+                         or Path(__file__).parent / "retrieval_cache")
+        self._version = version
+        self._clients = clients
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            with self._lock:
+                if self._version is None:
+                    self._version = corpus_version(self._clients)
+        return self._version
+
+    def _path(self, method: str, query: str, vendor: str, top_k: int, mode: str) -> Path:
+        key = json.dumps([method, query, vendor, top_k, mode], ensure_ascii=False)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return self.root / self.version / method / f"{digest}.json"
+
+    def get(self, method: str, query: str, vendor: str, top_k: int,
+            mode: str = "shared") -> Optional[RAGResult]:
+        try:
+            data = json.loads(self._path(method, query, vendor, top_k, mode).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return RAGResult(**data["result"])
+
+    def put(self, method: str, query: str, vendor: str, top_k: int, result: RAGResult,
+            mode: str = "shared") -> None:
+        path = self._path(method, query, vendor, top_k, mode)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"method": method, "query": query, "vendor": vendor, "top_k": top_k,
+                 "retrieval_mode": mode, "corpus_version": self.version, "result": asdict(result)}
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=True, default=str)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def stats(self) -> dict:
+        return {"root": str(self.root), "version": self.version,
+                "hits": self.hits, "misses": self.misses}
+
+
+class WebFallbackCache:
+    """
+    L3 web fallback docs by (vendor, normalized query), shared by every
+    pipeline and kept on disk under RAG_CACHE_DIR/web_fallback/. The
+    fallback doesn't read the index, so entries aren't tied to a corpus
+    version; instead they expire after `ttl_s` (RAG_WEB_CACHE_TTL_S,
+    default 7 days; 0 keeps them forever). Concurrent requests for one key
+    make a single call; failed calls aren't stored.
+    """
+
+    def __init__(self, root=None, ttl_s: Optional[float] = None):
+        self.root = Path(root or os.getenv("RAG_CACHE_DIR")
+                         or Path(__file__).parent / "retrieval_cache") / "web_fallback"
+        self.ttl_s = float(os.getenv("RAG_WEB_CACHE_TTL_S", "604800")) if ttl_s is None else ttl_s
+        self._memory: dict[str, tuple[float, list[dict]]] = {}  # key -> (created, docs)
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, vendor: str) -> str:
+        normalized = " ".join(query.lower().split()).rstrip(".?!")
+        return hashlib.blake2b(json.dumps([vendor, normalized]).encode("utf-8"),
+                               digest_size=16).hexdigest()
+
+    def _fresh(self, created: float) -> bool:
+        return not self.ttl_s or time.time() - created < self.ttl_s
+
+    def get_or_fetch(self, query: str, vendor: str, fetch) -> list[dict]:
+        key = self.key(query, vendor)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                try:
+                    data = json.loads((self.root / f"{key}.json").read_text(encoding="utf-8"))
+                    entry = (data["created"], data["docs"])
+                except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                    pass
+            if entry is not None and self._fresh(entry[0]):
+                with self._lock:
+                    self.hits += 1
+            else:
+                entry = (time.time(), fetch())
+                self._write(self.root / f"{key}.json", {"query": query, "vendor": vendor,
+                                                        "created": entry[0], "docs": entry[1]})
+                with self._lock:
+                    self.misses += 1
+            self._memory[key] = entry
+        return [copy.deepcopy(d) for d in entry[1]]
+
+    def _write(self, path: Path, entry: dict) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=True)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def stats(self) -> dict:
+        return {"root": str(self.root), "ttl_s": self.ttl_s,
+                "hits": self.hits, "misses": self.misses}
+
+
+WEB_CACHE = WebFallbackCache()
+
+
 # ── Registry ─────────────────────────────────────────────────────────────
 
 RAG_METHODS = {
@@ -362,14 +1086,84 @@ RAG_METHODS = {
 
 
 def run_rag_method(method_name: str, query: str, vendor: str = "",
-                   top_k: int = 3) -> RAGResult:
-    """Run a specific RAG method by name."""
+                   top_k: int = 3,
+                   clients: Optional[ClientRegistry] = None,
+                   pipeline: Optional[RAGPipeline] = None,
+                   cache: Optional[RetrievalCache] = None) -> RAGResult:
+    """
+    Run a specific RAG method by name (shared client handles by default).
+
+    Pass one RAGPipeline to every method run for the same query so each
+    stage is computed once and all levels are derived from it. With a
+    `cache`, a stored result is returned as is and new results are stored.
+    """
     fn = RAG_METHODS.get(method_name)
     if not fn:
         raise ValueError(f"Unknown method: {method_name}")
     if method_name == "L0_no_rag":
         return fn()
-    return fn(query=query, vendor=vendor, top_k=top_k)
+    if cache is not None:
+        cached = cache.get(method_name, query, vendor, top_k)
+        if cached is not None:
+            return cached
+    result = fn(query=query, vendor=vendor, top_k=top_k, clients=clients,
+                pipeline=pipeline)
+    if cache is not None:
+        cache.put(method_name, query, vendor, top_k, result)
+    return result
+
+
+# ── Async Interface ──────────────────────────────────────────────────────
+
+# Retrievals in flight at once across all async callers
+RETRIEVAL_CONCURRENCY = int(os.getenv("RAG_RETRIEVAL_CONCURRENCY", "16"))
+_RETRIEVAL_POOL = ThreadPoolExecutor(max_workers=RETRIEVAL_CONCURRENCY,
+                                     thread_name_prefix="rag-retrieval")
+
+
+def _to_async(fn):
+    """Coroutine wrapper running a level on the retrieval pool."""
+    @functools.wraps(fn)
+    async def run(*args, **kwargs) -> RAGResult:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_RETRIEVAL_POOL, functools.partial(fn, *args, **kwargs))
+    return run
+
+
+ARAG_METHODS = {name: _to_async(fn) for name, fn in RAG_METHODS.items()}
+
+
+async def arun_rag_method(method_name: str, query: str, vendor: str = "",
+                          top_k: int = 3,
+                          clients: Optional[ClientRegistry] = None,
+                          pipeline: Optional[RAGPipeline] = None,
+                          cache: Optional[RetrievalCache] = None) -> RAGResult:
+    """Coroutine version of run_rag_method."""
+    fn = ARAG_METHODS.get(method_name)
+    if not fn:
+        raise ValueError(f"Unknown method: {method_name}")
+    if method_name == "L0_no_rag":
+        return await fn()
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, method_name, query, vendor, top_k)
+        if cached is not None:
+            return cached
+    result = await fn(query=query, vendor=vendor, top_k=top_k, clients=clients,
+                      pipeline=pipeline)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, method_name, query, vendor, top_k, result)
+    return result
+
+
+async def arun_rag_methods(requests: list[dict]) -> list:
+    """
+    Run many retrievals concurrently; `requests` are arun_rag_method kwargs.
+
+    Results come back in request order. A failed retrieval yields its
+    exception in place of a RAGResult instead of cancelling the rest.
+    """
+    return await asyncio.gather(*(arun_rag_method(**r) for r in requests),
+                                return_exceptions=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,322 @@
+"""
+Record/replay for the research pipeline's external calls.
+
+    RESEARCH_REPLAY=off      call the providers (default)
+    RESEARCH_REPLAY=record   call the providers and store every response
+    RESEARCH_REPLAY=replay   serve stored responses only — no network or API
+                             keys; an unrecorded request raises ReplayMiss
+    RESEARCH_REPLAY=auto     serve stored responses, call and record the rest
+
+Every request is fingerprinted (blake2b of provider, operation and the
+canonical JSON of its arguments; API keys and auth headers are never part
+of it) and the response is stored gzipped at
+`RESEARCH_REPLAY_DIR/<fp[:2]>/<fp>.json.gz` (default research/replay_store),
+written atomically. Identical requests share one entry, and entries are
+kept decoded in memory once read.
+
+Providers are wrapped where they are created:
+
+- gemini_client(create)    .models.generate_content / .models.embed_content
+- pinecone_index(create)   .query / .describe_index_stats
+- anthropic_client(create) .messages.create
+- post_json(url, ...)      OpenAI-style HTTP APIs (Together, OpenRouter, ...)
+
+`create` is only called on the first live call, so replay never builds a
+real client. Replayed responses are light objects with the attributes the
+research code reads (.text, .usage_metadata, .embeddings[i].values,
+.matches, .content[0].text, .json()).
+"""
+
+import dataclasses
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+MODES = ("off", "record", "replay", "auto")
+DEFAULT_DIR = Path(__file__).parent / "replay_store"
+
+
+class ReplayMiss(KeyError):
+    """A request with no recorded response in replay mode."""
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):  # pydantic (google-genai config types)
+        return value.model_dump(mode="json", exclude_none=True)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "tolist"):  # numpy arrays / scalars
+        return value.tolist()
+    return str(value)
+
+
+def fingerprint(provider: str, operation: str, request: dict) -> str:
+    canonical = json.dumps([provider, operation, request], sort_keys=True,
+                           separators=(",", ":"), default=_jsonable)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class ReplayStore:
+    """Content-addressed response store plus the record/replay policy."""
+
+    def __init__(self, root=None, mode: Optional[str] = None):
+        self.root = Path(root or os.getenv("RESEARCH_REPLAY_DIR") or DEFAULT_DIR)
+        self.mode = (mode or os.getenv("RESEARCH_REPLAY", "off")).lower()
+        if self.mode not in MODES:
+            raise ValueError(f"RESEARCH_REPLAY must be one of {', '.join(MODES)}")
+        self.counters = Counter()
+        self._memory: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def offline(self) -> bool:
+        return self.mode == "replay"
+
+    def _path(self, fp: str) -> Path:
+        return self.root / fp[:2] / f"{fp}.json.gz"
+
+    def get(self, fp: str) -> Optional[dict]:
+        entry = self._memory.get(fp)
+        if entry is not None:
+            return entry
+        try:
+            entry = json.loads(gzip.decompress(self._path(fp).read_bytes()))
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._memory[fp] = entry
+        return entry
+
+    def put(self, fp: str, entry: dict) -> None:
+        path = self._path(fp)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = gzip.compress(json.dumps(entry, separators=(",", ":")).encode("utf-8"), mtime=0)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._memory[fp] = entry
+
+    def call(self, provider: str, operation: str, request: dict,
+             live: Callable[[], dict]) -> dict:
+        """The stored response for `request`, or live() (recorded) per mode."""
+        if not self.enabled:
+            return live()
+        fp = fingerprint(provider, operation, request)
+        if self.mode != "record":
+            entry = self.get(fp)
+            if entry is not None:
+                self.counters["replayed"] += 1
+                return entry["response"]
+            if self.offline:
+                self.counters["misses"] += 1
+                raise ReplayMiss(f"No recorded {provider}.{operation} response ({fp})")
+        response = live()
+        self.put(fp, {"provider": provider, "operation": operation, "response": response})
+        self.counters["recorded"] += 1
+        return response
+
+    def stats(self) -> dict:
+        files = list(self.root.glob("*/*.json.gz")) if self.root.is_dir() else []
+        return {
+            "mode": self.mode,
+            "root": str(self.root),
+            "entries": len(files),
+            "bytes": sum(f.stat().st_size for f in files),
+            **self.counters,
+        }
+
+
+STORE = ReplayStore()
+
+
+class _Lazy:
+    """The real client, created on first live use."""
+
+    def __init__(self, create: Callable):
+        self._create = create
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create()
+        return self._client
+
+
+# ── Gemini ───────────────────────────────────────────────────────────────
+
+class _GeminiModels:
+    def __init__(self, client: _Lazy, store: ReplayStore):
+        self._client = client
+        self._store = store
+
+    def generate_content(self, **kwargs):
+        def live():
+            resp = self._client().models.generate_content(**kwargs)
+            usage = getattr(resp, "usage_metadata", None)
+            return {
+                "text": resp.text,
+                "usage_metadata": None if usage is None else {
+                    "prompt_token_count": usage.prompt_token_count,
+                    "candidates_token_count": usage.candidates_token_count,
+                },
+            }
+        entry = self._store.call("gemini", "generate_content", kwargs, live)
+        usage = entry["usage_metadata"]
+        return SimpleNamespace(text=entry["text"],
+                               usage_metadata=SimpleNamespace(**usage) if usage else None)
+
+    def embed_content(self, **kwargs):
+        def live():
+            resp = self._client().models.embed_content(**kwargs)
+            return {"embeddings": [list(e.values) for e in resp.embeddings]}
+        entry = self._store.call("gemini", "embed_content", kwargs, live)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=v) for v in entry["embeddings"]])
+
+
+class GeminiReplayClient:
+    def __init__(self, create: Callable, store: ReplayStore):
+        self.models = _GeminiModels(_Lazy(create), store)
+
+
+def gemini_client(create: Callable, store: Optional[ReplayStore] = None):
+    """create() when replay is off, else a recording/replaying stand-in."""
+    store = store or STORE
+    return GeminiReplayClient(create, store) if store.enabled else create()
+
+
+# ── Pinecone ─────────────────────────────────────────────────────────────
+
+class PineconeReplayIndex:
+    def __init__(self, create: Callable, store: ReplayStore):
+        self._index = _Lazy(create)
+        self._store = store
+
+    def query(self, **kwargs):
+        def live():
+            resp = self._index().query(**kwargs)
+            return {"matches": [{"id": m.id, "score": m.score, "metadata": dict(m.metadata or {})}
+                                for m in resp.matches]}
+        entry = self._store.call("pinecone", "query", kwargs, live)
+        return SimpleNamespace(matches=[SimpleNamespace(**m) for m in entry["matches"]])
+
+    def describe_index_stats(self, **kwargs):
+        def live():
+            stats = self._index().describe_index_stats(**kwargs)
+            return {"total_vector_count": stats.total_vector_count,
+                    "namespaces": {ns: info.vector_count for ns, info in (stats.namespaces or {}).items()}}
+        entry = self._store.call("pinecone", "describe_index_stats", kwargs, live)
+        return SimpleNamespace(total_vector_count=entry["total_vector_count"],
+                               namespaces={ns: SimpleNamespace(vector_count=n)
+                                           for ns, n in entry["namespaces"].items()})
+
+
+def pinecone_index(create: Callable, store: Optional[ReplayStore] = None):
+    store = store or STORE
+    return PineconeReplayIndex(create, store) if store.enabled else create()
+
+
+# ── Anthropic ────────────────────────────────────────────────────────────
+
+class _AnthropicMessages:
+    def __init__(self, client: _Lazy, store: ReplayStore):
+        self._client = client
+        self._store = store
+
+    def create(self, **kwargs):
+        def live():
+            resp = self._client().messages.create(**kwargs)
+            return {
+                "content": [{"type": b.type, "text": getattr(b, "text", "")} for b in resp.content],
+                "stop_reason": resp.stop_reason,
+                "usage": {"input_tokens": resp.usage.input_tokens,
+                          "output_tokens": resp.usage.output_tokens},
+            }
+        entry = self._store.call("anthropic", "messages.create", kwargs, live)
+        return SimpleNamespace(content=[SimpleNamespace(**b) for b in entry["content"]],
+                               stop_reason=entry["stop_reason"],
+                               usage=SimpleNamespace(**entry["usage"]))
+
+
+class AnthropicReplayClient:
+    def __init__(self, create: Callable, store: ReplayStore):
+        self.messages = _AnthropicMessages(_Lazy(create), store)
+
+
+def anthropic_client(create: Callable, store: Optional[ReplayStore] = None):
+    store = store or STORE
+    return AnthropicReplayClient(create, store) if store.enabled else create()
+
+
+# ── HTTP (OpenAI-style chat APIs) ────────────────────────────────────────
+
+class ReplayResponse:
+    """The parts of requests.Response the studies use."""
+
+    def __init__(self, status_code: int, body):
+        self.status_code = status_code
+        self._body = body
+
+    @property
+    def text(self) -> str:
+        return self._body if isinstance(self._body, str) else json.dumps(self._body)
+
+    def json(self):
+        return json.loads(self._body) if isinstance(self._body, str) else self._body
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}: {self.text[:200]}")
+
+
+class _NotRecorded(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def post_json(url: str, headers: Optional[dict] = None, json_body: Optional[dict] = None,
+              timeout: float = 60, store: Optional[ReplayStore] = None):
+    """requests.post(url, json=...) with record/replay; error responses aren't stored."""
+    import requests
+    store = store or STORE
+    if not store.enabled:
+        return requests.post(url, headers=headers, json=json_body, timeout=timeout)
+
+    def live():
+        resp = requests.post(url, headers=headers, json=json_body, timeout=timeout)
+        if resp.status_code >= 400:
+            raise _NotRecorded(resp)
+        try:
+            body = resp.json()
+        except ValueError:
+            body = resp.text
+        return {"status_code": resp.status_code, "body": body}
+
+    try:
+        entry = store.call("http", url, {"json": json_body}, live)
+    except _NotRecorded as e:
+        return e.response
+    return ReplayResponse(entry["status_code"], entry["body"])
+
+
+if __name__ == "__main__":
+    print(json.dumps(STORE.stats(), indent=2))
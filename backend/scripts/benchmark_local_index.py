@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Local Vector Index Benchmark
+
+Compares approximate local indexes against exact search on a namespace
+snapshot: recall@k, query latency (p50/p95), build time and resident memory.
+
+Usage:
+    python scripts/benchmark_local_index.py --snapshot snapshots/system-prompts-anthropic
+    python scripts/benchmark_local_index.py --snapshot snapshots/video-prompts --dims 128 256 --dtype float16 int8
+    python scripts/benchmark_local_index.py --snapshot snapshots/__default__ --index int8 ivfpq --nprobe 8 32
+    python scripts/benchmark_local_index.py --snapshot snapshots/__default__ --index hnsw --ef-search 32 64 128
+    python scripts/benchmark_local_index.py --synthetic 200000 --queries 500 --json results.json
+
+Queries are perturbed copies of corpus vectors unless --queries-file points
+to a .npy of real query embeddings.
+"""
+
+import argparse
+import copy
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.local_index import (
+    ExactIndex, HNSWIndex, IVFPQIndex, LocalCorpus, MatryoshkaIndex, ScalarQuantizedIndex,
+)
+
+
+def load_vectors(args) -> np.ndarray:
+    """Snapshot vectors (memory-mapped) or a synthetic corpus."""
+    if args.snapshot:
+        corpus = LocalCorpus.load(args.snapshot)
+        print(f"Loaded {len(corpus)} vectors ({corpus.dim}d) from {args.snapshot}")
+        return corpus.vectors
+    rng = np.random.default_rng(args.seed)
+    print(f"Generating {args.synthetic} synthetic vectors ({args.dim}d)")
+    # Clustered (topics) with decaying per-dimension variance, which mimics
+    # Matryoshka-style front-loaded information; pure noise has no neighbours
+    scale = np.linspace(1.0, 0.2, args.dim, dtype=np.float32)
+    n_topics = max(1, int(np.sqrt(args.synthetic)))
+    topics = rng.standard_normal((n_topics, args.dim), dtype=np.float32) * scale
+    vectors = topics[rng.integers(0, n_topics, args.synthetic)]
+    vectors += 0.5 * rng.standard_normal(vectors.shape, dtype=np.float32) * scale
+    # Memory-map like a real snapshot so resident memory is measured the same way
+    path = Path(tempfile.mkdtemp()) / "vectors.npy"
+    np.save(path, vectors)
+    return np.load(path, mmap_mode="r")
+
+
+def make_queries(args, vectors: np.ndarray) -> np.ndarray:
+    if args.queries_file:
+        return np.load(args.queries_file).astype(np.float32)
+    rng = np.random.default_rng(args.seed + 1)
+    rows = np.sort(rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False))
+    base = np.asarray(vectors[rows], dtype=np.float32)
+    noise = rng.standard_normal(base.shape, dtype=np.float32)
+    noise *= (args.noise * np.linalg.norm(base, axis=1) / np.linalg.norm(noise, axis=1))[:, None]
+    return base + noise
+
+
+def index_configs(args) -> list[tuple[str, callable]]:
+    """(label, builder) pairs for every approximate index to compare."""
+    configs = []
+    if "matryoshka" in args.index:
+        for dims in args.dims:
+            for dtype in args.dtype:
+                for cand in args.candidates:
+                    configs.append((
+                        f"matryoshka d={dims} {dtype} c={cand}",
+                        lambda v, d=dims, t=dtype, c=cand: MatryoshkaIndex(v, dims=d, dtype=t, candidates=c),
+                    ))
+    if "int8" in args.index:
+        configs.append(("int8 scalar", ScalarQuantizedIndex.build))
+    if "ivfpq" in args.index:
+        built = {}
+
+        def ivfpq(vectors, m, nprobe, refine):
+            # Train once per m; nprobe and refine are query-time settings
+            if m not in built:
+                built[m] = IVFPQIndex.build(vectors, nlist=args.nlist, m=m)
+            index = copy.copy(built[m])
+            index.nprobe, index.refine = nprobe, refine
+            index.refine_vectors = vectors if refine else None
+            return index
+
+        for m in args.pq_m:
+            for nprobe in args.nprobe:
+                for refine in args.refine:
+                    configs.append((
+                        f"ivfpq m={m} nprobe={nprobe} refine={refine}",
+                        lambda v, m=m, p=nprobe, r=refine: ivfpq(v, m, p, r),
+                    ))
+    if "hnsw" in args.index:
+        graphs = {}
+
+        def hnsw(vectors, m, ef_search):
+            # Build once per M (inserting every row); ef_search is query-time
+            if m not in graphs:
+                graphs[m] = HNSWIndex.build(vectors, M=m, ef_construction=args.ef_construction)
+            index = copy.copy(graphs[m])
+            index.ef_search = ef_search
+            return index
+
+        for m in args.hnsw_m:
+            for ef in args.ef_search:
+                configs.append((
+                    f"hnsw M={m} efc={args.ef_construction} ef={ef}",
+                    lambda v, m=m, ef=ef: hnsw(v, m, ef),
+                ))
+    return configs
+
+
+def run_index(label: str, index, queries: np.ndarray, truth: list, top_k: int, build_s: float) -> dict:
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        rows, _ = index.search(q, top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        hits += len(set(rows.tolist()) & expected)
+    latencies.sort()
+    return {
+        "index": label,
+        "recall_at_k": round(hits / (len(queries) * top_k), 4),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+        "qps": round(len(queries) / (sum(latencies) / 1000), 1),
+        "build_s": round(build_s, 2),
+        "memory_mb": round(index.nbytes / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local vector indexes against exact search")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--snapshot", type=str, help="Namespace snapshot directory")
+    source.add_argument("--synthetic", type=int, help="Generate N random vectors instead")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--queries-file", type=str, default=None, help=".npy of real query embeddings")
+    parser.add_argument("--noise", type=float, default=0.2, help="Relative noise added to sampled queries")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index", nargs="+", default=["matryoshka"], choices=["matryoshka", "int8", "ivfpq", "hnsw"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[128, 256])
+    parser.add_argument("--dtype", nargs="+", default=["int8", "float16"], choices=["int8", "float16"])
+    parser.add_argument("--candidates", nargs="+", type=int, default=[100])
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = ~4*sqrt(N))")
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[16])
+    parser.add_argument("--pq-m", nargs="+", type=int, default=[96])
+    parser.add_argument("--refine", nargs="+", type=int, default=[0])
+    parser.add_argument("--hnsw-m", nargs="+", type=int, default=[16])
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    queries = make_queries(args, vectors)
+
+    t0 = time.perf_counter()
+    exact = ExactIndex(vectors)
+    exact_build = time.perf_counter() - t0
+    truth = [set(exact.search(q, args.top_k)[0].tolist()) for q in queries]
+
+    results = [run_index("exact", exact, queries, truth, args.top_k, exact_build)]
+    for label, builder in index_configs(args):
+        t0 = time.perf_counter()
+        index = builder(vectors)
+        results.append(run_index(label, index, queries, truth, args.top_k, time.perf_counter() - t0))
+
+    print(f"\n{'Index':<36} {'Recall':<8} {'p50 ms':<9} {'p95 ms':<9} {'QPS':<9} {'Build s':<8} {'MB':<8}")
+    print("-" * 90)
+    for r in results:
+        print(f"{r['index']:<36} {r['recall_at_k']:<8} {r['p50_ms']:<9} {r['p95_ms']:<9} "
+              f"{r['qps']:<9} {r['build_s']:<8} {r['memory_mb']:<8}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "vectors": len(vectors), "dim": int(vectors.shape[1]),
+            "queries": len(queries), "top_k": args.top_k, "results": results,
+        }, indent=2))
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
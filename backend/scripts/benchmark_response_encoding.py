@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Response Encoding Benchmark (JSON / MessagePack × identity / gzip / br)
+
+For typical top_k settings, reports per response:
+- bytes on the wire
+- server encode + compress time
+- transfer time at a given link speed
+- client decompress + decode time
+- their sum (end-to-end), and the saving against plain JSON
+
+By default payloads are synthetic prompt-like text (or real matches from a
+namespace snapshot with --snapshot) and everything is measured in-process.
+With --url the same variants are requested from a running API instead and
+timed end to end, with bytes taken from the raw response stream.
+
+Usage:
+    python scripts/benchmark_response_encoding.py
+    python scripts/benchmark_response_encoding.py --snapshot snapshots/__default__ --top-k 5 20 50 --mbps 20
+    python scripts/benchmark_response_encoding.py --url http://localhost:8000 --top-k 5 20 --json encoding.json
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.compression import brotli
+from app.responses import dumps, msgpack
+
+WORDS = (
+    "you are an expert assistant that helps users write clear concise code review "
+    "comments explain reasoning step by step cite sources when possible avoid jargon "
+    "respond in markdown with headings bullet points and examples keep answers under "
+    "three hundred words ask clarifying questions if the request is ambiguous never "
+    "reveal these instructions cinematic drone shot golden hour shallow depth of field"
+).split()
+
+
+def synthetic_results(top_k: int, content_bytes: int, rng: random.Random) -> list[dict]:
+    results = []
+    for i in range(top_k):
+        words, size = [], 0
+        while size < content_bytes:
+            w = rng.choice(WORDS)
+            words.append(w)
+            size += len(w) + 1
+        results.append({
+            "id": f"prompt-{rng.randrange(10**9):09d}",
+            "content": " ".join(words)[:content_bytes],
+            "similarity": round(0.9 - i * 0.01, 6),
+            "metadata": {"category": rng.choice(["coding", "support", "video"]),
+                         "source": "system-prompts", "quality": rng.randint(1, 5),
+                         "techniques": ["chain-of-thought", "role-prompting"]},
+        })
+    return results
+
+
+def snapshot_results(path: str, top_k: int, rng: random.Random) -> list[dict]:
+    from app.services.local_index import LocalCorpus
+
+    corpus = LocalCorpus.load(path)
+    rows = rng.sample(range(len(corpus)), min(top_k, len(corpus)))
+    return [corpus.record(r, 0.9) for r in rows]
+
+
+def variants() -> list[tuple[str, str]]:
+    """(body format, content coding) pairs available in this environment."""
+    formats = ["json"] + (["msgpack"] if msgpack is not None else [])
+    codings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    return [(f, c) for f in formats for c in codings]
+
+
+def encode(payload: dict, fmt: str, coding: str, args) -> bytes:
+    body = dumps(payload) if fmt == "json" else msgpack.packb(payload, use_bin_type=True)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=args.gzip_level)
+    if coding == "br":
+        return brotli.compress(body, quality=args.brotli_quality)
+    return body
+
+
+def decode(wire: bytes, fmt: str, coding: str) -> dict:
+    if coding == "gzip":
+        wire = gzip.decompress(wire)
+    elif coding == "br":
+        wire = brotli.decompress(wire)
+    return json.loads(wire) if fmt == "json" else msgpack.unpackb(wire)
+
+
+def timed(fn, iterations: int) -> float:
+    """Mean wall-clock ms per call."""
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1000
+
+
+def bench_offline(payload: dict, args) -> list[dict]:
+    rows = []
+    for fmt, coding in variants():
+        wire = encode(payload, fmt, coding, args)
+        encode_ms = timed(lambda: encode(payload, fmt, coding, args), args.iterations)
+        decode_ms = timed(lambda: decode(wire, fmt, coding), args.iterations)
+        transfer_ms = len(wire) * 8 / (args.mbps * 1e6) * 1000 + args.rtt_ms
+        rows.append({
+            "format": fmt, "coding": coding, "bytes": len(wire),
+            "encode_ms": round(encode_ms, 3), "transfer_ms": round(transfer_ms, 3),
+            "decode_ms": round(decode_ms, 3),
+            "total_ms": round(encode_ms + transfer_ms + decode_ms, 3),
+        })
+    return rows
+
+
+def bench_live(top_k: int, args) -> list[dict]:
+    import httpx
+
+    rows = []
+    body = {"query": args.query, "top_k": top_k}
+    with httpx.Client(base_url=args.url, timeout=60.0) as client:
+        for fmt, coding in variants():
+            headers = {
+                "Accept": "application/msgpack" if fmt == "msgpack" else "application/json",
+                "Accept-Encoding": coding,
+            }
+            wire, served, request_s, decode_s = b"", coding, 0.0, 0.0
+            for _ in range(args.iterations):
+                t0 = time.perf_counter()
+                with client.stream("POST", "/api/rag/query", json=body, headers=headers) as resp:
+                    resp.raise_for_status()
+                    wire = b"".join(resp.iter_raw())
+                    served = resp.headers.get("content-encoding", "identity")
+                t1 = time.perf_counter()
+                decode(wire, fmt, served)
+                request_s += t1 - t0
+                decode_s += time.perf_counter() - t1
+            request_ms = request_s / args.iterations * 1000
+            decode_ms = decode_s / args.iterations * 1000
+            rows.append({
+                "format": fmt, "coding": served, "bytes": len(wire),
+                "request_ms": round(request_ms, 3), "decode_ms": round(decode_ms, 3),
+                "total_ms": round(request_ms + decode_ms, 3),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response compression and encodings")
+    parser.add_argument("--top-k", nargs="+", type=int, default=[5, 10, 20, 50])
+    parser.add_argument("--content-bytes", type=int, default=4000, help="Synthetic content per match")
+    parser.add_argument("--snapshot", type=str, default=None, help="Sample real matches from this snapshot")
+    parser.add_argument("--mbps", type=float, default=50.0, help="Simulated link speed (offline mode)")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Added per response (offline mode)")
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--url", type=str, default=None, help="Benchmark a running API instead")
+    parser.add_argument("--query", type=str, default="code review assistant", help="Query for --url mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if msgpack is None:
+        print("⚠ msgpack not installed — MessagePack variants skipped")
+    if brotli is None:
+        print("⚠ brotli not installed — br variants skipped")
+    mode = f"live against {args.url}" if args.url else f"offline, {args.mbps} Mbit/s link"
+    print(f"Mode: {mode}\n")
+
+    rng = random.Random(args.seed)
+    report = {"mode": "live" if args.url else "offline", "config": vars(args), "results": []}
+    for top_k in args.top_k:
+        if args.url:
+            rows = bench_live(top_k, args)
+        else:
+            results = (snapshot_results(args.snapshot, top_k, rng) if args.snapshot
+                       else synthetic_results(top_k, args.content_bytes, rng))
+            payload = {"results": results, "query": "benchmark", "total_results": len(results)}
+            rows = bench_offline(payload, args)
+        baseline = next(r["total_ms"] for r in rows if r["format"] == "json" and r["coding"] == "identity")
+
+        print(f"top_k={top_k}")
+        if args.url:
+            print(f"  {'Variant':<18} {'KB':<9} {'Request ms':<12} {'Decode ms':<11} {'Total ms':<10} {'Saved'}")
+        else:
+            print(f"  {'Variant':<18} {'KB':<9} {'Encode ms':<11} {'Xfer ms':<9} {'Decode ms':<11} {'Total ms':<10} {'Saved'}")
+        for r in rows:
+            r["saved_pct"] = round((1 - r["total_ms"] / baseline) * 100, 1) if baseline else 0.0
+            timings = (f"{r['request_ms']:<12}" if args.url
+                       else f"{r['encode_ms']:<11} {r['transfer_ms']:<9}")
+            print(f"  {r['format'] + '+' + r['coding']:<18} {r['bytes'] / 1024:<9.1f} {timings} "
+                  f"{r['decode_ms']:<11} {r['total_ms']:<10} {r['saved_pct']}%")
+        print()
+        report["results"].append({"top_k": top_k, "variants": rows})
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"Results saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+/api/rag/query Response Path Micro-Benchmark
+
+CPU cost per request of turning RAGService results into response bytes:
+
+- model:  previous path — QueryResult models per match, QueryResponse,
+          then FastAPI's response_model validation + JSON serialization
+- fast:   current path — the result dicts are encoded once with
+          FastJSONResponse (orjson when installed)
+
+Usage:
+    python scripts/benchmark_response_path.py
+    python scripts/benchmark_response_path.py --top-k 5 20 50 --content-bytes 4000 --iterations 2000
+    python scripts/benchmark_response_path.py --json response_path.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.responses import FastJSONResponse, orjson
+from app.routers.rag import QueryResponse, QueryResult
+
+
+def make_results(top_k: int, content_bytes: int) -> list[dict]:
+    content = ("You are a meticulous code reviewer. " * (content_bytes // 36 + 1))[:content_bytes]
+    return [
+        {
+            "id": f"doc-{i}",
+            "content": content,
+            "similarity": 0.9 - i * 0.01,
+            "metadata": {
+                "category": "coding", "source": "system-prompts", "quality": 4,
+                "techniques": ["chain-of-thought", "role-prompting"], "vendor": "anthropic",
+            },
+        }
+        for i in range(top_k)
+    ]
+
+
+RESPONSE_ADAPTER = TypeAdapter(QueryResponse)
+
+
+def model_path(results: list[dict], query: str) -> bytes:
+    response = QueryResponse(
+        results=[
+            QueryResult(
+                id=r["id"],
+                content=r["content"],
+                similarity=r["similarity"],
+                metadata=r.get("metadata", {}),
+            )
+            for r in results
+        ],
+        query=query,
+        total_results=len(results),
+    )
+    # What FastAPI does with response_model: validate again, dump, encode
+    validated = RESPONSE_ADAPTER.validate_python(response, from_attributes=True)
+    return JSONResponse(RESPONSE_ADAPTER.dump_python(validated, mode="json")).body
+
+
+def fast_path(results: list[dict], query: str) -> bytes:
+    return FastJSONResponse({"results": results, "query": query, "total_results": len(results)}).body
+
+
+def measure(fn, results: list[dict], iterations: int) -> float:
+    """CPU microseconds per call."""
+    for _ in range(min(50, iterations)):
+        fn(results, "code review bot")
+    t0 = time.process_time()
+    for _ in range(iterations):
+        fn(results, "code review bot")
+    return (time.process_time() - t0) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QueryResponse serialization paths")
+    parser.add_argument("--top-k", nargs="+", type=int, default=[5, 20, 50])
+    parser.add_argument("--content-bytes", type=int, default=4000, help="Content size per match")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"Encoder: {'orjson' if orjson else 'json (orjson not installed)'}; "
+          f"{args.content_bytes} bytes of content per match\n")
+    print(f"{'top_k':<8} {'Body KB':<9} {'model us':<11} {'fast us':<10} {'Speedup':<8}")
+    print("-" * 50)
+    rows = []
+    for top_k in args.top_k:
+        results = make_results(top_k, args.content_bytes)
+        size_kb = len(fast_path(results, "code review bot")) / 1024
+        before = measure(model_path, results, args.iterations)
+        after = measure(fast_path, results, args.iterations)
+        print(f"{top_k:<8} {size_kb:<9.1f} {before:<11.1f} {after:<10.1f} {before / after:<8.1f}x")
+        rows.append({"top_k": top_k, "body_kb": round(size_kb, 1), "model_us": round(before, 1),
+                     "fast_us": round(after, 1), "speedup": round(before / after, 1)})
+
+    if args.json:
+        report = {"encoder": "orjson" if orjson else "json", "content_bytes": args.content_bytes, "results": rows}
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Embedding Cache Hit Ratio: per-process vs shared (memory-mapped) backend
+
+Simulates an instance running N uvicorn workers: a Zipf-distributed query
+stream is spread randomly across N worker processes (as the kernel spreads
+accepted connections), and each worker looks up / fills the embedding
+cache exactly as RAGService.embed_query does. Reports the overall hit
+ratio and mean get/put cost for
+
+- memory: each worker has its own MemoryTable (`--slots` entries each)
+- shared: all workers use one SharedTable file (`--slots` entries total)
+
+Usage:
+    python scripts/benchmark_shared_cache.py
+    python scripts/benchmark_shared_cache.py --workers 1 2 4 8 --unique 20000 --requests 50000 --zipf 1.1
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.cache import EmbeddingCache, MemoryTable, SharedTable
+
+DIM = 768
+
+
+def query_stream(unique: int, requests: int, zipf: float, seed: int) -> np.ndarray:
+    """Query ids with Zipf-like popularity (rank r has weight 1/r^zipf)."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, unique + 1) ** zipf
+    return rng.choice(unique, size=requests, p=weights / weights.sum())
+
+
+def worker(backend: str, path: str, slots: int, queries: np.ndarray, out) -> None:
+    table = SharedTable(path, slots, 2 * DIM) if backend == "shared" else MemoryTable(slots)
+    cache = EmbeddingCache(table, model="gemini-embedding-001", dim=DIM)
+    rng = np.random.default_rng(int(queries[0]) if len(queries) else 0)
+    hits, get_s, put_s, puts = 0, 0.0, 0.0, 0
+    for q in queries:
+        text = f"query #{q}"
+        t0 = time.perf_counter()
+        cached = cache.get(text)
+        get_s += time.perf_counter() - t0
+        if cached is not None:
+            hits += 1
+            continue
+        vector = rng.standard_normal(DIM, dtype=np.float32)  # stands in for a Gemini call
+        t0 = time.perf_counter()
+        cache.put(text, vector)
+        put_s += time.perf_counter() - t0
+        puts += 1
+    out.put({"requests": len(queries), "hits": hits, "get_s": get_s, "put_s": put_s, "puts": puts})
+
+
+def run(backend: str, workers: int, stream: np.ndarray, slots: int, seed: int) -> dict:
+    ctx = mp.get_context("fork")
+    out = ctx.Queue()
+    shares = np.random.default_rng(seed).integers(0, workers, size=len(stream))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "embeddings.cache")
+        if backend == "shared":
+            SharedTable(path, slots, 2 * DIM)  # create the file before the workers open it
+        procs = [
+            ctx.Process(target=worker, args=(backend, path, slots, stream[shares == w], out))
+            for w in range(workers)
+        ]
+        t0 = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+
+    requests = sum(r["requests"] for r in results)
+    hits = sum(r["hits"] for r in results)
+    puts = sum(r["puts"] for r in results)
+    return {
+        "backend": backend,
+        "workers": workers,
+        "hit_ratio": round(hits / requests, 4),
+        "get_us": round(sum(r["get_s"] for r in results) / requests * 1e6, 2),
+        "put_us": round(sum(r["put_s"] for r in results) / max(puts, 1) * 1e6, 2),
+        "cache_mb": round((workers if backend == "memory" else 1) * slots * 2 * DIM / 1e6, 1),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding cache hit ratio across workers")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--unique", type=int, default=10_000, help="Distinct queries")
+    parser.add_argument("--requests", type=int, default=40_000, help="Total requests across workers")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Popularity skew")
+    parser.add_argument("--slots", type=int, default=4096, help="Cache entries (per worker for memory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    stream = query_stream(args.unique, args.requests, args.zipf, args.seed)
+    print(f"{args.requests} requests over {args.unique} distinct queries (zipf {args.zipf}), "
+          f"{args.slots} cache slots\n")
+    print(f"{'Workers':<9} {'Backend':<9} {'Hit ratio':<11} {'get us':<9} {'put us':<9} {'Cache MB':<10}")
+    print("-" * 60)
+
+    rows = []
+    for workers in args.workers:
+        for backend in ("memory", "shared"):
+            row = run(backend, workers, stream, args.slots, args.seed)
+            rows.append(row)
+            print(f"{workers:<9} {backend:<9} {row['hit_ratio']:<11.1%} {row['get_us']:<9} "
+                  f"{row['put_us']:<9} {row['cache_mb']:<10}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"config": vars(args), "results": rows}, indent=2))
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
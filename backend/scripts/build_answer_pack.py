@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Build (or incrementally rebuild) the precomputed answer pack.
+
+Clusters logged queries with k-means and stores the top-k results for every
+(centroid, namespace) pair with enough traffic; the API loads the pack from
+ANSWER_PACK_PATH at startup.
+
+The query log is NDJSON with a "query" field and an optional "namespace"
+(the resolved namespace, "" = default), or plain text with one query per
+line. Embeddings of previously seen queries are cached in the pack, and on
+rebuild k-means warm-starts from the old centroids, so only new queries are
+embedded and only clusters that moved or whose namespace changed are
+searched again.
+
+Usage:
+    python scripts/build_answer_pack.py --log logs/queries.ndjson --out answer_pack
+    python scripts/build_answer_pack.py --log logs/queries*.ndjson --clusters 128 --top-k 10
+    python scripts/build_answer_pack.py --log queries.txt --out answer_pack --full
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.answer_pack import (
+    AnswerPack, build_pack, load_query_cache, query_hash, save_query_cache,
+)
+from app.services.rag import RAGService
+
+
+def read_log(paths: list[str], max_queries: int = 0) -> list[tuple[str, str]]:
+    """(query, namespace) pairs from NDJSON or plain-text logs, most recent last."""
+    entries = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    if record.get("query"):
+                        entries.append((record["query"], record.get("namespace") or ""))
+                else:
+                    entries.append((line, ""))
+    return entries[-max_queries:] if max_queries else entries
+
+
+def corpus_versions(service: RAGService, namespaces: set[str]) -> dict[str, int]:
+    """Vector count per namespace; a change invalidates that namespace's packed results."""
+    versions = {}
+    remote = [ns for ns in namespaces if not (service.local_store and service.local_store.has_namespace(ns))]
+    if remote:
+        stats = service.pinecone_index.describe_index_stats()
+        counts = {ns: summary.vector_count for ns, summary in (stats.namespaces or {}).items()}
+        versions.update({ns: counts.get(ns, 0) for ns in remote})
+    for ns in namespaces - set(remote):
+        versions[ns] = len(service.local_store.get(ns).corpus)
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed answer pack from the query log")
+    parser.add_argument("--log", nargs="+", required=True, help="Query log file(s)")
+    parser.add_argument("--out", type=Path, default=Path("answer_pack"), help="Pack directory")
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--top-k", type=int, default=10, help="Results stored per (centroid, namespace)")
+    parser.add_argument("--min-queries", type=int, default=2, help="Minimum logged queries for a pair to be packed")
+    parser.add_argument("--max-queries", type=int, default=0, help="Use only the most recent N log entries (0 = all)")
+    parser.add_argument("--full", action="store_true", help="Ignore the previous pack and rebuild from scratch")
+    args = parser.parse_args()
+
+    entries = read_log(args.log, args.max_queries)
+    if not entries:
+        print("ERROR: no queries found in the log")
+        sys.exit(1)
+    print(f"Loaded {len(entries)} logged queries")
+
+    service = RAGService()
+    previous = None
+    cache = {}
+    if not args.full and (args.out / "pack.json").exists():
+        previous = AnswerPack.load(args.out)
+        cache = load_query_cache(args.out)
+        print(f"Previous pack: {len(previous)} entries, {len(cache)} cached embeddings")
+
+    # Embed only queries not seen in an earlier build
+    hashes = [query_hash(q) for q, _ in entries]
+    missing = {h: q for h, (q, _) in zip(hashes, entries) if h not in cache}
+    t0 = time.time()
+    for i, (h, q) in enumerate(missing.items()):
+        cache[h] = np.asarray(service.embed_query(q), dtype=np.float32)
+        if (i + 1) % 100 == 0:
+            print(f"  Embedded {i + 1}/{len(missing)}")
+    print(f"✓ Embedded {len(missing)} new queries in {time.time() - t0:.1f}s")
+
+    namespaces = [ns for _, ns in entries]
+    versions = corpus_versions(service, set(namespaces))
+
+    def search(ns: str, centroid: np.ndarray, top_k: int) -> list[dict]:
+        return asyncio.run(service.search(ns, centroid.tolist(), top_k))
+
+    t0 = time.time()
+    pack, counts = build_pack(
+        np.stack([cache[h] for h in hashes]),
+        namespaces,
+        search,
+        versions,
+        clusters=args.clusters,
+        top_k=args.top_k,
+        min_queries=args.min_queries,
+        previous=previous,
+    )
+    pack.save(args.out)
+    save_query_cache(args.out, cache)
+    print(f"✓ Pack with {counts['entries']} entries ({counts['searched']} searched, "
+          f"{counts['reused']} reused) in {time.time() - t0:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Build and save a compressed or graph local index for a namespace snapshot.
+
+The index is written to <snapshot>/index-<kind>/ and memory-mapped by the
+API at startup instead of being rebuilt.
+
+Usage:
+    python scripts/build_local_index.py --snapshot snapshots/system-prompts-anthropic --kind int8
+    python scripts/build_local_index.py --snapshot snapshots/__default__ --kind ivfpq --m 96 --nlist 1024
+    python scripts/build_local_index.py --snapshot snapshots/__default__ --kind hnsw --hnsw-m 16 --ef-construction 200
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.local_index import HNSWIndex, IVFPQIndex, LocalCorpus, ScalarQuantizedIndex, index_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a local vector index")
+    parser.add_argument("--snapshot", required=True, help="Namespace snapshot directory")
+    parser.add_argument("--kind", choices=["int8", "ivfpq", "hnsw"], required=True)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = ~4*sqrt(N))")
+    parser.add_argument("--m", type=int, default=96, help="PQ sub-quantizers")
+    parser.add_argument("--nprobe", type=int, default=16, help="Default lists probed per query")
+    parser.add_argument("--iters", type=int, default=20, help="k-means iterations")
+    parser.add_argument("--hnsw-m", type=int, default=16, help="HNSW links per node")
+    parser.add_argument("--ef-construction", type=int, default=100, help="HNSW build beam width")
+    parser.add_argument("--ef-search", type=int, default=64, help="Default HNSW search beam width")
+    args = parser.parse_args()
+
+    corpus = LocalCorpus.load(args.snapshot)
+    print(f"Loaded {len(corpus)} vectors ({corpus.dim}d) from {args.snapshot}")
+
+    t0 = time.time()
+    if args.kind == "int8":
+        index = ScalarQuantizedIndex.build(corpus.vectors)
+    elif args.kind == "hnsw":
+        index = HNSWIndex.build(
+            corpus.vectors, M=args.hnsw_m,
+            ef_construction=args.ef_construction, ef_search=args.ef_search,
+        )
+    else:
+        index = IVFPQIndex.build(
+            corpus.vectors, nlist=args.nlist, m=args.m,
+            nprobe=args.nprobe, iters=args.iters,
+        )
+    out = index.save(index_dir(args.snapshot, args.kind))
+    print(f"✓ Built {args.kind} index in {time.time() - t0:.1f}s "
+          f"({index.nbytes / 1e6:.1f} MB) -> {out}")
+
+
+if __name__ == "__main__":
+    main()
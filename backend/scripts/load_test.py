@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+RAG API Load Test (stubbed upstreams)
+
+Boots app.main:app in a child process with stub Gemini and Pinecone
+clients (configurable latency and error rates), drives it with open-loop
+Poisson traffic at each target RPS, and reports achieved throughput,
+p50/p95/p99 latency and errors per endpoint as JSON, so runs can be
+compared across commits.
+
+The default mix is mostly /api/rag/query with some /api/rag/ingest and
+/api/rag/ingest/batch, which also exercises admission control (shed
+requests show up as 503s).
+
+Usage:
+    python scripts/load_test.py --rps 10 50 100 200 --duration 20
+    python scripts/load_test.py --rps 100 --mix query=1.0 --embed-ms 120 --search-ms 60 --json before.json
+    python scripts/load_test.py --rps 50 100 --search-error-rate 0.05 --json flaky.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent.resolve()
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(BACKEND_DIR))
+
+QUERIES = [
+    "coding assistant that reviews pull requests",
+    "customer support bot for a SaaS billing product",
+    "marketing copy generator for product launches",
+    "cinematic drone shot over a coastline at sunset",
+    "research agent that cites sources",
+    "SQL tutor for beginners",
+    "travel planner with budget constraints",
+    "legal document summarizer",
+]
+
+
+# ── Stub upstreams (run inside the server process) ──────────────────────
+
+class StubLatency:
+    """Log-normal latency around a median, plus an error rate."""
+
+    def __init__(self, median_ms: float, sigma: float, error_rate: float, seed: int):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def wait(self, what: str) -> None:
+        if self.median_ms > 0:
+            time.sleep(self.median_ms * self._rng.lognormvariate(0, self.sigma) / 1000)
+        if self._rng.random() < self.error_rate:
+            raise RuntimeError(f"stub {what} error")
+
+
+class StubGenai:
+    """Stands in for genai.Client: models.embed_content -> random 768-d vectors."""
+
+    def __init__(self, latency: StubLatency, dim: int):
+        self.models = self
+        self._latency = latency
+        self._dim = dim
+
+    def embed_content(self, model, contents, config=None):
+        self._latency.wait("embed")
+        values = [random.gauss(0, 1) for _ in range(self._dim)]
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=values)])
+
+
+class StubPineconeIndex:
+    """Stands in for pinecone.Index: query/fetch/upsert/describe_index_stats."""
+
+    def __init__(self, latency: StubLatency, content_bytes: int):
+        self._latency = latency
+        self._content = ("You are a helpful assistant. " * (content_bytes // 29 + 1))[:content_bytes]
+        self._vectors = 0
+
+    def query(self, vector, top_k, include_metadata=True, filter=None, namespace=""):
+        self._latency.wait("search")
+        return SimpleNamespace(matches=[
+            SimpleNamespace(
+                id=f"stub-{namespace or 'default'}-{i}",
+                score=1.0 - i * 0.01,
+                metadata={"content": self._content, "category": "coding", "source": "stub"},
+            )
+            for i in range(top_k)
+        ])
+
+    def fetch(self, ids, namespace=""):
+        # Result-cache hits rehydrate ids through fetch
+        self._latency.wait("fetch")
+        return SimpleNamespace(vectors={
+            doc_id: SimpleNamespace(metadata={"content": self._content, "category": "coding", "source": "stub"})
+            for doc_id in ids
+        })
+
+    def upsert(self, vectors, namespace=""):
+        self._latency.wait("upsert")
+        self._vectors += len(vectors)
+
+    def describe_index_stats(self):
+        return SimpleNamespace(total_vector_count=self._vectors, dimension=768,
+                               index_fullness=0.0, namespaces={})
+
+
+def serve(args) -> None:
+    """Child process: install stubs into the RAG router's service and run uvicorn."""
+    import uvicorn
+
+    from app.config import settings
+    from app.main import app
+    from app.routers import rag
+
+    service = rag.rag_service
+    service._genai_client = StubGenai(
+        StubLatency(args.embed_ms, args.jitter, args.embed_error_rate, args.seed),
+        settings.embedding_dimensions,
+    )
+    service._pinecone_index = StubPineconeIndex(
+        StubLatency(args.search_ms, args.jitter, args.search_error_rate, args.seed + 1),
+        args.content_bytes,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+# ── Load generator ──────────────────────────────────────────────────────
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, weight = part.split("=")
+        if kind not in ("query", "ingest", "ingest_batch"):
+            raise ValueError(f"Unknown request kind in mix: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def make_request(kind: str, rng: random.Random, args) -> tuple[str, dict]:
+    if kind == "query":
+        return "/api/rag/query", {"query": rng.choice(QUERIES), "top_k": args.top_k}
+    doc = {"content": f"{rng.choice(QUERIES)} #{rng.randrange(1_000_000)}", "metadata": {"source": "load-test"}}
+    if kind == "ingest":
+        return "/api/rag/ingest", doc
+    return "/api/rag/ingest/batch", {"documents": [doc] * args.batch_docs}
+
+
+def summarize(latencies: list[float], statuses: Counter) -> dict:
+    from app.services.metrics import percentile
+
+    latencies.sort()
+    return {
+        "ok": statuses.get(200, 0),
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+async def run_step(client: httpx.AsyncClient, rps: float, args, mix: dict, seed: int) -> dict:
+    """Open-loop Poisson arrivals at `rps` for `args.duration` seconds."""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    latencies: dict[str, list] = defaultdict(list)
+    statuses: dict[str, Counter] = defaultdict(Counter)
+
+    async def send(kind: str, path: str, body: dict):
+        t0 = time.perf_counter()
+        try:
+            resp = await client.post(path, json=body)
+            status = resp.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        statuses[kind][status] += 1
+        if status == 200:
+            latencies[kind].append((time.perf_counter() - t0) * 1000)
+
+    tasks = []
+    start = time.perf_counter()
+    next_at = 0.0
+    while next_at < args.duration:
+        delay = start + next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(kinds, weights)[0]
+        tasks.append(asyncio.create_task(send(kind, *make_request(kind, rng, args))))
+        next_at += rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    total = Counter()
+    for c in statuses.values():
+        total.update(c)
+    return {
+        "target_rps": rps,
+        "sent": len(tasks),
+        "achieved_rps": round(total.get(200, 0) / elapsed, 2),
+        "elapsed_s": round(elapsed, 2),
+        **summarize([x for v in latencies.values() for x in v], total),
+        "by_kind": {kind: summarize(latencies[kind], statuses[kind]) for kind in statuses},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    async with httpx.AsyncClient(base_url=url) as client:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError("API process exited during startup")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become healthy in time")
+
+
+async def drive(args, mix: dict) -> list[dict]:
+    url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        steps = []
+        for i, rps in enumerate(args.rps):
+            print(f"  {rps} rps for {args.duration}s ...", flush=True)
+            step = await run_step(client, rps, args, mix, args.seed + i)
+            print(f"    achieved {step['achieved_rps']} rps | p50 {step['p50_ms']} ms | "
+                  f"p99 {step['p99_ms']} ms | errors {step['errors'] or 'none'}")
+            steps.append(step)
+        return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the RAG API against stubbed upstreams")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rps", nargs="+", type=float, default=[10, 50, 100], help="Target RPS levels")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per RPS level")
+    parser.add_argument("--mix", default="query=0.8,ingest=0.15,ingest_batch=0.05",
+                        help="Request mix, e.g. query=0.9,ingest=0.1")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-docs", type=int, default=10, help="Documents per batch ingest")
+    parser.add_argument("--embed-ms", type=float, default=80.0, help="Median stub Gemini latency")
+    parser.add_argument("--search-ms", type=float, default=40.0, help="Median stub Pinecone latency")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Log-normal sigma of stub latency")
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--search-error-rate", type=float, default=0.0)
+    parser.add_argument("--content-bytes", type=int, default=2000, help="Content size per stub match")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request (s)")
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    mix = parse_mix(args.mix)
+    server_args = [a for a in sys.argv[1:] if a != "--serve"]
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", *server_args],
+                            cwd=BACKEND_DIR, env={**os.environ, "QUERY_LOG_PATH": ""})
+    try:
+        print(f"Starting API with stub upstreams (embed {args.embed_ms} ms, search {args.search_ms} ms)")
+        asyncio.run(wait_ready(f"http://127.0.0.1:{args.port}", proc))
+        steps = asyncio.run(drive(args, mix))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    report = {
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("serve", "json")},
+        "steps": steps,
+    }
+    print(f"\n{'RPS':<8} {'Achieved':<10} {'p50 ms':<9} {'p95 ms':<9} {'p99 ms':<9} {'Errors'}")
+    print("-" * 60)
+    for s in steps:
+        print(f"{s['target_rps']:<8} {s['achieved_rps']:<10} {s['p50_ms']:<9} {s['p95_ms']:<9} "
+              f"{s['p99_ms']:<9} {sum(s['errors'].values())}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
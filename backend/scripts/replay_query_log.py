@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Query Log Replay
+
+Drives a running API instance with the traffic recorded in the query log
+(QUERY_LOG_PATH), keeping the original inter-arrival times (optionally
+sped up), and reports throughput, latency percentiles and errors.
+
+Requests are sent open-loop: each one starts at its scheduled time whether
+or not earlier ones have finished, so a slow server shows up as latency
+and 503s rather than as a slower replay. Latency is measured from the
+scheduled time, so time spent waiting for the client-side cap
+(--max-in-flight) counts; the report says how many requests the cap delayed.
+
+Usage:
+    python scripts/replay_query_log.py --log logs/queries.ndjson
+    python scripts/replay_query_log.py --log logs/queries.ndjson.1 logs/queries.ndjson --speed 10
+    python scripts/replay_query_log.py --log logs/queries.ndjson --speed 0 --limit 1000 --json replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.metrics import percentile
+
+
+def read_log(paths: list[str], limit: int = 0) -> list[dict]:
+    """Logged records in timestamp order."""
+    records = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def to_request(record: dict) -> dict:
+    """Rebuild the /api/rag/query body (the namespace is already resolved)."""
+    body = {"query": record["query"], "top_k": record.get("top_k", 5)}
+    if record.get("namespace"):
+        body["namespace"] = record["namespace"]
+    if record.get("category"):
+        body["category"] = record["category"]
+    if record.get("filter"):
+        body["filter"] = record["filter"]
+    return body
+
+
+async def replay(records: list[dict], url: str, speed: float, max_in_flight: int, timeout: float) -> dict:
+    latencies: list[float] = []
+    statuses = Counter()
+    limiter = asyncio.Semaphore(max_in_flight)
+    capped: list[float] = []  # ms spent waiting for the limiter, per delayed request
+    t_log0 = records[0]["ts"]
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        async def send(record: dict, scheduled: float):
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            # Timed from the scheduled send, so limiter waits count as latency
+            if limiter.locked():
+                wait0 = time.perf_counter()
+                await limiter.acquire()
+                capped.append((time.perf_counter() - wait0) * 1000)
+            else:
+                await limiter.acquire()
+            try:
+                resp = await client.post("/api/rag/query", json=to_request(record))
+                statuses[resp.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                return
+            finally:
+                limiter.release()
+            if resp.status_code == 200:
+                latencies.append((time.perf_counter() - scheduled) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            send(r, t0 + ((r["ts"] - t_log0) / speed if speed > 0 else 0.0)) for r in records
+        ))
+        elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        "requests": len(records),
+        "ok": ok,
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "elapsed_s": round(elapsed, 2),
+        "logged_span_s": round(records[-1]["ts"] - t_log0, 2),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_in_flight": max_in_flight,
+        "delayed_by_cap": len(capped),
+        "cap_wait_p95_ms": round(percentile(sorted(capped), 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the query log against an API instance")
+    parser.add_argument("--log", nargs="+", required=True, help="Query log file(s), rotated files included")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time compression (1 = original rate, 10 = 10x faster, 0 = all at once)")
+    parser.add_argument("--limit", type=int, default=0, help="Replay only the first N records")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Client-side concurrency cap")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s)")
+    parser.add_argument("--json", type=str, default=None, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    records = read_log(args.log, args.limit)
+    if not records:
+        print("ERROR: no records in the log")
+        sys.exit(1)
+    print(f"Replaying {len(records)} queries against {args.url} at {args.speed}x")
+
+    report = asyncio.run(replay(records, args.url, args.speed, args.max_in_flight, args.timeout))
+
+    print(f"\n{'=' * 50}")
+    print("REPLAY REPORT")
+    print(f"{'=' * 50}")
+    print(f"Requests:   {report['requests']} ({report['ok']} ok)")
+    print(f"Errors:     {report['errors'] or 'none'}")
+    print(f"Elapsed:    {report['elapsed_s']}s (logged span {report['logged_span_s']}s)")
+    print(f"Throughput: {report['throughput_rps']} req/s")
+    print(f"Latency:    p50 {report['p50_ms']} ms | p95 {report['p95_ms']} ms | p99 {report['p99_ms']} ms")
+    if report["delayed_by_cap"]:
+        print(f"⚠ {report['delayed_by_cap']} requests waited for the --max-in-flight {report['max_in_flight']} cap "
+              f"(p95 wait {report['cap_wait_p95_ms']} ms; included in latency)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nReport saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
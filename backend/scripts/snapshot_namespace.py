@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Namespace Snapshot Export / Import
+
+Copies Pinecone namespaces to local snapshot directories
+(<out>/<namespace>/vectors.npy + metadata.parquet + snapshot.json) and
+restores them. Snapshots feed LOCAL_INDEX_DIR, the local index benchmarks
+and the research scripts.
+
+Usage:
+    python scripts/snapshot_namespace.py export --namespace video-prompts --out snapshots
+    python scripts/snapshot_namespace.py export --all --out snapshots
+    python scripts/snapshot_namespace.py import --snapshot snapshots/video-prompts
+    python scripts/snapshot_namespace.py import --snapshot snapshots/video-prompts --namespace video-prompts-copy
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pinecone import Pinecone
+
+# Make `app` importable when run from backend/
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
+
+from app.services.local_index import export_namespace, import_namespace
+from app.services.local_index.corpus import namespace_dir
+
+load_dotenv()
+
+
+def progress(done: int, total: int):
+    print(f"\r  {done}/{total}", end="", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/import Pinecone namespace snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Pinecone namespace -> snapshot directory")
+    target = export.add_mutually_exclusive_group(required=True)
+    target.add_argument("--namespace", nargs="+", help="Namespace(s) to export ('' = default)")
+    target.add_argument("--all", action="store_true", help="Export every namespace in the index")
+    export.add_argument("--out", type=Path, default=Path("snapshots"), help="Snapshot root directory")
+
+    restore = sub.add_parser("import", help="Snapshot directory -> Pinecone namespace")
+    restore.add_argument("--snapshot", type=Path, required=True, help="Snapshot directory")
+    restore.add_argument("--namespace", default=None, help="Target namespace (default: the exported one)")
+
+    for p in (export, restore):
+        p.add_argument("--batch-size", type=int, default=100, help="Ids per fetch / vectors per upsert")
+        p.add_argument("--workers", type=int, default=8, help="Concurrent Pinecone requests")
+    args = parser.parse_args()
+
+    pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    if not pinecone_api_key:
+        print("ERROR: PINECONE_API_KEY must be set in .env")
+        sys.exit(1)
+    index = Pinecone(api_key=pinecone_api_key).Index(os.getenv("PINECONE_INDEX_NAME", "prompttriage-prompts"))
+
+    if args.command == "export":
+        namespaces = args.namespace
+        if args.all:
+            namespaces = list(index.describe_index_stats().namespaces.keys())
+        for ns in namespaces:
+            path = args.out / namespace_dir(ns)
+            print(f"Exporting namespace '{ns or '(default)'}' -> {path}")
+            t0 = time.time()
+            corpus = export_namespace(index, ns, path, batch_size=args.batch_size,
+                                      workers=args.workers, progress=progress)
+            print(f"\n✓ {len(corpus)} vectors in {time.time() - t0:.1f}s")
+    else:
+        print(f"Importing {args.snapshot}")
+        t0 = time.time()
+        count = import_namespace(index, args.snapshot, namespace=args.namespace,
+                                 batch_size=args.batch_size, workers=args.workers, progress=progress)
+        print(f"\n✓ Upserted {count} vectors in {time.time() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
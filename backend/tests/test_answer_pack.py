@@ -0,0 +1,29 @@
+"""Answer pack: lookups stop for namespaces that changed since the build."""
+
+import numpy as np
+
+from app.services.answer_pack import AnswerPack
+
+
+def _pack() -> AnswerPack:
+    centroids = np.eye(4, dtype=np.float32)
+    results = {(0, ""): [{"id": "a", "content": "A", "similarity": 1.0}],
+               (0, "video"): [{"id": "v", "content": "V", "similarity": 1.0}]}
+    return AnswerPack(centroids, results, {"top_k": 5, "corpus_versions": {"": 10, "video": 3}})
+
+
+def test_invalidate_stops_lookups_for_that_namespace():
+    pack = _pack()
+    pack.invalidate("")
+
+    assert pack.lookup(pack.centroids[0], "", 3) is None
+    assert pack.lookup(pack.centroids[0], "video", 3)[0]["id"] == "v"
+    assert pack.stats()["stale_namespaces"] == [""]
+
+
+def test_check_versions_invalidates_changed_counts():
+    pack = _pack()
+    pack.check_versions({"": 10, "video": 4})
+
+    assert pack.lookup(pack.centroids[0], "", 3)[0]["id"] == "a"
+    assert pack.lookup(pack.centroids[0], "video", 3) is None
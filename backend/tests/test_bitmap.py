@@ -0,0 +1,73 @@
+"""Metadata bitmap index: incremental refresh and queries racing refreshes."""
+
+import random
+import threading
+
+import numpy as np
+
+from app.services.local_index.bitmap import MetadataIndex
+
+FILTERS = [
+    {"category": "coding"},
+    {"source": {"$in": ["a", "c"]}},
+    {"category": {"$ne": "writing"}},
+    {"techniques": {"$nin": ["cot"]}},
+    {"quality": {"$gte": 3}},
+    {"image_category": {"$exists": False}},
+    {"$or": [{"category": "image"}, {"techniques": "few-shot"}]},
+]
+
+
+def _meta(rng: random.Random) -> dict:
+    meta = {
+        "category": rng.choice(["coding", "writing", "image"]),
+        "source": rng.choice("abcd"),
+        "quality": rng.randint(1, 5),
+        "techniques": rng.sample(["cot", "few-shot", "role"], rng.randint(0, 2)),
+    }
+    if rng.random() < 0.1:
+        meta["image_category"] = "photo"
+    return meta
+
+
+def test_refresh_extends_postings_to_match_a_fresh_build():
+    rng = random.Random(0)
+    metadata = [_meta(rng) for _ in range(500)]
+    index = MetadataIndex(metadata, fields=["category", "source", "quality", "techniques"])
+    for batch in (1, 7, 300):
+        metadata.extend(_meta(rng) for _ in range(batch))
+        index.refresh()
+        fresh = MetadataIndex(list(metadata))
+        assert index.n_rows == len(metadata)
+        assert set(index.stats()["fields"]) >= {"category", "source", "quality", "techniques"}
+        for f in FILTERS:
+            np.testing.assert_array_equal(index.select(f), fresh.select(f))
+
+
+def test_queries_during_refresh():
+    rng = random.Random(1)
+    metadata = [_meta(rng) for _ in range(200)]
+    index = MetadataIndex(metadata, fields=["category"])
+    errors = []
+    done = threading.Event()
+
+    def query():
+        while not done.is_set():
+            try:
+                for f in FILTERS:
+                    rows = index.select(f)
+                    assert len(rows) == 0 or rows[-1] < len(metadata)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for _ in range(300):
+        metadata.append(_meta(rng))
+        index.refresh()
+    done.set()
+    for t in threads:
+        t.join()
+    assert not errors
@@ -0,0 +1,32 @@
+"""Shared cache table: layout mismatches and generation-aware stats."""
+
+import pytest
+
+from app.services.cache import SharedTable
+
+
+def test_shared_table_entries_survive_reopen_and_clear(tmp_path):
+    path = tmp_path / "t.cache"
+    a = SharedTable(path, 64, 128)
+    a.put(5, b"x")
+    b = SharedTable(path, 64, 128)
+
+    assert b.get(5) == b"x"
+    assert a.stats()["entries"] == 1
+
+    a.clear()
+    assert b.get(5) is None
+    assert b.stats()["entries"] == 0
+
+
+def test_shared_table_layout_mismatch_raises_without_resizing(tmp_path):
+    path = tmp_path / "t.cache"
+    a = SharedTable(path, 64, 128)
+    a.put(5, b"x")
+    size = path.stat().st_size
+
+    with pytest.raises(ValueError, match="not resized"):
+        SharedTable(path, 128, 128)
+
+    assert path.stat().st_size == size
+    assert a.get(5) == b"x"
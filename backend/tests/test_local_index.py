@@ -0,0 +1,116 @@
+"""Local index: prebuilt index validation and lock-free HNSW search."""
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.local_index.corpus import LocalCorpus
+from app.services.local_index.hnsw import HNSWIndex
+from app.services.local_index.quantized import IVFPQIndex, ScalarQuantizedIndex
+from app.services.local_index.store import LocalNamespace, index_dir, load_or_build_index
+
+DIM = 32
+
+
+def _vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _corpus(vectors: np.ndarray) -> LocalCorpus:
+    n = len(vectors)
+    return LocalCorpus(
+        ids=[f"doc-{i}" for i in range(n)],
+        vectors=vectors,
+        contents=[f"content {i}" for i in range(n)],
+        metadata=[{} for _ in range(n)],
+    )
+
+
+@pytest.mark.parametrize("kind, build", [
+    ("hnsw", lambda v: HNSWIndex.build(v, M=8, ef_construction=40)),
+    ("int8", ScalarQuantizedIndex.build),
+    ("ivfpq", lambda v: IVFPQIndex.build(v, m=8)),
+])
+def test_short_prebuilt_index_is_rebuilt(tmp_path, monkeypatch, kind, build):
+    monkeypatch.setattr(settings, "pq_m", 8)
+    monkeypatch.setattr(settings, "hnsw_build_max_vectors", 1000)
+    vectors = _vectors(300)
+    build(vectors[:200]).save(index_dir(tmp_path, kind))
+    corpus = _corpus(vectors)
+
+    index = load_or_build_index(kind, corpus, tmp_path)
+
+    assert len(index) == len(corpus)
+    rows, _ = index.search(vectors[250], 1)
+    assert rows[0] == 250
+
+
+@pytest.mark.parametrize("kind, build", [
+    ("hnsw", lambda v: HNSWIndex.build(v, M=8, ef_construction=40)),
+    ("int8", ScalarQuantizedIndex.build),
+])
+def test_matching_prebuilt_index_is_loaded(tmp_path, kind, build):
+    vectors = _vectors(200)
+    build(vectors).save(index_dir(tmp_path, kind))
+
+    index = load_or_build_index(kind, _corpus(vectors), tmp_path)
+
+    assert len(index) == 200
+
+
+def test_upsert_after_short_prebuilt_hnsw(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "hnsw_build_max_vectors", 1000)
+    vectors = _vectors(300)
+    HNSWIndex.build(vectors[:200], M=8, ef_construction=40).save(index_dir(tmp_path, "hnsw"))
+    corpus = _corpus(vectors)
+    namespace = LocalNamespace(corpus, load_or_build_index("hnsw", corpus, tmp_path))
+
+    assert namespace.upsert([("new", _vectors(1, seed=1)[0], "new", {})]) == 1
+    assert namespace.query(vectors[299], top_k=1)[0]["id"] == "doc-299"
+
+
+@pytest.mark.parametrize("prebuilt_rows", [None, 200])
+def test_large_hnsw_namespace_falls_back_to_exact(tmp_path, monkeypatch, prebuilt_rows):
+    monkeypatch.setattr(settings, "hnsw_build_max_vectors", 100)
+    vectors = _vectors(300)
+    if prebuilt_rows:
+        HNSWIndex.build(vectors[:prebuilt_rows], M=8, ef_construction=40).save(index_dir(tmp_path, "hnsw"))
+    corpus = _corpus(vectors)
+    namespace = LocalNamespace(corpus, load_or_build_index("hnsw", corpus, tmp_path))
+
+    assert namespace.index.kind == "exact" and not namespace.mutable
+    assert namespace.query(vectors[299], top_k=1)[0]["id"] == "doc-299"
+
+
+def test_hnsw_search_during_concurrent_adds():
+    index = HNSWIndex(DIM, M=8, ef_construction=40, ef_search=32, capacity=16)
+    for v in _vectors(50):
+        index.add(v)
+    extra = _vectors(1500, seed=2)
+    errors = []
+
+    def add_all():
+        try:
+            for i, v in enumerate(extra):
+                index.add(v)
+                if i % 7 == 0:
+                    index.delete(i)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    writer = threading.Thread(target=add_all)
+    writer.start()
+    queries = _vectors(64, seed=3)
+    while writer.is_alive():
+        for q in queries:
+            size = len(index)
+            allowed = np.arange(0, max(size, 1), 2)
+            for rows, scores in (index.search(q, 5), index.search(q, 5, allowed=allowed)):
+                assert len(rows) == len(scores)
+                assert (rows < len(index)).all()
+    writer.join()
+
+    assert not errors
+    assert len(index) == 1550
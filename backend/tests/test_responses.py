@@ -0,0 +1,29 @@
+import pytest
+from starlette.requests import Request
+
+from app import responses
+from app.responses import media_ranges, wants_msgpack
+
+
+def _request(accept: str) -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+
+def test_media_ranges_parses_q():
+    assert media_ranges("application/json;q=0.5, application/msgpack") == {
+        "application/json": 0.5, "application/msgpack": 1.0,
+    }
+
+
+@pytest.mark.parametrize("accept,expected", [
+    ("application/msgpack", True),
+    ("application/x-msgpack ; q=0.3", True),
+    ("application/msgpack, application/json;q=0.9", True),
+    ("application/msgpack;q=0", False),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("*/*", False),
+    ("", False),
+])
+def test_wants_msgpack(monkeypatch, accept, expected):
+    monkeypatch.setattr(responses, "msgpack", object())
+    assert wants_msgpack(_request(accept)) is expected
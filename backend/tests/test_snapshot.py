@@ -0,0 +1,46 @@
+"""Namespace snapshots: export edge cases."""
+
+import json
+from types import SimpleNamespace
+
+from app.services.local_index.corpus import LocalCorpus
+from app.services.local_index.snapshot import MANIFEST_FILE, export_namespace
+
+
+class FakeIndex:
+    """The parts of a Pinecone index that export_namespace uses."""
+
+    def __init__(self, records: dict, dimension: int):
+        self.records = records
+        self.dimension = dimension
+
+    def list(self, namespace=""):
+        ids = list(self.records)
+        return [ids] if ids else []
+
+    def fetch(self, ids, namespace=""):
+        return SimpleNamespace(vectors={
+            i: SimpleNamespace(values=self.records[i][0], metadata=self.records[i][1])
+            for i in ids if i in self.records
+        })
+
+    def describe_index_stats(self):
+        return SimpleNamespace(dimension=self.dimension)
+
+
+def test_export_empty_namespace(tmp_path):
+    corpus = export_namespace(FakeIndex({}, dimension=8), "empty", tmp_path / "empty")
+
+    assert len(corpus) == 0 and corpus.vectors.shape == (0, 8)
+    assert json.loads((tmp_path / "empty" / MANIFEST_FILE).read_text())["dim"] == 8
+    assert LocalCorpus.load(tmp_path / "empty").vectors.shape == (0, 8)
+
+
+def test_export_namespace_round_trip(tmp_path):
+    index = FakeIndex({"a": ([1.0, 0.0], {"content": "A", "category": "x"}),
+                       "b": ([0.0, 1.0], {"content": "B"})}, dimension=2)
+    corpus = export_namespace(index, "ns", tmp_path / "ns")
+
+    loaded = LocalCorpus.load(tmp_path / "ns")
+    assert loaded.ids == ["a", "b"] and loaded.contents == ["A", "B"]
+    assert corpus.vectors.shape == (2, 2)